@@ -0,0 +1,190 @@
+"""
+CSMS 관리용 WebSocket API (JSON).
+
+요청:
+    {"id": 1, "command": "list"}
+    {"id": 5, "command": "meter_curve", "params": {"reservation_id": "...", "resolution": 60,
+     "start": "2025-05-01T10:00:00", "end": "2025-05-01T12:00:00"}}
+    {"id": 6, "command": "slot_free", "params": {"evse_id": "EVSE-ST1-001",
+     "start": "2025-05-01T10:00:00", "end": "2025-05-01T11:00:00"}}
+    {"id": 7, "command": "next_free_slot", "params": {"evse_id": "EVSE-ST1-001",
+     "after": "2025-05-01T10:00:00", "minutes": 60}}
+    {"id": 8, "command": "station_capacity", "params": {"station_id": "ST-001",
+     "start": "2025-05-01T00:00:00", "hours": 24, "evse_ids": ["EVSE-ST1-001"]}}
+    {"id": 9, "command": "reserve", "params": {"reservation": {"stationId": "ST-001", "evseId": "EVSE-ST1-001",
+     "connectorId": 1, "userId": "...", "idToken": "...", "startTime": "...", "endTime": "...", "cost": 420,
+     "targetEnergyWh": 1200}, "charging_schedules": [{"startPeriod": 0, "limit": 7000}, ...]}}
+    {"id": 2, "command": "reset", "stations": "ST-001", "params": {"type": "Immediate"}}
+    {"id": 3, "command": "set_charging_profile", "stations": ["ST-001", "ST-002"],
+     "params": {"evse_id": 1, "charging_profile": {...}}, "timeout": 10, "concurrency": 100}
+
+command 는 ChargePointHandler 의 *_req 메서드 이름에서 _req 를 뺀 것이고 params 는 snake_case 인자.
+stations 가 "*" 이면 연결된 모든 충전소로 보낸다.
+
+응답:
+    {"id": 2, "results": {"ST-001": {"status": "Ok", "response": {...}}}}
+    {"id": 1, "stations": [...]}
+    {"id": 5, "points": [{"ts": "...", "energyWh": 120, "cost": 36, "powerW": 7200.0}, ...]}
+    {"id": 6, "free": false, "conflict": "<reservationId>"}
+    {"id": 7, "start": "2025-05-01T11:30:00"}
+    {"id": 8, "hours": [{"hour": "...", "evses": 1, "freeMinutes": 30.0, "freeRatio": 0.5}, ...]}
+    {"id": 9, "reservation_id": "..."}   겹치면 {"id": 9, "error": "...", "conflict": "<reservationId>"}
+                                         필드/프로파일이 잘못되었으면 {"id": 9, "error": "..."}
+    {"id": 4, "error": "..."}
+
+같은 포트에서 GET /metrics 로 Prometheus 메트릭을 제공한다.
+"""
+import asyncio
+import http
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict
+
+import websockets
+
+import central_system
+from slot_index import SlotConflict
+import metrics
+from registry import DEFAULT_COMMAND_TIMEOUT, DEFAULT_FAN_OUT_CONCURRENCY, registry
+
+
+async def _list(request: Dict[str, Any]) -> Dict[str, Any]:
+    return {"stations": registry.snapshot()}
+
+
+async def _meter_curve(request: Dict[str, Any]) -> Dict[str, Any]:
+    params = request.get("params") or {}
+    if not params.get("reservation_id"):
+        return {"error": "params.reservation_id is required"}
+    start, end = (datetime.fromisoformat(params[key]) if params.get(key) else None for key in ("start", "end"))
+    points = await central_system.storage.find_meter_curve(
+        params["reservation_id"], float(params.get("resolution", 60)), start, end)
+    return {"points": points}
+
+
+def _time(params: Dict[str, Any], key: str) -> datetime:
+    return datetime.fromisoformat(params[key])
+
+
+async def _slot_free(request: Dict[str, Any]) -> Dict[str, Any]:
+    params = request.get("params") or {}
+    if not all(params.get(key) for key in ("evse_id", "start", "end")):
+        return {"error": "params.evse_id, start and end are required"}
+    conflict = central_system.slot_index.conflict(params["evse_id"], _time(params, "start"), _time(params, "end"))
+    return {"free": conflict is None, "conflict": conflict}
+
+
+async def _next_free_slot(request: Dict[str, Any]) -> Dict[str, Any]:
+    params = request.get("params") or {}
+    if not params.get("evse_id") or not params.get("minutes"):
+        return {"error": "params.evse_id and minutes are required"}
+    after = _time(params, "after") if params.get("after") else datetime.now()
+    start = central_system.slot_index.next_free(
+        params["evse_id"], after, timedelta(minutes=float(params["minutes"])))
+    return {"start": start}
+
+
+async def _station_capacity(request: Dict[str, Any]) -> Dict[str, Any]:
+    params = request.get("params") or {}
+    if not params.get("station_id"):
+        return {"error": "params.station_id is required"}
+    start = _time(params, "start") if params.get("start") else datetime.now().replace(minute=0, second=0, microsecond=0)
+    hours = central_system.slot_index.station_capacity(
+        params["station_id"], start, int(params.get("hours", 24)), params.get("evse_ids"))
+    return {"hours": hours}
+
+
+async def _reserve(request: Dict[str, Any]) -> Dict[str, Any]:
+    params = request.get("params") or {}
+    reservation = params.get("reservation")
+    if not isinstance(reservation, dict):
+        return {"error": "params.reservation is required"}
+    reservation = dict(reservation)
+    try:
+        for key in ("startTime", "endTime"):
+            reservation[key] = datetime.fromisoformat(reservation[key])
+    except (KeyError, TypeError, ValueError):
+        return {"error": "params.reservation.startTime and endTime must be ISO 8601 times"}
+    try:
+        reservation_id = await central_system.book_reservation(reservation, params.get("charging_schedules"))
+    except SlotConflict as e:
+        return {"error": str(e), "conflict": e.reservation_id}
+    except ValueError as e:
+        # 필드가 없거나 타입/범위가 틀림, 충전 프로파일이 없거나 잘못됨 (아무것도 저장하지 않음)
+        return {"error": str(e)}
+    return {"reservation_id": reservation_id}
+
+
+# command -> 처리 함수 (이 외의 command 는 충전소로 보내는 명령)
+QUERIES: Dict[str, Callable] = {
+    "list": _list,
+    "meter_curve": _meter_curve,
+    "slot_free": _slot_free,
+    "next_free_slot": _next_free_slot,
+    "station_capacity": _station_capacity,
+    "reserve": _reserve,
+}
+
+
+async def handle_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    if not isinstance(request, dict):
+        return {"error": "request must be a JSON object"}
+    command = request.get("command")
+    if not command:
+        return {"error": "command is required"}
+
+    if command in QUERIES:
+        return await QUERIES[command](request)
+
+    stations = request.get("stations")
+    if stations == "*":
+        stations = await registry.all_connected_ids()
+    elif isinstance(stations, str):
+        stations = [stations]
+    if not stations:
+        return {"error": "stations is required"}
+
+    results = await registry.fan_out(
+        stations, command, request.get("params"),
+        timeout=float(request.get("timeout", DEFAULT_COMMAND_TIMEOUT)),
+        concurrency=int(request.get("concurrency", DEFAULT_FAN_OUT_CONCURRENCY)),
+    )
+    return {"results": results}
+
+
+async def _respond(websocket, request: Dict[str, Any]):
+    try:
+        response = await handle_request(request)
+    except Exception as e:
+        logging.exception("Admin request failed: %s", request.get("command") if isinstance(request, dict) else request)
+        response = {"error": str(e)}
+    response["id"] = request.get("id") if isinstance(request, dict) else None
+    await websocket.send(json.dumps(response, default=str))
+
+
+async def on_admin_connect(websocket, path):
+    tasks = set()
+    async for message in websocket:
+        try:
+            request = json.loads(message)
+        except ValueError:
+            await websocket.send(json.dumps({"error": "invalid json"}))
+            continue
+        # 오래 걸리는 fan-out 이 다른 요청을 막지 않도록 요청마다 task
+        task = asyncio.create_task(_respond(websocket, request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+async def process_request(path, request_headers):
+    # WebSocket 이 아닌 HTTP GET 요청 처리
+    if path == "/metrics":
+        return http.HTTPStatus.OK, [("Content-Type", "text/plain; version=0.0.4")], metrics.render().encode()
+    return None
+
+
+async def serve(host: str, port: int):
+    server = await websockets.serve(on_admin_connect, host, port, process_request=process_request)
+    logging.info("Admin API listening on ws://%s:%d", host, server.sockets[0].getsockname()[1])
+    return server
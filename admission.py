@@ -0,0 +1,127 @@
+"""
+재접속 폭주(사이트 전체 재부팅 등) 때의 수용 제어.
+
+    핸드셰이크   동시에 진행 중인 WebSocket 핸드셰이크 수 제한, 넘으면 503 + Retry-After
+    Boot         BootNotification 처리량 token bucket, 넘으면 Pending + 충전소마다 다른 재시도 interval
+
+Boot 를 거절할 때마다 다음 재시도 시각을 1/rate 초씩 뒤로 잡으므로, 거절된 충전소들이 같은 시각에
+다시 몰리지 않고 처리 가능한 속도로 나뉘어 돌아온다.
+"""
+import math
+import os
+import random
+import itertools
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Hashable, Optional, Tuple
+
+import metrics
+
+MAX_CONCURRENT_HANDSHAKES = int(os.getenv("MAX_CONCURRENT_HANDSHAKES", "500"))  # 0 이면 제한 없음
+# websockets 의 open_timeout 과 같게, 이보다 오래된 핸드셰이크는 실패한 것으로 본다
+HANDSHAKE_TIMEOUT = float(os.getenv("HANDSHAKE_TIMEOUT", "10"))
+HANDSHAKE_RETRY_AFTER = int(os.getenv("HANDSHAKE_RETRY_AFTER", "5"))  # 초
+BOOT_RATE = float(os.getenv("BOOT_RATE", "50"))  # 초당 BootNotification, 0 이면 제한 없음
+BOOT_BURST = int(os.getenv("BOOT_BURST", "200"))
+BOOT_PENDING_MIN_INTERVAL = int(os.getenv("BOOT_PENDING_MIN_INTERVAL", "10"))  # 초
+
+rejected = metrics.Counter("ocpp_admission_rejected_total",
+                           "Handshakes refused and BootNotifications answered Pending under load", ["stage"])
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def try_acquire(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class HandshakeGate:
+    """
+    process_request 에서 admit(key), on_connect 에서 done(key). key 는 요청 경로 (충전소 id).
+    핸드셰이크가 중간에 실패하면 done() 이 불리지 않으므로 HANDSHAKE_TIMEOUT 이 지난 항목은 버린다.
+    done() 은 그 key 로 들어온 항목 중 아직 남아 있는 것만 지운다 (이미 버린 항목 대신 다른 핸드셰이크를 지우지 않음).
+    """
+
+    def __init__(self, limit: int = MAX_CONCURRENT_HANDSHAKES, timeout: float = HANDSHAKE_TIMEOUT):
+        self.limit = limit
+        self.timeout = timeout
+        self._ids = itertools.count()
+        # 진행 중인 핸드셰이크 id -> (시작 시각, key), 오래된 순
+        self._started: "OrderedDict[int, Tuple[float, Hashable]]" = OrderedDict()
+        # key -> 그 key 로 진행 중인 핸드셰이크 id (오래된 순)
+        self._by_key: Dict[Hashable, Deque[int]] = {}
+
+    def _expire(self, now: float):
+        while self._started:
+            admission_id, (started, key) = next(iter(self._started.items()))
+            if started >= now - self.timeout:
+                break
+            del self._started[admission_id]
+            self._discard(key, admission_id)
+
+    def _discard(self, key: Hashable, admission_id: int):
+        ids = self._by_key.get(key)
+        if ids is None:
+            return
+        try:
+            ids.remove(admission_id)
+        except ValueError:
+            pass
+        if not ids:
+            del self._by_key[key]
+
+    def admit(self, key: Hashable = None) -> bool:
+        if self.limit <= 0:
+            return True
+        now = time.monotonic()
+        self._expire(now)
+        if len(self._started) >= self.limit:
+            rejected.inc("handshake")
+            return False
+        admission_id = next(self._ids)
+        self._started[admission_id] = (now, key)
+        self._by_key.setdefault(key, deque()).append(admission_id)
+        return True
+
+    def done(self, key: Hashable = None):
+        ids = self._by_key.get(key)
+        if not ids:
+            # 시간이 지나서 이미 버린 핸드셰이크 (또는 제한 없이 받은 연결)
+            return
+        admission_id = ids.popleft()
+        if not ids:
+            del self._by_key[key]
+        self._started.pop(admission_id, None)
+
+    def __len__(self) -> int:
+        return len(self._started)
+
+
+class BootThrottle:
+    def __init__(self, rate: float = BOOT_RATE, burst: int = BOOT_BURST,
+                 min_interval: int = BOOT_PENDING_MIN_INTERVAL):
+        self.rate = rate
+        self.min_interval = min_interval
+        self._bucket = TokenBucket(rate, burst) if rate > 0 else None
+        # 마지막으로 Pending 을 준 충전소의 재시도 시각
+        self._next_retry = 0.0
+
+    def admit(self) -> Optional[int]:
+        """처리해도 되면 None, 아니면 Pending 응답에 넣을 재시도 interval(초)"""
+        if self._bucket is None or self._bucket.try_acquire():
+            return None
+        now = time.monotonic()
+        self._next_retry = max(self._next_retry, now + self.min_interval) + 1 / self.rate
+        rejected.inc("boot")
+        return math.ceil(self._next_retry - now + random.uniform(0, 1))
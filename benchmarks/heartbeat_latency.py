@@ -0,0 +1,188 @@
+"""
+Heartbeat 지연시간 벤치마크.
+
+CSMS(csms.on_connect)를 같은 프로세스에서 띄우고 N개의 가상 충전소를 붙인다.
+MongoDB 대신 호출마다 지정한 시간만큼 sleep 하는 컬렉션을 넣어서 DB 지연을 주입하고,
+충전소들이 Authorize(핸들러 안에서 DB 조회)와 CostUpdated(cost_buffer/meter_buffer 가 모아서 bulk_write)를
+보내는 동안 Heartbeat 왕복 지연의 p50/p95/p99 를 측정한다. 쓰기 버퍼들은 csms.serve 처럼 시작하고,
+CostUpdated 는 충전소마다 다른 reservationId 로 보낸다 (버퍼에서 한 키로 합쳐지지 않도록).
+
+    python benchmarks/heartbeat_latency.py --stations 1000 --mongo-latency-ms 30
+    python benchmarks/heartbeat_latency.py --stations 1000 --mongo-latency-ms 30 --executor-workers 0
+
+--executor-workers 0 은 이전 동작(루프에서 pymongo 를 바로 호출)과 같다.
+--storage memory 는 DB 없이 OCPP/JSON 처리 경로만 측정한다.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+from ocpp.v201 import ChargePoint, call
+
+import central_system
+import csms
+from memory_storage import MemoryStorage
+from storage import MongoStorage
+
+
+class _SlowCollection:
+    """pymongo 컬렉션 대신 사용하는 지연 주입용 컬렉션 (결과는 항상 비어 있음)"""
+
+    def __init__(self, name, latency):
+        self.name = name
+        self.latency = latency
+
+    def _wait(self):
+        time.sleep(self.latency)
+
+    def find_one(self, *args, **kwargs):
+        self._wait()
+        return None
+
+    def find(self, *args, **kwargs):
+        self._wait()
+        return iter([])
+
+    def aggregate(self, *args, **kwargs):
+        self._wait()
+        return iter([])
+
+    def insert_one(self, *args, **kwargs):
+        self._wait()
+
+    def insert_many(self, *args, **kwargs):
+        self._wait()
+
+    def update_one(self, *args, **kwargs):
+        self._wait()
+
+    def update_many(self, *args, **kwargs):
+        self._wait()
+
+    def bulk_write(self, *args, **kwargs):
+        self._wait()
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+
+class _SlowDb(dict):
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def __missing__(self, name):
+        self[name] = _SlowCollection(name, self.latency)
+        return self[name]
+
+    def list_collections(self, *args, **kwargs):
+        return iter([])
+
+    def create_collection(self, name, **kwargs):
+        # meterValue 를 time-series 컬렉션으로 취급
+        return self[name]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_station(uri, station_id, args, latencies, stop_at):
+    async with websockets.connect(uri + station_id, subprotocols=["ocpp2.0.1"]) as ws:
+        cp = ChargePoint(station_id, ws, response_timeout=60)
+        reader = asyncio.create_task(cp.start())
+        await cp.call(call.BootNotification(
+            charging_station={"model": "Bench", "vendor_name": "ChargeSet"}, reason="PowerUp"))
+        # 모든 충전소가 동시에 보내지 않도록 시작 시점을 흩뜨린다
+        await asyncio.sleep(random.uniform(0, args.interval))
+        reservation_id = str(ObjectId())
+        sent = 0
+        while time.monotonic() < stop_at:
+            if random.random() < args.authorize_ratio:
+                # 없는 토큰이라 Authorize 캐시에 남지 않고 매번 DB 를 조회한다
+                await cp.call(call.Authorize(id_token={"id_token": f"{station_id}-{sent}", "type": "Central"}))
+            if random.random() < args.db_ratio:
+                sent += 1
+                await cp.call(call.CostUpdated(
+                    total_cost=10 * sent, transaction_id="tx-bench",
+                    custom_data={"vendorId": "ChargeSet", "reservationId": reservation_id, "totalEnergy": sent}))
+            started = time.perf_counter()
+            await cp.call(call.Heartbeat())
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(args.interval)
+        reader.cancel()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="p99 Heartbeat latency with injected Mongo latency")
+    parser.add_argument("--stations", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=30, help="seconds of measurement")
+    parser.add_argument("--interval", type=float, default=5, help="seconds between heartbeats per station")
+    parser.add_argument("--db-ratio", type=float, default=0.5,
+                        help="probability that a CostUpdated (buffered DB write) precedes each heartbeat")
+    parser.add_argument("--authorize-ratio", type=float, default=0.2,
+                        help="probability that an Authorize (DB read in the handler) precedes each heartbeat")
+    parser.add_argument("--mongo-latency-ms", type=float, default=30)
+    parser.add_argument("--executor-workers", type=int, default=16,
+                        help="storage thread pool size, 0 = call pymongo on the event loop")
+    parser.add_argument("--storage", choices=["mongo", "memory"], default="mongo",
+                        help="mongo = latency-injected collections, memory = MemoryStorage")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("ocpp").setLevel(logging.WARNING)
+
+    if args.storage == "memory":
+        central_system.storage = MemoryStorage()
+    else:
+        central_system.storage = MongoStorage(_SlowDb(args.mongo_latency_ms / 1000), max_workers=args.executor_workers)
+
+    server = await websockets.serve(csms.on_connect, "127.0.0.1", 0, subprotocols=["ocpp2.0.1"])
+    port = server.sockets[0].getsockname()[1]
+    uri = f"ws://127.0.0.1:{port}/"
+    buffers = [central_system.cost_buffer, central_system.status_buffer, central_system.meter_buffer]
+    for buffer in buffers:
+        buffer.start()
+
+    latencies = []
+    stop_at = time.monotonic() + args.duration
+    results = await asyncio.gather(*(
+        run_station(uri, f"BENCH-{i:05d}", args, latencies, stop_at) for i in range(args.stations)
+    ), return_exceptions=True)
+    server.close()
+    await server.wait_closed()
+    for buffer in buffers:
+        await buffer.close()
+
+    result = {
+        "stations": args.stations,
+        "storage": args.storage,
+        "mongo_latency_ms": args.mongo_latency_ms,
+        "executor_workers": args.executor_workers,
+        "failed_stations": sum(isinstance(result, Exception) for result in results),
+        "heartbeats": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+"""
+OCPP 메시지 처리 경로(ocpp_codec) 마이크로 벤치마크.
+
+CSMS 가 CALL 하나를 받아서 응답하기까지의 JSON 작업만 (핸들러 제외) 반복해서 메시지당 시간을 잰다.
+
+    ocpp        라이브러리 경로: unpack(json) -> 검증 -> camel_to_snake_case -> serialize_as_dict
+                -> remove_nones -> snake_to_camel_case -> 검증 -> to_json
+    fast        ocpp_codec: unpack(orjson) -> 검증 -> 캐시된 키 변환 -> to_payload -> 검증 -> dumps
+    fast-nocheck  fast 에서 검증 off (OCPP_VALIDATION_ACTIONS=<Action>=off)
+
+    Authorize          응답 custom_data 에 chargingSchedules --periods 개 (큰 custom_data)
+    TransactionEvent   Started 요청 custom_data 에 chargingSchedules --periods 개
+
+두 경로의 응답 JSON 이 같은지도 확인한다.
+
+    python benchmarks/ocpp_json.py --periods 24 96 --iterations 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocpp.charge_point import camel_to_snake_case, remove_nones, serialize_as_dict, snake_to_camel_case
+from ocpp.messages import _validate_payload, unpack
+from ocpp.v201 import call_result
+from ocpp.v201.datatypes import IdTokenInfoType
+from ocpp.v201.enums import AuthorizationStatusEnumType
+
+import ocpp_codec
+
+
+def schedules(periods: int) -> List[Dict[str, Any]]:
+    return [{"startPeriod": i * 900, "limit": 7000 + (i % 4) * 5000, "useESS": i % 3 == 0}
+            for i in range(periods)] + [{"startPeriod": periods * 900, "limit": 0, "useESS": False}]
+
+
+def authorize(periods: int):
+    request = [2, "a1b2c3", "Authorize", {"idToken": {"idToken": "token-1234", "type": "Central"}}]
+    response = call_result.Authorize(
+        id_token_info=IdTokenInfoType(status=AuthorizationStatusEnumType.accepted),
+        custom_data={
+            "vendorId": "ChargeSet", "userId": "user-00001", "idToken": "token-1234",
+            "chargingSchedules": schedules(periods), "connectorId": 1, "evseId": "EVSE-ST1-001",
+            "reservationId": "6650c0ffee0000000000abcd", "startTime": "2025-04-14 13:00:00",
+            "endTime": "2025-04-14 15:00:00", "cost": 4200, "targetEnergyWh": 12000,
+        })
+    return json.dumps(request), response
+
+
+def transaction_event(periods: int):
+    request = [2, "d4e5f6", "TransactionEvent", {
+        "eventType": "Started", "timestamp": "2025-04-14T13:00:00+00:00", "triggerReason": "Authorized",
+        "seqNo": 1, "transactionInfo": {"transactionId": "0f8e6b0a-7c1e-4d7b-9b55-3f8a2f0d9e11"},
+        "evse": {"id": 1, "connectorId": 1},
+        "customData": {
+            "vendorId": "ChargeSet", "evseId": "EVSE-ST1-001", "connectorId": 1, "userId": "user-00001",
+            "idToken": "token-1234", "reservationId": "6650c0ffee0000000000abcd",
+            "chargingSchedules": [{"start_period": p["startPeriod"], "limit": p["limit"], "use_ess": p["useESS"]}
+                                  for p in schedules(periods)],
+            "startTime": "2025-04-14T13:00:00", "endTime": "2025-04-14T15:00:00", "cost": 4200, "energyWh": 12000,
+        },
+    }]
+    return json.dumps(request), call_result.TransactionEvent()
+
+
+def library_path(raw: str, response, validate: bool) -> str:
+    msg = unpack(raw)
+    if validate:
+        _validate_payload(msg, "2.0.1")
+    camel_to_snake_case(msg.payload)
+    result = msg.create_call_result(snake_to_camel_case(remove_nones(serialize_as_dict(response))))
+    if validate:
+        _validate_payload(result, "2.0.1")
+    return result.to_json()
+
+
+def fast_path(raw: str, response, validate: bool) -> str:
+    msg = ocpp_codec.unpack(raw)
+    if validate:
+        _validate_payload(msg, "2.0.1")
+    ocpp_codec.camel_to_snake_case(msg.payload)
+    payload = ocpp_codec.to_payload(response)
+    if validate:
+        _validate_payload(msg.create_call_result(payload), "2.0.1")
+    return ocpp_codec.call_result_json(msg.unique_id, payload)
+
+
+def measure(path: Callable[..., str], raw: str, response, validate: bool, iterations: int) -> float:
+    path(raw, response, validate)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        path(raw, response, validate)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCPP JSON encode/decode path micro benchmark")
+    parser.add_argument("--periods", type=int, nargs="+", default=[24, 96])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = []
+    for name, build in (("Authorize", authorize), ("TransactionEvent", transaction_event)):
+        for periods in args.periods:
+            raw, response = build(periods)
+            assert json.loads(library_path(raw, response, True)) == json.loads(fast_path(raw, response, True))
+            result = {"action": name, "periods": periods, "request_bytes": len(raw),
+                      "json_backend": ocpp_codec.JSON_BACKEND}
+            for label, path, validate in (("ocpp_us", library_path, True), ("fast_us", fast_path, True),
+                                          ("ocpp_nocheck_us", library_path, False),
+                                          ("fast_nocheck_us", fast_path, False)):
+                result[label] = round(measure(path, raw, response, validate, args.iterations), 1)
+            results.append(result)
+            print(json.dumps(result))
+    return results
+
+
+if __name__ == "__main__":
+    main()
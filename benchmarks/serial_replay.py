@@ -0,0 +1,94 @@
+"""
+시리얼 프레이밍(serial_framing) 디코드 벤치마크.
+
+녹화한 시리얼 캡처(ESP32 에서 받은 raw 바이트 파일)를 청크 단위로 디코더에 넣고 처리 시간을 잰다.
+캡처를 주지 않으면 RFID 태그 줄/프레임과 텔레메트리 프레임을 섞어서 만든다.
+line 캡처는 기존 ESP32Protocol 방식(str += decode, split('\\n', 1))과도 비교한다.
+
+    python benchmarks/serial_replay.py --framing line --frames 20000
+    python benchmarks/serial_replay.py --framing cobs capture1.bin capture2.bin --chunk 1 64
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serial_framing
+from serial_framing import FRAME_ID_TOKEN, Telemetry, encode_frame, encode_telemetry
+
+
+def synthesize(framing: str, frames: int) -> bytes:
+    out = bytearray()
+    for index in range(frames):
+        token = f"token-{index % 1000:04d}-한글"
+        if framing == "line":
+            out += (token + "\n").encode()
+        elif index % 4:
+            out += encode_telemetry(Telemetry(1, index * 100, 7000, index))
+        else:
+            out += encode_frame(FRAME_ID_TOKEN, token.encode())
+    return bytes(out)
+
+
+def chunks(data: bytes, low: int, high: int):
+    random.seed(0)
+    position = 0
+    while position < len(data):
+        size = random.randint(low, high)
+        yield data[position:position + size]
+        position += size
+
+
+def legacy_decode(pieces) -> int:
+    """기존 ESP32Protocol.data_received (UTF-8 문자가 나뉘면 errors="replace" 가 없으면 예외)"""
+    buffer = ""
+    count = 0
+    for piece in pieces:
+        buffer += piece.decode(errors="replace")
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            count += 1
+    return count
+
+
+def framed_decode(framing: str, pieces) -> int:
+    decoder = serial_framing.decoder(framing)
+    return sum(len(decoder.feed(piece)) for piece in pieces)
+
+
+def measure(fn, data: bytes, low: int, high: int) -> dict:
+    pieces = list(chunks(data, low, high))
+    started = time.perf_counter()
+    frames = fn(pieces)
+    elapsed = time.perf_counter() - started
+    return {"frames": frames, "ms": round(elapsed * 1000, 2), "MB_per_s": round(len(data) / elapsed / 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serial framing decode throughput")
+    parser.add_argument("captures", nargs="*", help="raw serial capture files (default: synthesized)")
+    parser.add_argument("--framing", choices=["line", "cobs"], default="line")
+    parser.add_argument("--frames", type=int, default=20000, help="synthesized frames when no capture is given")
+    parser.add_argument("--chunk", type=int, nargs=2, default=[1, 64], metavar=("MIN", "MAX"),
+                        help="bytes per data_received call")
+    args = parser.parse_args()
+
+    if args.captures:
+        data = b"".join(open(path, "rb").read() for path in args.captures)
+    else:
+        data = synthesize(args.framing, args.frames)
+
+    results = {"bytes": len(data), "framing": args.framing}
+    for name, low, high in (("chunked", args.chunk[0], args.chunk[1]), ("burst", len(data), len(data))):
+        results[name] = {"framed": measure(lambda pieces: framed_decode(args.framing, pieces), data, low, high)}
+        if args.framing == "line":
+            results[name]["legacy"] = measure(legacy_decode, data, low, high)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
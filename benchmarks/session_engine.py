@@ -0,0 +1,139 @@
+"""
+충전 세션 엔진(charging_session.SessionEngine) 배속 벤치마크.
+
+하루짜리 임의 충전 프로파일을 가진 세션 N 개를 CSMS 없이 (응답만 하는 가짜 충전소로) 배속으로 진행하고
+걸린 시간, 보낸 TransactionEvent 수, 끝난 시각이 예정보다 늦은 정도를 잰다.
+세션마다 seqNo 가 1 씩 늘었는지, Ended 의 에너지가 프로파일 적분값과 같은지도 확인한다.
+--baseline 이면 세션마다 sleep 루프를 도는 coroutine 으로 같은 일을 해서 비교한다.
+
+    python benchmarks/session_engine.py --sessions 1000 5000 --seconds 5 --meter-interval 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from charging_profile import CompiledProfile
+from charging_session import ENDED, SessionEngine
+
+
+class FakeStation:
+    """TransactionEvent 를 기록만 하는 충전소"""
+
+    def __init__(self):
+        self.seq_nos: Dict[str, List[int]] = {}
+        self.ended: Dict[str, int] = {}
+        self.messages = 0
+
+    def _record(self, transaction_id: str, seq_no: int):
+        self.seq_nos.setdefault(transaction_id, []).append(seq_no)
+        self.messages += 1
+
+    async def start_transaction(self, *args, _transaction_id: str, _seq_no: int):
+        self._record(_transaction_id, _seq_no)
+        return {}
+
+    async def update_transaction(self, transaction_id, seq_no, *args):
+        self._record(transaction_id, seq_no)
+        return {}
+
+    async def stop_transaction(self, transaction_id, reason, evse_id, connector_id, reservation_id, id_token,
+                               _seq_no: int, _total_cost: int, _total_energy: int):
+        self._record(transaction_id, _seq_no)
+        self.ended[transaction_id] = _total_energy
+        return {}
+
+
+def day_schedule() -> List[Dict[str, Any]]:
+    periods = [{"startPeriod": 0, "limit": random.choice([3600, 7000, 11000, 22000]), "useESS": False}]
+    start = 0
+    while True:
+        start += random.randint(30, 240) * 60
+        if start >= 24 * 3600:
+            break
+        periods.append({"startPeriod": start, "limit": random.choice([0, 3600, 7000, 22000]),
+                        "useESS": random.random() < 0.3})
+    periods.append({"startPeriod": 24 * 3600, "limit": 0, "useESS": False})
+    return periods
+
+
+def authorization(index: int) -> Dict[str, Any]:
+    return {"evse_id": f"EVSE-{index}", "connector_id": 1, "reservation_id": f"res-{index}",
+            "id_token": f"tok-{index}", "user_id": f"user-{index}", "charging_schedules": day_schedule(),
+            "start_time": "", "end_time": "", "cost": 0, "target_energy_wh": 0}
+
+
+async def run_engine(sessions: int, time_scale: float, meter_interval: float) -> Dict[str, Any]:
+    engine = SessionEngine(time_scale, meter_interval)
+    station = FakeStation()
+    started = time.perf_counter()
+    running = [await engine.begin(station, authorization(i)) for i in range(sessions)]
+    states = await asyncio.gather(*(session.finished for session in running))
+    elapsed = time.perf_counter() - started
+    await engine.close()
+
+    ordered = all(seq_nos == list(range(1, len(seq_nos) + 1)) for seq_nos in station.seq_nos.values())
+    energy_error = max(abs(station.ended[session.transaction_id] - round(session.profile.total_energy))
+                       for session in running)
+    return {"elapsed_s": round(elapsed, 2), "lag_s": round(elapsed - 24 * 3600 / time_scale, 2),
+            "ended": states.count(ENDED), "messages": station.messages,
+            "messages_per_s": round(station.messages / elapsed), "seq_no_ordered": ordered,
+            "max_energy_error_wh": energy_error}
+
+
+async def _sleep_session(station: FakeStation, index: int, time_scale: float, meter_interval: float):
+    # 예전 authorize_transaction_manager 처럼 세션마다 sleep 루프
+    profile = CompiledProfile.compile(authorization(index)["charging_schedules"])
+    transaction_id = f"tx-{index}"
+    await station.start_transaction(_transaction_id=transaction_id, _seq_no=1)
+    seq_no, elapsed = 1, 0.0
+    while elapsed < profile.duration:
+        step = min(meter_interval, profile.duration - elapsed)
+        await asyncio.sleep(step / time_scale)
+        elapsed += step
+        seq_no += 1
+        await station.update_transaction(transaction_id, seq_no, round(profile.energy_between(0, elapsed)))
+    await station.stop_transaction(transaction_id, "EVDisconnected", None, None, None, None,
+                                   _seq_no=seq_no + 1, _total_cost=0, _total_energy=round(profile.total_energy))
+
+
+async def run_baseline(sessions: int, time_scale: float, meter_interval: float) -> Dict[str, Any]:
+    station = FakeStation()
+    started = time.perf_counter()
+    await asyncio.gather(*(_sleep_session(station, i, time_scale, meter_interval) for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    return {"elapsed_s": round(elapsed, 2), "lag_s": round(elapsed - 24 * 3600 / time_scale, 2),
+            "messages": station.messages, "messages_per_s": round(station.messages / elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Charging session engine throughput in accelerated time")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--seconds", type=float, default=5, help="real seconds for a simulated day")
+    parser.add_argument("--meter-interval", type=float, default=300, help="session seconds between Updated")
+    parser.add_argument("--baseline", action="store_true", help="also run one sleeping coroutine per session")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    time_scale = 24 * 3600 / args.seconds
+    results = []
+    for sessions in args.sessions:
+        random.seed(args.seed)
+        result = {"sessions": sessions, "time_scale": round(time_scale),
+                  "engine": asyncio.run(run_engine(sessions, time_scale, args.meter_interval))}
+        if args.baseline:
+            random.seed(args.seed)
+            result["baseline"] = asyncio.run(run_baseline(sessions, time_scale, args.meter_interval))
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+사이트 전력 배분(site_allocator.allocate) 계산 시간 벤치마크.
+
+임의의 충전 프로파일을 가진 세션 N 개를 만들고 배분을 반복 계산해서 평균/최대 시간을 잰다.
+배분 결과가 슬롯마다 용량을 넘지 않는지도 확인한다.
+
+    python benchmarks/site_allocation.py --sessions 100 300 1000 --slot-seconds 60
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from charging_profile import CompiledProfile
+from site_allocator import Session, allocate
+
+
+def random_session(index: int, now: float) -> Session:
+    periods = [{"startPeriod": 0, "limit": random.choice([3600, 7000, 11000, 22000]), "useESS": False}]
+    start = 0
+    for _ in range(random.randint(1, 4)):
+        start += random.randint(5, 90) * 60
+        periods.append({"startPeriod": start, "limit": random.choice([7000, 22000, 60000]),
+                        "useESS": random.random() < 0.3})
+    periods.append({"startPeriod": start + random.randint(5, 90) * 60, "limit": 0, "useESS": False})
+    return Session(reservation_id=f"res-{index}", station_id=f"ST-{index // 2:04d}", evse_id=index % 2 + 1,
+                   transaction_id=f"tx-{index}", started_at=now - random.randint(0, 3600),
+                   profile=CompiledProfile.compile(periods))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Site power allocation compute time")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--slot-seconds", type=float, default=60)
+    parser.add_argument("--capacity-per-session", type=float, default=7000,
+                        help="site capacity = sessions x this (W)")
+    parser.add_argument("--ess-per-session", type=float, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(1)
+    results = []
+    for count in args.sessions:
+        now = time.time()
+        sessions = [random_session(i, now) for i in range(count)]
+        capacity, ess_budget = count * args.capacity_per_session, count * args.ess_per_session
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            allocation = allocate(sessions, capacity, ess_budget, now, args.slot_seconds)
+            timings.append(time.perf_counter() - started)
+        total = allocation.allocated.sum(axis=0)
+        results.append({
+            "sessions": count,
+            "slots": len(allocation.slot_starts),
+            "mean_ms": round(statistics.fmean(timings) * 1000, 2),
+            "max_ms": round(max(timings) * 1000, 2),
+            "limited_sessions": int(allocation.limited().sum()),
+            "peak_requested_kw": round(float(allocation.requested.sum(axis=0).max()) / 1000, 1),
+            "peak_allocated_kw": round(float(total.max()) / 1000, 1),
+            "capacity_kw": round((capacity + ess_budget) / 1000, 1),
+            "within_capacity": bool((total <= capacity + ess_budget + 1e-6).all()),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
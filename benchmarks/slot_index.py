@@ -0,0 +1,88 @@
+"""
+예약 슬롯 인덱스(slot_index.SlotIndex) 조회 시간 벤치마크.
+
+충전소 S 개 x EVSE E 개에 하루 R 건씩 D 일치 예약을 임의로 채우고
+slot_free / next_free_slot / station_capacity(24시간) 를 반복해서 평균/최대 시간을 잰다.
+
+    python benchmarks/slot_index.py --stations 100 --evses 4 --per-day 12 --days 14
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slot_index import SlotIndex
+
+
+def fill(index: SlotIndex, stations: int, evses: int, per_day: int, days: int, start: datetime) -> int:
+    count = 0
+    for station in range(stations):
+        for evse in range(evses):
+            evse_id = f"EVSE-ST{station}-{evse:03d}"
+            for day in range(days):
+                cursor = start + timedelta(days=day)
+                for _ in range(per_day):
+                    cursor += timedelta(minutes=random.randint(0, 60))
+                    end = cursor + timedelta(minutes=random.choice([30, 60, 90]))
+                    index.add({"_id": f"res-{count}", "stationId": f"ST-{station:03d}", "evseId": evse_id,
+                               "startTime": cursor, "endTime": end, "reservationStatus": "ACTIVE"})
+                    cursor = end
+                    count += 1
+    return count
+
+
+def measure(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"mean_ms": round(statistics.mean(samples), 4), "max_ms": round(max(samples), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slot index query time")
+    parser.add_argument("--stations", type=int, default=100)
+    parser.add_argument("--evses", type=int, default=4)
+    parser.add_argument("--per-day", type=int, default=12)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    start = datetime(2025, 5, 1)
+    index = SlotIndex()
+    started = time.perf_counter()
+    count = fill(index, args.stations, args.evses, args.per_day, args.days, start)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    def random_evse():
+        return f"EVSE-ST{random.randrange(args.stations)}-{random.randrange(args.evses):03d}"
+
+    def random_time():
+        return start + timedelta(minutes=random.randrange(args.days * 24 * 60))
+
+    def slot_free():
+        begin = random_time()
+        index.is_free(random_evse(), begin, begin + timedelta(hours=1))
+
+    results = {
+        "reservations": count,
+        "build_ms": round(build_ms, 1),
+        "slot_free": measure(slot_free, args.repeat),
+        "next_free_slot": measure(lambda: index.next_free(random_evse(), random_time(), timedelta(hours=1)),
+                                  args.repeat),
+        "station_capacity_24h": measure(
+            lambda: index.station_capacity(f"ST-{random.randrange(args.stations):03d}", random_time(), 24),
+            args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
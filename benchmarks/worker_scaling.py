@@ -0,0 +1,200 @@
+"""
+csms.py --workers N 연결 용량 부하 테스트.
+
+워커 수별로 CSMS 를 새로 띄우고, 여러 클라이언트 프로세스에서 가능한 많은 충전소 연결을 맺은 뒤
+Heartbeat 를 보내면서 연결 수 / 처리량 / 지연시간을 잰다. 마지막에 관리 API 로 모든 충전소에
+Reset 을 보내서 다른 워커에 붙은 충전소까지 명령이 전달되는지 확인한다.
+
+    python benchmarks/worker_scaling.py --workers-list 1 2 4 --connections 8000
+
+클라이언트는 OCPP 라이브러리 없이 JSON 프레임을 직접 보낸다 (클라이언트 CPU 가 병목이 되지 않도록).
+Heartbeat 는 DB 를 쓰지 않지만, CSMS 는 시작할 때 저장소에서 EVSE 상태, 남은 트랜잭션, 예약을 읽으므로
+MongoDB 가 필요하다 (--storage memory 는 워커끼리 공유되지 않아서 --workers 와 같이 쓸 수 없다).
+--mongo-uri (기본값 MONGODB_URI) 로 접속할 수 없으면 측정하지 않고 끝낸다.
+
+    python benchmarks/worker_scaling.py --mongo-uri mongodb://127.0.0.1:27017 --workers-list 1 2 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import websockets
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _station(uri, station_id, args, stats, connect_slots, start_at, stop_at):
+    async with connect_slots:
+        try:
+            ws = await websockets.connect(uri + station_id, subprotocols=["ocpp2.0.1"], open_timeout=30)
+        except Exception:
+            stats["failed"] += 1
+            return
+    stats["connected"] += 1
+    pending = {}
+
+    async def reader():
+        async for raw in ws:
+            message = json.loads(raw)
+            if message[0] == 2:
+                # CSMS 에서 온 명령 (관리 API 라우팅 확인용)
+                stats["commands"] += 1
+                await ws.send(json.dumps([3, message[1], {"status": "Accepted"}]))
+            elif message[1] in pending:
+                pending.pop(message[1]).set_result(None)
+
+    reader_task = asyncio.create_task(reader())
+    try:
+        # 모든 연결이 맺어진 뒤부터 측정
+        await asyncio.sleep(max(0.0, start_at - time.monotonic()))
+        while time.monotonic() < stop_at:
+            await asyncio.sleep(args.interval)
+            unique_id = uuid.uuid4().hex
+            future = asyncio.get_running_loop().create_future()
+            pending[unique_id] = future
+            started = time.perf_counter()
+            await ws.send(json.dumps([2, unique_id, "Heartbeat", {}]))
+            await asyncio.wait_for(future, 30)
+            stats["latencies"].append(time.perf_counter() - started)
+        # 라우팅 확인이 끝날 때까지 연결 유지
+        await asyncio.sleep(args.hold)
+    except Exception:
+        stats["errors"] += 1
+    finally:
+        reader_task.cancel()
+        await ws.close()
+
+
+def _client_process(uri, first, count, args_dict, start_at_wall, stop_at_wall):
+    args = argparse.Namespace(**args_dict)
+    stats = {"connected": 0, "failed": 0, "errors": 0, "commands": 0, "latencies": []}
+
+    async def run():
+        connect_slots = asyncio.Semaphore(args.handshake_concurrency)
+        start_at = time.monotonic() + (start_at_wall - time.time())
+        stop_at = time.monotonic() + (stop_at_wall - time.time())
+        await asyncio.gather(*(
+            _station(uri, f"LOAD-{first + i:06d}", args, stats, connect_slots, start_at, stop_at)
+            for i in range(count)
+        ))
+
+    asyncio.run(run())
+    return stats
+
+
+async def _reset_all(admin_port):
+    async with websockets.connect(f"ws://127.0.0.1:{admin_port}", max_size=None) as admin:
+        await admin.send(json.dumps({"id": 1, "command": "reset", "stations": "*", "params": {"type": "Immediate"},
+                                     "timeout": 30, "concurrency": 500}))
+        response = json.loads(await admin.recv())
+    return sum(1 for result in response["results"].values() if result["status"] == "Ok"), len(response["results"])
+
+
+def check_mongo(uri):
+    """CSMS 를 띄우기 전에 MongoDB 에 접속되는지 확인한다 (안 되면 CSMS 가 시작하다가 멈춘다)"""
+    client = MongoClient(uri, serverSelectionTimeoutMS=3000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        raise SystemExit(f"MongoDB is not reachable at {uri or 'localhost'}: {e}")
+    finally:
+        client.close()
+
+
+def run_once(workers, args):
+    port, admin_port = free_port(), free_port()
+    env = dict(os.environ, STORAGE_BACKEND="mongo")
+    if args.mongo_uri:
+        env["MONGODB_URI"] = args.mongo_uri
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "csms.py"), "--host", "127.0.0.1", "--port", str(port),
+         "--admin-port", str(admin_port), "--workers", str(workers), "--skip-index-bootstrap"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 30
+        while True:
+            if server.poll() is not None:
+                raise SystemExit(f"CSMS exited with status {server.returncode} before accepting connections")
+            if time.time() >= deadline:
+                raise SystemExit("CSMS did not open the admin port within 30 s")
+            try:
+                socket.create_connection(("127.0.0.1", admin_port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.2)
+
+        uri = f"ws://127.0.0.1:{port}/"
+        per_process = args.connections // args.client_processes
+        started = time.time()
+        start_at = started + args.ramp
+        stop_at = start_at + args.duration
+        with multiprocessing.get_context("spawn").Pool(args.client_processes) as pool:
+            pending = pool.starmap_async(_client_process, [
+                (uri, i * per_process, per_process, vars(args), start_at, stop_at) for i in range(args.client_processes)
+            ])
+            # Heartbeat 측정이 끝나고 연결이 유지되는 동안 전체 Reset
+            time.sleep(max(0.0, stop_at - time.time()) + 1)
+            routed, targeted = asyncio.run(_reset_all(admin_port))
+            results = pending.get()
+
+        latencies = [latency for stats in results for latency in stats["latencies"]]
+        return {
+            "workers": workers,
+            "connected": sum(stats["connected"] for stats in results),
+            "failed": sum(stats["failed"] for stats in results),
+            "errors": sum(stats["errors"] for stats in results),
+            "heartbeats_per_s": round(len(latencies) / args.duration, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "reset_ok": routed,
+            "reset_targeted": targeted,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connection capacity vs. CSMS worker count")
+    parser.add_argument("--workers-list", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGODB_URI"),
+                        help="MongoDB the CSMS workers start from (default: MONGODB_URI or localhost)")
+    parser.add_argument("--connections", type=int, default=4000)
+    parser.add_argument("--client-processes", type=int, default=max(1, os.cpu_count() // 2))
+    parser.add_argument("--handshake-concurrency", type=int, default=200, help="per client process")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between heartbeats per station")
+    parser.add_argument("--ramp", type=float, default=20.0, help="seconds allowed for connecting")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of heartbeat measurement")
+    parser.add_argument("--hold", type=float, default=15.0, help="seconds to keep connections open for the reset")
+    args = parser.parse_args()
+
+    check_mongo(args.mongo_uri)
+    report = [run_once(workers, args) for workers in args.workers_list]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+WebSocket 전송 프로파일(transport.PROFILES)별 연결당 메모리 벤치마크.
+
+프로파일마다 CSMS 대신 받은 메시지를 그대로 돌려주는 서버를 자식 프로세스로 띄우고 (같은 serve_kwargs 사용)
+클라이언트 N 개를 붙인다 (클라이언트는 모두 deflate 를 요청). 서버 프로세스의 RSS 증가분을 연결 수로 나눠서
+
+    idle     연결만 해 둔 상태
+    active   연결마다 TransactionEvent 크기의 메시지를 한 번 주고받은 뒤 (zlib 문맥이 만들어짐)
+
+를 잰다. wire_ratio 는 그 메시지가 압축되어 나간 크기 / 원래 크기 (압축하지 않으면 1).
+per-station 은 연결의 절반(LTE-*)만 압축한다.
+
+    python benchmarks/ws_memory.py --connections 2000
+    python benchmarks/ws_memory.py --connections 2000 --profiles default lean --compression per-station
+"""
+import argparse
+import asyncio
+import dataclasses
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+
+import transport
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def message(index: int) -> str:
+    # 충전소가 보내는 TransactionEvent(Updated) 정도의 크기
+    return json.dumps([2, f"msg-{index}", "TransactionEvent", {
+        "eventType": "Updated", "timestamp": "2024-05-01T10:00:00+00:00", "triggerReason": "MeterValuePeriodic",
+        "seqNo": 7, "transactionInfo": {"transactionId": f"4f7c1a52-{index:08d}", "chargingState": "Charging"},
+        "evse": {"id": 1, "connectorId": 1},
+        "meterValue": [{"timestamp": "2024-05-01T10:00:00+00:00", "sampledValue": [
+            {"value": 1200.5 + i, "measurand": measurand, "context": "Sample.Periodic"}
+            for i, measurand in enumerate(["Energy.Active.Import.Register", "Power.Active.Import",
+                                           "Current.Import", "Voltage", "SoC"])]}],
+        "customData": {"vendorId": "kr.ev", "totalCost": 3120, "totalEnergy": 11820},
+    }])
+
+
+def rss(pid: int) -> int:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+async def _echo(websocket, path):
+    async for data in websocket:
+        await websocket.send(data)
+
+
+def run_server(profile: transport.TransportProfile, port: int, ready):
+    async def main():
+        async with websockets.serve(_echo, "127.0.0.1", port, **transport.serve_kwargs(profile, "LTE-*")):
+            gc.collect()
+            ready.set()
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+async def _settle(pid: int) -> int:
+    # 서버가 받은 것을 다 처리할 때까지 RSS 가 변하지 않기를 기다린다
+    previous = -1
+    while True:
+        await asyncio.sleep(0.5)
+        current = rss(pid)
+        if current == previous:
+            return current
+        previous = current
+
+
+async def measure(profile: transport.TransportProfile, connections: int, port: int) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    server = context.Process(target=run_server, args=(profile, port, ready), daemon=True)
+    server.start()
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, ready.wait)
+        base = await _settle(server.pid)
+
+        clients: List[Any] = []
+        for index in range(connections):
+            station_id = f"LTE-{index}" if index % 2 else f"ST-{index}"
+            clients.append(await websockets.connect(f"ws://127.0.0.1:{port}/{station_id}", ping_interval=None,
+                                                    max_queue=None))
+        idle = await _settle(server.pid)
+
+        payloads = [message(index) for index in range(connections)]
+        await asyncio.gather(*(client.send(payload) for client, payload in zip(clients, payloads)))
+        echoed = await asyncio.gather(*(client.recv() for client in clients))
+        assert echoed == payloads
+        active = await _settle(server.pid)
+
+        compressed = [client for client in clients if client.extensions]
+        wire_ratio = 1.0
+        if compressed:
+            # 연결을 닫기 전이니 클라이언트의 압축 문맥을 그대로 써도 된다 (두 번째 메시지로 압축)
+            frame = websockets.frames.Frame(websockets.frames.OP_TEXT, payloads[1].encode())
+            wire_ratio = len(compressed[0].extensions[0].encode(frame).data) / len(frame.data)
+
+        await asyncio.gather(*(client.close() for client in clients))
+        return {"compressed_connections": len(compressed),
+                "idle_kib_per_connection": round((idle - base) / connections / 1024, 1),
+                "active_kib_per_connection": round((active - base) / connections / 1024, 1),
+                "server_rss_mib": round(active / 2 ** 20, 1), "wire_ratio": round(wire_ratio, 2)}
+    finally:
+        server.kill()
+        server.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-connection server memory for each WebSocket transport profile")
+    parser.add_argument("--connections", type=int, default=2000)
+    parser.add_argument("--profiles", nargs="+", default=list(transport.PROFILES))
+    parser.add_argument("--compression", choices=["on", "off", "per-station"],
+                        help="override the compression of every profile")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+
+    results = []
+    for name in args.profiles:
+        profile = transport.PROFILES[name]
+        if args.compression:
+            profile = dataclasses.replace(profile, compression=args.compression)
+        started = time.perf_counter()
+        result = {"profile": name, "compression": profile.compression, "connections": args.connections,
+                  **asyncio.run(measure(profile, args.connections, args.port))}
+        result["elapsed_s"] = round(time.perf_counter() - started, 1)
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+
+if __name__ == "__main__":
+    main()
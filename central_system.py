@@ -1,4 +1,7 @@
+import asyncio
+import inspect
 import logging
+import time
 from datetime import datetime
 import sys
 
@@ -9,7 +12,9 @@ from bson import ObjectId
 from dotenv import load_dotenv
 from typing import Any, Dict, List, Optional
 
-from ocpp.charge_point import snake_to_camel_case
+from ocpp.charge_point import _raise_key_error
+from ocpp.exceptions import OCPPError, PropertyConstraintViolationError
+from ocpp.messages import MessageType, validate_payload
 from ocpp.routing import on
 from ocpp.v201 import ChargePoint as cp
 from ocpp.v201 import call, call_result
@@ -23,68 +28,370 @@ from ocpp.v201.enums import (
     GenericStatusEnumType,
     Iso15118EVCertificateStatusEnumType
 )
-from pymongo import MongoClient
-
-class ColorFormatter(logging.Formatter):
-    COLORS = {
-        logging.DEBUG: "\033[94m",    # 파랑
-        logging.INFO: "\033[92m",     # 초록
-        logging.WARNING: "\033[93m",  # 노랑
-        logging.ERROR: "\033[91m",    # 빨강
-        logging.CRITICAL: "\033[95m", # 보라
-    }
-    RESET = "\033[0m"
-
-    def format(self, record):
-        log_color = self.COLORS.get(record.levelno, self.RESET)
-        message = super().format(record)
-        return f"{log_color}{message}{self.RESET}"
-
-
-# 색상 적용
-for handler in logging.getLogger().handlers:
-    handler.setFormatter(ColorFormatter(handler.formatter._fmt))
-
-#logging.basicConfig(level=logging.INFO)
-# 전역 로거 설정
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(asctime)s] %(levelname)-8s | %(name)s | %(message)s",
-    datefmt="%H:%M:%S",
-)
+
+import metrics
+import ocpp_codec
+from admission import BootThrottle
+from cache import TTLCache
+from dedup import replay_cache
+from charging_profile import ChargingProfileError, CompiledProfile
+from log_config import station_id
+from registry import registry
+from reservation_scheduler import ReservationScheduler
+from session_sync import SessionSync
+from site_allocator import Session, SiteAllocator
+from slot_index import SlotConflict, SlotIndex
+from station_state import StationStateCache
+from storage import Storage, create_storage
+from presence import HeartbeatSweeper
+from write_behind import CostWriteBuffer, MeterSampleBuffer, StationStatusBuffer
+
 # 환경설정
 load_dotenv()
 
-mongodb_uri = os.getenv("MONGODB_URI")
+# 모든 DB 접근은 storage 를 통해서 (이벤트 루프를 막지 않음), 서버 시작 때 init_storage() 로 만든다
+storage: Optional[Storage] = None
+
+
+def init_storage(backend: Optional[str] = None) -> Storage:
+    """backend: "mongo" | "memory" (기본값은 STORAGE_BACKEND). 이미 만들어져 있으면 그대로 사용한다."""
+    global storage
+    if storage is None:
+        storage = create_storage(backend)
+        logging.info("Storage backend: %s", type(storage).__name__)
+    return storage
+
+# Authorize 결과 캐시 (idToken -> 예약 + chargingSchedules), 예약 상태가 바뀌면 무효화
+AUTHORIZE_CACHE_TTL = float(os.getenv("AUTHORIZE_CACHE_TTL", "30"))
+AUTHORIZE_CACHE_SIZE = int(os.getenv("AUTHORIZE_CACHE_SIZE", "10000"))
+authorize_cache = TTLCache(maxsize=AUTHORIZE_CACHE_SIZE, ttl=AUTHORIZE_CACHE_TTL)
+# reservationId -> idToken (무효화할 때 사용)
+_authorize_cache_tokens = TTLCache(maxsize=AUTHORIZE_CACHE_SIZE, ttl=AUTHORIZE_CACHE_TTL)
+
+
+async def find_authorization(id_token: str) -> Optional[Dict[str, Any]]:
+    reservation_data = authorize_cache.get(id_token)
+    if reservation_data is None:
+        reservation_data = await storage.find_authorization(id_token)
+        if reservation_data is not None:
+            authorize_cache.set(id_token, reservation_data)
+            _authorize_cache_tokens.set(str(reservation_data["_id"]), id_token)
+    return reservation_data
+
+
+# reservationId -> CompiledProfile (Authorize, TransactionEvent 가 같은 객체를 사용)
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "3600"))
+compiled_profiles = TTLCache(maxsize=AUTHORIZE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+
+
+def compiled_profile(reservation_id: str, schedules: Optional[List[Dict[str, Any]]]) -> Optional[CompiledProfile]:
+    """캐시된 프로파일, 없으면 schedules 를 컴파일한다. 프로파일이 없거나 잘못되었으면 None."""
+    profile = compiled_profiles.get(reservation_id)
+    if profile is None and schedules is not None:
+        try:
+            profile = CompiledProfile.compile(schedules)
+        except ChargingProfileError as e:
+            logging.error("Invalid charging profile for reservation %s: %s", reservation_id, e)
+            return None
+        compiled_profiles.set(reservation_id, profile)
+    return profile
+
+
+async def _write_costs(updates):
+    await storage.update_transaction_costs(updates)
+
+# CostUpdated 는 바로 쓰지 않고 모아서 bulk_write
+cost_buffer = CostWriteBuffer(_write_costs)
+
+
+async def _write_meter_samples(samples):
+    await storage.insert_meter_samples(samples)
+
+# CostUpdated 마다 계량값 샘플 (충전 곡선), 트랜잭션 문서에는 마지막 값만 남는다
+meter_buffer = MeterSampleBuffer(_write_meter_samples)
+
+
+def reservation_object_id(reservation_id: Any) -> ObjectId:
+    """
+    충전소가 보낸 reservationId. ObjectId 가 아니면 PropertyConstraintViolation (CALLERROR).
+    버퍼에 넣기 전에 확인한다 (flush 할 때 실패하면 같은 배치의 다른 충전소 기록까지 밀린다).
+    """
+    if not isinstance(reservation_id, str) or not ObjectId.is_valid(reservation_id):
+        raise PropertyConstraintViolationError(description="reservationId is not a valid reservation id",
+                                               details={"reservationId": reservation_id})
+    return ObjectId(reservation_id)
+
+
+def record_costs(reservation_id: str, cost, energy_wh):
+    """충전 중 누적 cost/energy (CostUpdated, TransactionEvent Updated/Ended)"""
+    reservation_object_id(reservation_id)
+    cost, energy_wh = int(cost), int(energy_wh)
+    cost_buffer.add(reservation_id, cost, energy_wh)
+    meter_buffer.add(reservation_id, datetime.now(), energy_wh, cost)
+
+
+def invalidate_reservation(reservation_id: str, id_token: Optional[str] = None):
+    id_token = _authorize_cache_tokens.get(reservation_id) or id_token
+    _authorize_cache_tokens.invalidate(reservation_id)
+    if id_token is not None:
+        authorize_cache.invalidate(id_token)
+
+async def _write_statuses(updates):
+    await storage.set_stations_evse_status(updates)
+
+# 연결/종료 때의 충전소 EVSE 상태도 모아서 bulk_write (재접속이 몰릴 때 DB 쓰기 수를 줄임)
+status_buffer = StationStatusBuffer(_write_statuses)
+
+# 충전소/EVSE 상태 캐시 (csms.py 에서 load), 바뀌지 않는 상태 쓰기는 건너뛴다
+station_state = StationStateCache()
+
+
+def set_station_status(station_id: str, status: str):
+    """충전소 EVSE 들의 상태가 바뀌는 경우에만 status_buffer 에 넣는다"""
+    if station_state.station_changed(station_id, status):
+        status_buffer.add(station_id, status)
+
+# 재접속 폭주 때 BootNotification 처리량 제한 (넘으면 Pending)
+boot_throttle = BootThrottle()
+
+# BootNotification 응답의 Heartbeat 주기, 이 주기의 OFFLINE_TIMEOUT_FACTOR 배 동안 조용하면 오프라인
+HEARTBEAT_INTERVAL = int(os.getenv("HEARTBEAT_INTERVAL", "300"))
+
+
+def _mark_offline(entries):
+    for entry in entries:
+        set_station_status(entry.charge_point_id, "OFFLINE")
+
+# 끊긴 줄 모르는 연결 (TCP half-open) 정리 (csms.py 에서 start)
+heartbeat_sweeper = HeartbeatSweeper(registry, _mark_offline, HEARTBEAT_INTERVAL)
+
+# TransactionEvent Started/Ended 의 transaction, reservation, evse 기록 (csms.py 에서 start)
+session_sync = SessionSync(station_state)
+
+# 예약 시간 겹침 확인, 빈 슬롯 조회 (csms.py 에서 primary 프로세스만 start)
+slot_index = SlotIndex()
+
+
+def _on_reservation_transition(reservation_id: str, id_token: str, status: str):
+    invalidate_reservation(reservation_id, id_token)
+    slot_index.update_status(reservation_id, status)
+
+# ACTIVE -> WAITING -> EXPIRED 전이 (csms.py 에서 start)
+reservation_scheduler = ReservationScheduler(on_transition=_on_reservation_transition)
+
+
+# Authorize 응답(custom_data)을 만들 때 읽는 예약 필드와 타입
+RESERVATION_FIELDS: Dict[str, Any] = {
+    "stationId": str, "evseId": str, "connectorId": int, "userId": str, "idToken": str,
+    "startTime": datetime, "endTime": datetime, "cost": (int, float), "targetEnergyWh": (int, float),
+}
+
+
+def check_reservation(reservation: Dict[str, Any], charging_schedules: Any) -> CompiledProfile:
+    """예약이 Authorize 까지 쓸 수 있는지 확인하고 컴파일한 충전 프로파일을 반환한다. 아니면 ValueError."""
+    for key, types in RESERVATION_FIELDS.items():
+        value = reservation.get(key)
+        if isinstance(value, bool) or not isinstance(value, types) or value == "":
+            raise ValueError(f"reservation.{key} is missing or has the wrong type")
+    if reservation["connectorId"] < 1 or reservation["cost"] < 0 or reservation["targetEnergyWh"] <= 0:
+        raise ValueError("reservation.connectorId, cost or targetEnergyWh is out of range")
+    if reservation["endTime"] <= reservation["startTime"]:
+        raise ValueError("endTime must be after startTime")
+    if not isinstance(charging_schedules, list) or not all(isinstance(period, dict) for period in charging_schedules):
+        raise ValueError("charging_schedules must be a list of charging schedule periods")
+    return CompiledProfile.compile(charging_schedules)
+
+
+async def book_reservation(reservation: Dict[str, Any], charging_schedules: List[Dict[str, Any]]) -> str:
+    """
+    같은 EVSE 의 예약과 시간이 겹치지 않으면 예약 + 충전 프로파일을 저장하고 reservationId 를 반환한다.
+    예약이나 프로파일이 잘못되었으면 ValueError, 겹치면 SlotConflict (겹치는 예약 id). 둘 다 저장하지 않는다.
+    """
+    profile = check_reservation(reservation, charging_schedules)
+    conflict = slot_index.conflict(reservation["evseId"], reservation["startTime"], reservation["endTime"])
+    if conflict is not None:
+        raise SlotConflict(conflict)
+    reservation.setdefault("_id", ObjectId())
+    reservation.setdefault("reservationStatus", "ACTIVE")
+    reservation.setdefault("createdAt", datetime.now())
+    # 저장을 기다리는 동안 들어온 예약이 같은 슬롯을 잡지 않도록 인덱스에 먼저 넣는다
+    slot_index.add(reservation)
+    try:
+        await storage.insert_reservations([reservation])
+        await storage.insert_charging_profiles([{
+            "reservationId": str(reservation["_id"]),
+            "chargingProfileKind": "ABSOLUTE",
+            "startSchedule": reservation["startTime"],
+            "chargingSchedules": charging_schedules,
+        }])
+    except Exception:
+        slot_index.remove(str(reservation["_id"]))
+        raise
+    compiled_profiles.set(str(reservation["_id"]), profile)
+    reservation_scheduler.schedule(reservation)
+    return str(reservation["_id"])
+
+
+def charging_profile_snapshot(reservation_id: str, schedules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """트랜잭션에 남기는 프로파일: Authorize 때 컴파일한 것, 없으면 충전소가 보낸 값"""
+    profile = compiled_profile(reservation_id, schedules)
+    return profile.schedules if profile is not None else ocpp_codec.snake_to_camel_case(schedules)
+
+
+# 핸들러 함수 -> call_unique_id 인자를 받는지 (inspect.signature 를 메시지마다 하지 않도록)
+_wants_unique_id: Dict[Any, bool] = {}
+
+
+def _call_handler(handler, payload: Dict[str, Any], unique_id: str):
+    func = getattr(handler, "__func__", handler)
+    wants_unique_id = _wants_unique_id.get(func)
+    if wants_unique_id is None:
+        wants_unique_id = _wants_unique_id[func] = "call_unique_id" in inspect.signature(handler).parameters
+    if wants_unique_id:
+        return handler(**payload, call_unique_id=unique_id)
+    return handler(**payload)
+
+
+# 충전 중인 세션의 프로파일 합이 사이트 용량(SITE_CAPACITY_W)을 넘으면 세션별 limit 를 줄여서 전송
+site_allocator = SiteAllocator()
 
-client = MongoClient(mongodb_uri)
-db = client["charge-set"]
-reservation_collection = db["reservation"]
-charging_profile_collection = db["chargingProfile"]
-transaction_collection = db["transaction"]
-evse_collection = db["evse"]
 
 class ChargePointHandler(cp):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.charge_point_id = args[0]
-        print("Connected charge point id:", self.charge_point_id)
+        # 처리 중인 CALL (이 CALL 의 CALLRESULT 를 replay_cache 에 저장)
+        self._replying_to = None
+        logging.debug("Connected charge point id: %s", self.charge_point_id)
+
+    async def route_message(self, raw_msg):
+        station_id.set(self.charge_point_id)
+        registry.touch(self.charge_point_id)
+        if ocpp_codec.OCPP_CODEC != "fast":
+            await super().route_message(raw_msg)
+            return
+        try:
+            msg = ocpp_codec.unpack(raw_msg)
+        except OCPPError as e:
+            logging.exception("Unable to parse message: '%s', it doesn't seem to be valid OCPP: %s", raw_msg, e)
+            return
+        if msg.message_type_id == MessageType.Call:
+            try:
+                await self._handle_call(msg)
+            except OCPPError as error:
+                logging.exception("Error while handling request '%s'", msg)
+                await self._send(msg.create_call_error(error).to_json())
+        elif msg.message_type_id in (MessageType.CallResult, MessageType.CallError):
+            self._response_queue.put_nowait(msg)
+
+    async def _handle_call(self, msg):
+        # 등록되지 않은 Action 이름으로 라벨이 늘어나지 않도록
+        action = msg.action if msg.action in self.route_map else "unknown"
+        metrics.messages_received.inc(action)
+        metrics.station_messages.inc(self.charge_point_id)
+        # 재전송된 CALL 은 핸들러를 실행하지 않고 처음 보낸 응답을 다시 보낸다
+        cached = replay_cache.lookup(self.charge_point_id, msg.action, msg.unique_id, msg.payload)
+        if cached is not None:
+            logging.info("Replaying the response to a retransmitted %s (%s)", msg.action, msg.unique_id)
+            await self._send(ocpp_codec.call_result_json(msg.unique_id, cached))
+            return None
+        db_time = [0.0]
+        token = metrics.db_time.set(db_time)
+        started = time.perf_counter()
+        self._replying_to = msg
+        try:
+            if ocpp_codec.OCPP_CODEC == "fast":
+                return await self._handle_call_fast(msg)
+            return await super()._handle_call(msg)
+        finally:
+            self._replying_to = None
+            elapsed = time.perf_counter() - started
+            metrics.db_time.reset(token)
+            metrics.handler_seconds.observe(elapsed - db_time[0], action)
+            metrics.handler_db_seconds.observe(db_time[0], action)
+            metrics.station_handler_seconds.inc(self.charge_point_id, amount=elapsed)
+
+    async def _handle_call_fast(self, msg):
+        """ocpp ChargePoint._handle_call 과 같은 순서, 키 변환/직렬화/검증만 ocpp_codec 으로"""
+        handlers = self.route_map.get(msg.action)
+        if handlers is None or "_on_action" not in handlers:
+            _raise_key_error(msg.action, self._ocpp_version)
+            return None
+        validate = (not handlers.get("_skip_schema_validation", False)
+                    and ocpp_codec.validation_policy.should_validate(msg.action))
+        if validate:
+            await validate_payload(msg, self._ocpp_version)
+        snake_case_payload = ocpp_codec.camel_to_snake_case(msg.payload)
+        try:
+            response = _call_handler(handlers["_on_action"], snake_case_payload, msg.unique_id)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as e:
+            logging.exception("Error while handling request '%s'", msg)
+            await self._send(msg.create_call_error(e).to_json())
+            return None
+
+        payload = ocpp_codec.to_payload(response)
+        if validate:
+            await validate_payload(msg.create_call_result(payload), self._ocpp_version)
+        # 응답 payload 를 바로 저장한다 (_send 에서 다시 파싱하지 않음)
+        self._replying_to = None
+        await self._send(ocpp_codec.call_result_json(msg.unique_id, payload))
+        replay_cache.store(self.charge_point_id, msg.action, msg.unique_id, msg.payload, payload)
+
+        after = handlers.get("_after_action")
+        if after is not None:
+            response = _call_handler(after, snake_case_payload, msg.unique_id)
+            if inspect.isawaitable(response):
+                asyncio.ensure_future(response)
+        return response
+
+    async def _send(self, message):
+        await super()._send(message)
+        msg = self._replying_to
+        # CALLRESULT 만 저장 (CALLERROR 는 재전송되면 다시 처리)
+        if msg is not None and message.startswith("[3,"):
+            message_type_id, unique_id, response = ocpp_codec.loads(message)
+            if unique_id == msg.unique_id:
+                replay_cache.store(self.charge_point_id, msg.action, msg.unique_id, msg.payload, response)
+
+    async def call(self, payload, *args, **kwargs):
+        station_id.set(self.charge_point_id)
+        action = type(payload).__name__
+        metrics.calls_in_flight.inc()
+        started = time.perf_counter()
+        result = "error"
+        try:
+            response = await super().call(payload, *args, **kwargs)
+            result = "ok" if response is not None else "call_error"
+            return response
+        except asyncio.TimeoutError:
+            result = "timeout"
+            raise
+        finally:
+            metrics.calls_in_flight.dec()
+            metrics.call_seconds.observe(time.perf_counter() - started, action)
+            metrics.calls_sent.inc(action, result)
 
     @on(Action.boot_notification)
     async def on_boot_notification(self, **kwargs):
         logging.info("Received a BootNotification")
-        # evse 값 업데이트
-        evse_collection.update_many({"stationId": self.charge_point_id},
-                                    {"$set": {"evseStatus": "AVAILABLE", "lastUpdated": datetime.now()}})
+        retry_interval = boot_throttle.admit()
+        if retry_interval is not None:
+            # 처리량을 넘으면 DB 에 쓰지 않고 충전소마다 다른 시각에 다시 Boot 하도록
+            logging.info("Boot throttled, retry in %d s", retry_interval)
+            return call_result.BootNotification(current_time=datetime.now().isoformat(),
+                                                interval=retry_interval, status=RegistrationStatusEnumType.pending)
+        # evse 값 업데이트 (status_buffer 가 여러 충전소의 Boot 를 모아서 bulk_write)
+        set_station_status(self.charge_point_id, "AVAILABLE")
 
         return call_result.BootNotification(current_time=datetime.now().isoformat(),
-                                                   interval=300, status=RegistrationStatusEnumType.accepted)
+                                                   interval=HEARTBEAT_INTERVAL, status=RegistrationStatusEnumType.accepted)
 
     # 연결 끊어질 때
     async def close_connection(self):
         # evse 값 업데이트
-        evse_collection.update_many({"stationId": self.charge_point_id},
-                                    {"$set": {"evseStatus": "OFFLINE", "lastUpdated": datetime.now()}})
+        set_station_status(self.charge_point_id, "OFFLINE")
 
     @on(Action.status_notification)
     def on_status_notification(self, **kwargs):
@@ -96,18 +403,18 @@ class ChargePointHandler(cp):
         return call_result.Heartbeat(current_time=datetime.utcnow().isoformat())
 
     @on(Action.authorize)
-    def on_authorize(self, **kwargs):
+    async def on_authorize(self, **kwargs):
         logging.info("Received a Authorize")
 
         authorize_id_token = kwargs["id_token"]["id_token"]
-        reservation_data = reservation_collection.find_one({"idToken": authorize_id_token, "reservationStatus": "ACTIVE"})
-        print(f"> Auth : {reservation_data}")
+        reservation_data = await find_authorization(authorize_id_token)
+        logging.debug("Auth reservation: %s", reservation_data)
 
         if reservation_data is None:
             logging.error("Reservation not found")
             call_result_authorize = call_result.Authorize(
                 id_token_info=IdTokenInfoType(status=AuthorizationStatusEnumType.invalid))
-            print(f"> call_result_authorize : {call_result_authorize}")
+            logging.debug("call_result_authorize: %s", call_result_authorize)
             return call_result_authorize
 
         match reservation_data["reservationStatus"]:
@@ -142,8 +449,13 @@ class ChargePointHandler(cp):
 
 
         reservation_id = str(reservation_data["_id"])  # 예약 id
-        charging_profile:Dict[str, Any] = charging_profile_collection.find_one({"reservationId": reservation_id})["chargingSchedules"]
-        print(f"> Auth : {charging_profile}")
+        profile = compiled_profile(reservation_id, reservation_data["chargingSchedules"])
+        if profile is None:
+            logging.error("Charging profile not found")
+            return call_result.Authorize(
+                id_token_info=IdTokenInfoType(status=AuthorizationStatusEnumType.invalid))
+        charging_profile = profile.schedules
+        logging.debug("Auth charging profile: %s", charging_profile)
 
         _custom_data: Dict[str, Any] = {
             "vendorId": "ChargeSet",  # 필수 필드를 추가
@@ -170,49 +482,65 @@ class ChargePointHandler(cp):
 
 
     @on(Action.transaction_event)
-    def on_transaction_event(self, **kwargs):
+    async def on_transaction_event(self, **kwargs):
         # kwargs: evse_id, connector_id, user_id, id_token, reservation_id, charging_schedules, start_time, end_time
         if kwargs["event_type"] == "Started":
             logging.info("Transaction Started")
 
-            print(snake_to_camel_case(kwargs['custom_data']['charging_schedules']))
-
-            transaction_collection.insert_one({
+            # 트랜잭션 삽입 + 예약 ONGOING(더 이상 WAITING/EXPIRED 로 바뀌지 않음) + EVSE CHARGING
+            await session_sync.started({
                 "stationId": self.charge_point_id,
+                "transactionId": kwargs['transaction_info']['transaction_id'],
                 "evseId": kwargs['custom_data']['evse_id'],
                 "connectorId": kwargs['custom_data']['connector_id'],
                 "userId": kwargs['custom_data']['user_id'],
                 "idToken": kwargs['custom_data']['id_token'],
-                "reservationId": ObjectId(kwargs['custom_data']['reservation_id']),
+                "reservationId": reservation_object_id(kwargs['custom_data']['reservation_id']),
                 "startTime":datetime.fromisoformat(kwargs['custom_data']['start_time']),
                 "endTime":datetime.fromisoformat(kwargs['custom_data']['end_time']),
                 "energyWh": 0,
                 "cost": 0,
                 "transactionStatus":"CHARGING",
                 "startSchedule": datetime.now(),
-                "chargingProfileSnapshots": snake_to_camel_case(kwargs['custom_data']['charging_schedules'])
+                "chargingProfileSnapshots": charging_profile_snapshot(
+                    kwargs['custom_data']['reservation_id'], kwargs['custom_data']['charging_schedules'])
             })
-            evse_collection.update_one(
-                {"evseId": kwargs['custom_data']["evse_id"]}, {"$set": {"evseStatus": "CHARGING"}})
+            reservation_scheduler.cancel(kwargs['custom_data']["reservation_id"])
+            invalidate_reservation(kwargs['custom_data']["reservation_id"], kwargs['custom_data']['id_token'])
+            profile = compiled_profile(kwargs['custom_data']["reservation_id"], kwargs['custom_data']['charging_schedules'])
+            if profile is not None:
+                site_allocator.add(Session(
+                    reservation_id=kwargs['custom_data']["reservation_id"], station_id=self.charge_point_id,
+                    evse_id=kwargs['evse']['id'], transaction_id=kwargs['transaction_info']['transaction_id'],
+                    started_at=time.time(), profile=profile))
+        if kwargs["event_type"] == "Updated":
+            # 충전 세션 엔진이 보내는 주기 계량값 (CostUpdated 와 같이 기록)
+            custom_data = kwargs.get('custom_data') or {}
+            if "total_cost" in custom_data:
+                record_costs(custom_data["reservation_id"], custom_data['total_cost'], custom_data['total_energy'])
         if kwargs["event_type"] == "Ended":
             logging.info("Transaction Ended")
-            transaction_collection.update_one(
-                {"reservationId":ObjectId(kwargs['custom_data']["reservation_id"])},{"$set":{"transactionStatus":"COMPLETED"}})
-            reservation_collection.update_one(
-                {"_id":ObjectId(kwargs['custom_data']["reservation_id"])},{"$set":{"reservationStatus":"COMPLETED"}}
-            )
-            evse_collection.update_one(
-                {"evseId": kwargs['custom_data']['evse_id']}, {"$set": {"evseStatus": "AVAILABLE"}}
-            )
+            reservation_object_id(kwargs['custom_data']["reservation_id"])
+            if "total_cost" in kwargs['custom_data']:
+                # 마지막 Updated 이후까지 적산한 값
+                record_costs(kwargs['custom_data']["reservation_id"], kwargs['custom_data']['total_cost'],
+                             kwargs['custom_data']['total_energy'])
+            # 남아 있는 cost/energy 는 트랜잭션 종료 기록에 합쳐서, 예약 COMPLETED + EVSE AVAILABLE 까지 한 단위로
+            await session_sync.ended(kwargs['custom_data']["reservation_id"], kwargs['custom_data']['evse_id'],
+                                     cost_buffer.pop(kwargs['custom_data']["reservation_id"]))
+            reservation_scheduler.cancel(kwargs['custom_data']["reservation_id"])
+            invalidate_reservation(kwargs['custom_data']["reservation_id"])
+            compiled_profiles.invalidate(kwargs['custom_data']["reservation_id"])
+            slot_index.update_status(kwargs['custom_data']["reservation_id"], "COMPLETED")
+            site_allocator.remove(kwargs['custom_data']["reservation_id"])
         return call_result.TransactionEvent()
 
     @on(Action.cost_updated)
-    def on_cost_updated(self, **kwargs):
-        logging.info(f"Cost Updated: {kwargs['total_cost']}")
-        logging.info(f"Energy Updated: {kwargs['custom_data']['total_energy']}")
-        transaction_collection.update_one(
-            {"reservationId": ObjectId(kwargs['custom_data']["reservation_id"])},
-            {"$set": {"cost": int(kwargs['total_cost']), "energyWh": int(kwargs['custom_data']['total_energy'])}})
+    async def on_cost_updated(self, **kwargs):
+        logging.debug("Cost Updated: %s", kwargs['total_cost'])
+        logging.debug("Energy Updated: %s", kwargs['custom_data']['total_energy'])
+        record_costs(kwargs['custom_data']["reservation_id"], kwargs['total_cost'],
+                     kwargs['custom_data']['total_energy'])
         return call_result.CostUpdated()
 
     @on(Action.notify_charging_limit)
@@ -257,7 +585,7 @@ class ChargePointHandler(cp):
         return await self.call(payload)
 
     async def request_start_transaction_req(self, **kwargs):
-        print("request start transaction req")
+        logging.debug("request start transaction req")
         payload = call.RequestStartTransaction(**kwargs)
         return await self.call(payload)
 
@@ -342,6 +670,6 @@ class ChargePointHandler(cp):
         return await self.call(payload)
 
     async def heartbeat_req(self, **kwargs):
-        print("heartbeat req")
+        logging.debug("heartbeat req")
         payload = call.Heartbeat(**kwargs)
         return await self.call(payload)
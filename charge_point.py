@@ -9,8 +9,13 @@ import platform
 import logging
 import re
 import os
+import time
 
 from dotenv import load_dotenv
+
+import serial_framing
+import charging_session
+from charging_profile import ChargingProfileError
 from ocpp.v201 import ChargePoint as CP
 from ocpp.v201 import call, call_result
 from ocpp.routing import on
@@ -23,13 +28,16 @@ from ocpp.v201.enums import (
     AttributeEnumType,
     NotifyEVChargingNeedsStatusEnumType,
     GenericStatusEnumType,
-    Iso15118EVCertificateStatusEnumType
+    Iso15118EVCertificateStatusEnumType,
+    ChargingProfileStatusEnumType
 )
 def extract_port_number(location: str) -> str:
     match = re.search(r'\d-\d\.(\d):\d', location)
     return match.group(1) if match else "?"
 
-candidates = [] # 현재 usb 포트
+candidates = set() # 현재 usb 포트
+# ESP32 시리얼 프레이밍: line (기존 펌웨어, 줄 단위 텍스트) | cobs (serial_framing)
+SERIAL_FRAMING = os.getenv("SERIAL_FRAMING", "line")
 
 class ColorFormatter2(logging.Formatter):
     COLORS = {
@@ -60,8 +68,10 @@ logging.basicConfig(
 )
 
 class ChargePoint201(CP):
-    def __init__(self, id, ws):
+    def __init__(self, id, ws, engine=None):
         super().__init__(id, ws)
+        # 충전 세션 엔진 (loadgen 은 배속을 바꾼 엔진을 넘긴다)
+        self.engine = engine if engine is not None else charging_session.engine
 
     async def send_boot_notification(self):
         request = call.BootNotification(
@@ -74,12 +84,28 @@ class ChargePoint201(CP):
         response = await self.call(request)
         logging.info(f"Send a BootNotification")
         logging.info(f"Received a BootNotification")
+        return response
+
+    async def boot(self):
+        """Accepted 될 때까지 BootNotification (CSMS 가 바쁘면 Pending 과 함께 준 interval 뒤에 다시)"""
+        while True:
+            response = await self.send_boot_notification()
+            if response is None or response.status != RegistrationStatusEnumType.pending:
+                return response
+            logging.info(f"BootNotification pending, retrying in {response.interval} s")
+            await asyncio.sleep(response.interval)
 
     async def send_heartbeat(self):
         request = call.Heartbeat()
         response = await self.call(request)
         logging.info("Send a Heartbeat")
 
+    async def heartbeat_loop(self, interval: int):
+        # CSMS 는 interval 의 몇 배 동안 메시지가 없으면 오프라인으로 처리한다
+        while True:
+            await asyncio.sleep(interval)
+            await self.send_heartbeat()
+
     async def send_authorize(self, _id_token: str = "token-3456"):
         request = call.Authorize(
             id_token={"id_token": _id_token, "type": "Central"}
@@ -95,7 +121,8 @@ class ChargePoint201(CP):
             _reservation_id: str = "res-001",
             _charging_schedules: List[Dict[str, Any]] = [{"start_period": 0, "charging_rate_unit": "W", "charging_rate": 0}],
             _start_time:str = '2025-04-14T13:00:00', _end_time:str = '2025-04-14T13:00:00',
-            _cost: int = 1333, _energyWh: int=886787979
+            _cost: int = 1333, _energyWh: int=886787979,
+            _transaction_id: str = "tx-001", _seq_no: int = 1
     ):
         timestamp = datetime.now(timezone.utc).isoformat()
         _custom_data: Dict[str, Any] = {
@@ -115,9 +142,9 @@ class ChargePoint201(CP):
             event_type="Started",
             timestamp=timestamp,
             trigger_reason="Authorized",
-            seq_no=1,
+            seq_no=_seq_no,
             transaction_info={
-                "transaction_id": "tx-001",
+                "transaction_id": _transaction_id,
             },
             evse={"id": _connector_id, "connector_id": _connector_id},
             custom_data=_custom_data
@@ -126,10 +153,12 @@ class ChargePoint201(CP):
         response = await self.call(request)
         logging.info(f"Send a Transaction Started: {request.event_type}")
         logging.info(f"Received a Transaction Started")
+        return response
 
     async def stop_transaction(
             self, _transaction_id: str = "tx-001" , _stopped_reason: str = "EVDisconnected",
-            _evse_id: str = "st", _connector_id: int = 1, _reservation_id: str = "res-001", _id_token:str = "token3456"
+            _evse_id: str = "st", _connector_id: int = 1, _reservation_id: str = "res-001", _id_token:str = "token3456",
+            _seq_no: int = 2, _total_cost: Optional[int] = None, _total_energy: Optional[int] = None
     ):
         timestamp = datetime.now(timezone.utc).isoformat()
         _custom_data:Dict[str, Any] = {
@@ -139,11 +168,15 @@ class ChargePoint201(CP):
             "connectorId": _connector_id,
             "reservationId": _reservation_id,
         }
+        if _total_cost is not None:
+            # 마지막 Updated 이후까지 적산한 값
+            _custom_data["totalCost"] = _total_cost
+            _custom_data["totalEnergy"] = _total_energy
         request = call.TransactionEvent(
             event_type="Ended",
             timestamp=timestamp,
             trigger_reason="EVCommunicationLost",
-            seq_no=2,
+            seq_no=_seq_no,
             transaction_info={
                 "transaction_id": _transaction_id,
                 "stopped_reason": _stopped_reason
@@ -154,6 +187,46 @@ class ChargePoint201(CP):
         response = await self.call(request)
         logging.info(f"Send a Transaction Ended: {request.event_type}")
         logging.info(f"Received a Transaction Ended")
+        return response
+
+    async def update_transaction(
+            self, _transaction_id: str, _seq_no: int, _evse_id: str, _connector_id: int,
+            _reservation_id: str, _total_cost: int, _total_energy: int
+    ):
+        timestamp = datetime.now(timezone.utc).isoformat()
+        _custom_data: Dict[str, Any] = {
+            "vendorId": "ChargeSet",  # 필수 필드를 추가
+            "evseId": _evse_id,
+            "reservationId": _reservation_id,
+            "totalCost": _total_cost,
+            "totalEnergy": _total_energy,
+        }
+        request = call.TransactionEvent(
+            event_type="Updated",
+            timestamp=timestamp,
+            trigger_reason="MeterValuePeriodic",
+            seq_no=_seq_no,
+            transaction_info={
+                "transaction_id": _transaction_id,
+                "charging_state": "Charging",
+            },
+            meter_value=[{
+                "timestamp": timestamp,
+                "sampled_value": [{"value": _total_energy, "measurand": "Energy.Active.Import.Register"}],
+            }],
+            evse={"id": _connector_id, "connector_id": _connector_id},
+            custom_data=_custom_data
+        )
+        response = await self.call(request)
+        logging.debug(f"Send a Transaction Updated: {_total_energy} Wh, {_total_cost} KRW")
+        return response
+
+    @on(Action.set_charging_profile)
+    def on_set_charging_profile(self, evse_id: int, charging_profile: Dict[str, Any], **kwargs):
+        # 사이트 전력 배분: 진행 중인 세션의 limit 을 바꾼다
+        accepted = self.engine.set_charging_profile(self, evse_id, charging_profile)
+        return call_result.SetChargingProfile(
+            status=ChargingProfileStatusEnumType.accepted if accepted else ChargingProfileStatusEnumType.rejected)
 
 
     async def cost_energy_updated(
@@ -180,6 +253,9 @@ async def run_cp(cp):
         await cp.start()
     except websockets.exceptions.ConnectionClosedOK:
         logging.info("Disconnected from CSMS. Shutting down ChargePointManager.")
+    finally:
+        # 연결이 끊긴 뒤에는 세션 메시지를 보내지 않는다
+        cp.engine.interrupt(cp)
 
 async def sleep_in_chunks(total_duration, chunk_size=10):
     remaining = total_duration
@@ -188,7 +264,7 @@ async def sleep_in_chunks(total_duration, chunk_size=10):
         await asyncio.sleep(sleep_time)
         remaining -= sleep_time
 
-async def authorize_transaction_manager(cp, id_token: str = "token-1234", transport=None):
+async def authorize_transaction_manager(cp, id_token: str = "token-1234", transport=None, connector=None):
     authorzie_response = await cp.send_authorize(id_token)
 
     print(authorzie_response.id_token_info['status'])
@@ -208,14 +284,12 @@ async def authorize_transaction_manager(cp, id_token: str = "token-1234", transp
 
     _charging_schedules = authorzie_response.custom_data["charging_schedules"]
     _evse_id = authorzie_response.custom_data['evse_id']
-    _user_id = authorzie_response.custom_data['user_id']
-    _id_token = authorzie_response.custom_data['id_token']
-    _connector_id = authorzie_response.custom_data['connector_id']
-    _start_time = authorzie_response.custom_data['start_time']
-    _end_time = authorzie_response.custom_data['end_time']
-    _reservation_id = authorzie_response.custom_data['reservation_id']
-    _cost = authorzie_response.custom_data['cost']
-    _energyWh = authorzie_response.custom_data['target_energy_wh']
+
+    if connector is not None and _evse_id != connector.evse_id:
+        # 게이트웨이 모드: 다른 EVSE 의 예약으로 태그한 경우
+        logging.error(f"Reservation is for {_evse_id}, not {connector.evse_id}")
+        transport.write((json.dumps({"error": "WrongEVSE", "evseId": _evse_id}) + "\n").encode())
+        return
 
     # 스케쥴 전송
     response = {
@@ -225,66 +299,115 @@ async def authorize_transaction_manager(cp, id_token: str = "token-1234", transp
     transport.write(json_str.encode())
 
 
-    await cp.start_transaction(
-        _user_id, _id_token,
-        _evse_id, _connector_id,
-        _reservation_id, _charging_schedules,
-        _start_time, _end_time,
-        _cost, _energyWh
-    )
-    last_period = 0
-    last_limit = 0
-    now_cost = 0.0
-    now_energy = 0.0
-    for charging_schedule in _charging_schedules:
-        charging_period=charging_schedule["start_period"]
-        charging_limit=charging_schedule["limit"]
-        if charging_period != 0:
-            remaining = charging_period-last_period
-            while remaining > 0:
-                sleep_time = min(12, remaining)
-                await asyncio.sleep(sleep_time)
-                remaining -= sleep_time
-                if last_limit >= 60000:
-                    now_cost += 72
-                    now_energy += 200
-                else:
-                    now_cost += 6
-                    now_energy += 20
-
-                await cp.cost_energy_updated(_reservation_id, now_cost, now_energy)
-
-            last_period=charging_period
-            last_limit=charging_limit
-            if charging_limit == 0:
-                await cp.stop_transaction(
-                    "tx-001", "EVDisconnected", _evse_id, _connector_id, _reservation_id, _id_token
-                )
-    await asyncio.sleep(1)
+    try:
+        session = await cp.engine.begin(cp, authorzie_response.custom_data)
+    except ChargingProfileError as e:
+        logging.error(f"Invalid charging schedules: {e}")
+        transport.write((json.dumps({"error": "InvalidChargingProfile"}) + "\n").encode())
+        return
+    # 충전은 세션 엔진이 진행하고, 여기서는 커넥터의 세션이 끝날 때까지 기다린다 (sessions)
+    try:
+        await session.finished
+    except asyncio.CancelledError:
+        # 시리얼 링크가 끊김 (EV 분리)
+        cp.engine.stop(session.transaction_id, "EVDisconnected")
+        raise
+
+# 한 번에 처리를 기다리는 프레임이 이만큼 쌓이면 시리얼 읽기를 멈추고, 절반으로 줄면 다시 읽는다
+SERIAL_QUEUE_HIGH = int(os.getenv("SERIAL_QUEUE_HIGH", "64"))
+# 세션이 없을 때 같은 태그가 이 시간 안에 다시 읽히면 무시 (리더 채터링)
+TAG_DEBOUNCE = float(os.getenv("TAG_DEBOUNCE", "3"))
+# 커넥터(EVSE 또는 포트) -> 진행 중인 인증/충전 task, 커넥터마다 세션은 하나
+sessions: Dict[str, asyncio.Task] = {}
+
 
 class ESP32Protocol(asyncio.Protocol):
-    def __init__(self, port, cp):
-        self.buffer = ""
+    def __init__(self, port, cp, connector=None, on_lost=None, framing: str = SERIAL_FRAMING):
         self.port = port
         self.cp = cp
-        self.portNumber = extract_port_number(port.location)
+        # 게이트웨이 모드: 이 포트에 연결된 EVSE (gateway.ConnectorConfig), 연결이 끊기면 on_lost(device)
+        self.connector = connector
+        self.on_lost = on_lost
+        self.portNumber = extract_port_number(port.location or "")
+        self.framing = framing
+        self.decoder = serial_framing.decoder(framing)
+        self.frames: asyncio.Queue = asyncio.Queue()
+        self.reading_paused = False
+        # 마지막 TELEMETRY 프레임 (cobs)
+        self.telemetry: Optional[serial_framing.Telemetry] = None
+        self._last_tag = (None, 0.0)
+        self._consumer: Optional[asyncio.Task] = None
+
+    @property
+    def session_key(self) -> str:
+        return self.connector.evse_id if self.connector is not None else self.port.device
 
     def connection_made(self, transport):
         self.transport = transport
-        logging.info(f"[EV] {self.port.device} connected, PortNumber:{self.portNumber}")
-        # TODO: 커넥터 아이디(혹은 evseID) 넘겨서(혹은 예약데이터랑 비교해서) 예외처리
+        self.writer = serial_framing.FramedWriter(transport, self.framing)
+        self._consumer = asyncio.create_task(self._consume())
+        logging.info(f"[EV] {self.port.device} connected, PortNumber:{self.portNumber}, framing:{self.framing}")
 
     def data_received(self, data):
-        self.buffer += data.decode()
-        while '\n' in self.buffer:
-            line, self.buffer = self.buffer.split('\n', 1)
-            line = line.strip()
-            logging.info(f"[EV] Received ID Token: {line}")
-            asyncio.create_task(authorize_transaction_manager(self.cp, line, self.transport))
+        for frame in self.decoder.feed(data):
+            self.frames.put_nowait(frame)
+        if self.frames.qsize() >= SERIAL_QUEUE_HIGH and not self.reading_paused:
+            logging.warning(f"[EV] {self.port.device} falling behind, pausing serial reads")
+            self.transport.pause_reading()
+            self.reading_paused = True
+
+    async def _consume(self):
+        while True:
+            kind, value = await self.frames.get()
+            if self.reading_paused and self.frames.qsize() <= SERIAL_QUEUE_HIGH // 2:
+                self.transport.resume_reading()
+                self.reading_paused = False
+            try:
+                self.handle_frame(kind, value)
+            except Exception:
+                logging.exception(f"[EV] {self.port.device} failed to handle a frame")
+
+    def handle_frame(self, kind: int, value):
+        if kind == serial_framing.FRAME_TELEMETRY:
+            self.telemetry = value
+            logging.debug(f"[EV] Telemetry: {value}")
+        elif kind == serial_framing.FRAME_JSON:
+            logging.info(f"[EV] Received: {value}")
+        elif kind == serial_framing.FRAME_ID_TOKEN:
+            self.tag_read(value)
+
+    def tag_read(self, token: str):
+        logging.info(f"[EV] Received ID Token: {token}")
+        if self.cp is None:
+            # 게이트웨이 모드에서 충전소가 CSMS 에 연결되어 있지 않을 때
+            self.writer.send_json({"error": "Offline"})
+            return
+        session = sessions.get(self.session_key)
+        if session is not None and not session.done():
+            logging.info(f"[EV] {self.session_key} already has a session, ignoring the tag")
+            return
+        last_token, last_read = self._last_tag
+        now = time.monotonic()
+        if token == last_token and now - last_read < TAG_DEBOUNCE:
+            logging.info(f"[EV] Ignoring a repeated read of {token}")
+            return
+        self._last_tag = (token, now)
+        task = asyncio.create_task(authorize_transaction_manager(self.cp, token, self.writer, self.connector))
+        sessions[self.session_key] = task
+        task.add_done_callback(lambda done, key=self.session_key: sessions.pop(key, None)
+                               if sessions.get(key) is done else None)
 
     def connection_lost(self, exc):
         logging.info(f"[EV] {self.port.device} Disconnected")
-        candidates.remove(self.port.device)
+        if self._consumer is not None:
+            self._consumer.cancel()
+        session = sessions.get(self.session_key)
+        if session is not None:
+            session.cancel()
+        if self.on_lost is not None:
+            self.on_lost(self.port.device)
+        else:
+            candidates.discard(self.port.device)
 
 async def find_esp32_port(cp):
     system = platform.system()
@@ -299,13 +422,13 @@ async def find_esp32_port(cp):
             if system == "Darwin":  # macOS
                 if "usbserial" in dev or "usbmodem" in dev or "cp210" in desc or "ch340" in desc:
                     if port.device not in candidates:
-                        candidates.append(port.device)
+                        candidates.add(port.device)
                         print(port.device)
                         asyncio.create_task(connect_esp32(port,cp))
             elif system == "Linux":
                 if "ttyusb" in dev or "ttyacm" in dev:
                     if port.device not in candidates:
-                        candidates.append(port.device)
+                        candidates.add(port.device)
                         print(port.device)
                         asyncio.create_task(connect_esp32(port, cp))
         await asyncio.sleep(0.5)
@@ -321,7 +444,8 @@ async def charge_point_manager(uri, cp_name):
         cp = ChargePoint201(cp_name, ws)
         asyncio.create_task(run_cp(cp))
         await asyncio.sleep(1)
-        await cp.send_boot_notification()
+        boot_response = await cp.boot()
+        asyncio.create_task(cp.heartbeat_loop(boot_response.interval))
         await asyncio.sleep(1)
         logging.info(f"ChargeStation {cp_name} is ready to charge.")
         await find_esp32_port(cp)
@@ -331,10 +455,16 @@ async def main(*args, **kwargs):
     uri = os.getenv("CSMS_URI")
 
     #uri = "ws://192.168.35.95:9000/"
-    await asyncio.gather(
-        charge_point_manager(uri + "ST-001", "ST-001"),
-        #charge_point_manager(uri + "ST-002", "ST-002"),
-    )
+    # 게이트웨이 모드: 설정 파일의 포트 <-> 충전소/EVSE 표대로 여러 충전소를 한 프로세스에서
+    if os.getenv("GATEWAY_CONFIG"):
+        import gateway
+        await gateway.run(gateway.load_config(os.getenv("GATEWAY_CONFIG")), uri)
+        return
+    # 여러 충전소: STATION_IDS=ST-001,ST-002 (부하 테스트는 loadgen.py)
+    station_ids = os.getenv("STATION_IDS", "ST-001").split(",")
+    await asyncio.gather(*(
+        charge_point_manager(uri + station_id, station_id) for station_id in station_ids
+    ))
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
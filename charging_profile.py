@@ -0,0 +1,129 @@
+"""
+충전 프로파일(chargingSchedules) 컴파일.
+
+    [{"startPeriod": 0, "limit": 6000, "useESS": False},
+     {"startPeriod": 120, "limit": 60000, "useESS": True},
+     {"startPeriod": 180, "limit": 0, "useESS": False}]
+
+startPeriod 는 충전 시작부터의 초, limit 는 W. 검증하고 startPeriod 순으로 정렬한 뒤
+구간 시작까지의 누적 에너지(Wh)와 요금을 미리 계산해 두므로
+limit_at(t), next_change(t), energy_between(t1, t2), cost_between(t1, t2) 는 bisect 한 번이다.
+
+키는 camelCase (DB, CSMS) 와 snake_case (OCPP 라이브러리를 거친 충전소 쪽) 모두 받는다.
+"""
+import os
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Union
+
+# 요금 (원/Wh), ESS 사용 구간은 ESS_TARIFF
+TARIFF_PER_WH = float(os.getenv("TARIFF_PER_WH", "0.3"))
+ESS_TARIFF_PER_WH = float(os.getenv("ESS_TARIFF_PER_WH", "0.36"))
+
+_KEYS = {
+    "start_period": ("startPeriod", "start_period"),
+    "limit": ("limit",),
+    # camel_to_snake_case("useESS") == "use_ess", 다시 snake_to_camel_case 하면 "useEss"
+    "use_ess": ("useESS", "use_ess", "useEss"),
+}
+
+
+class ChargingProfileError(ValueError):
+    pass
+
+
+def _field(period: Dict[str, Any], name: str, default: Any = None) -> Any:
+    for key in _KEYS[name]:
+        if key in period:
+            return period[key]
+    if default is not None:
+        return default
+    raise ChargingProfileError(f"charging schedule period without {_KEYS[name][0]}: {period}")
+
+
+class CompiledProfile:
+    __slots__ = ("start_periods", "limits", "use_ess", "tariffs", "cumulative_energy", "cumulative_cost",
+                 "duration", "schedules")
+
+    def __init__(self, start_periods: List[int], limits: List[Union[int, float]], use_ess: List[bool]):
+        self.start_periods = start_periods
+        self.limits = limits
+        self.use_ess = use_ess
+        self.tariffs = [ESS_TARIFF_PER_WH if ess else TARIFF_PER_WH for ess in use_ess]
+        # i 번째 구간 시작까지의 누적 에너지(Wh) / 요금
+        self.cumulative_energy = [0.0]
+        self.cumulative_cost = [0.0]
+        for i in range(1, len(start_periods)):
+            energy = limits[i - 1] * (start_periods[i] - start_periods[i - 1]) / 3600
+            self.cumulative_energy.append(self.cumulative_energy[-1] + energy)
+            self.cumulative_cost.append(self.cumulative_cost[-1] + energy * self.tariffs[i - 1])
+        # limit 0 인 마지막 구간이 있으면 그 시작이 충전 종료 시각
+        self.duration: Optional[int] = start_periods[-1] if limits[-1] == 0 else None
+        # DB(chargingProfileSnapshots), Authorize custom_data 에 쓰는 camelCase 형태
+        self.schedules = [{"startPeriod": start, "limit": limit, "useESS": ess}
+                          for start, limit, ess in zip(start_periods, limits, use_ess)]
+
+    @classmethod
+    def compile(cls, schedules: List[Dict[str, Any]]) -> "CompiledProfile":
+        if not schedules:
+            raise ChargingProfileError("empty charging schedule")
+        periods = sorted(
+            ((_field(period, "start_period"), _field(period, "limit"), bool(_field(period, "use_ess", False)))
+             for period in schedules), key=lambda period: period[0])
+        try:
+            start_periods = [int(start) for start, _, _ in periods]
+            # 스냅샷에 원래 값이 그대로 남도록 int 는 int 로
+            limits = [limit if isinstance(limit, (int, float)) else float(limit) for _, limit, _ in periods]
+        except (TypeError, ValueError) as e:
+            raise ChargingProfileError(f"non-numeric startPeriod or limit: {e}") from e
+        if start_periods[0] != 0:
+            raise ChargingProfileError(f"first startPeriod must be 0, got {start_periods[0]}")
+        if len(set(start_periods)) != len(start_periods):
+            raise ChargingProfileError(f"duplicate startPeriod in {start_periods}")
+        if any(limit < 0 for limit in limits):
+            raise ChargingProfileError(f"negative limit in {limits}")
+        return cls(start_periods, limits, [ess for _, _, ess in periods])
+
+    def _index(self, t: float) -> int:
+        return max(0, bisect_right(self.start_periods, t) - 1)
+
+    def limit_at(self, t: float) -> Union[int, float]:
+        """충전 시작 t 초 후의 limit (W)"""
+        if t < 0:
+            return 0
+        return self.limits[self._index(t)]
+
+    def tariff_at(self, t: float) -> float:
+        """충전 시작 t 초 후의 요금 (원/Wh)"""
+        return self.tariffs[self._index(t)]
+
+    def next_change(self, t: float) -> Optional[int]:
+        """t 초 다음에 limit 이 바뀌는 구간 시작 (없으면 None)"""
+        i = bisect_right(self.start_periods, t)
+        return self.start_periods[i] if i < len(self.start_periods) else None
+
+    def _energy_until(self, t: float) -> float:
+        if t <= 0:
+            return 0.0
+        i = self._index(t)
+        return self.cumulative_energy[i] + self.limits[i] * (t - self.start_periods[i]) / 3600
+
+    def _cost_until(self, t: float) -> float:
+        if t <= 0:
+            return 0.0
+        i = self._index(t)
+        return self.cumulative_cost[i] + self.limits[i] * (t - self.start_periods[i]) / 3600 * self.tariffs[i]
+
+    def energy_between(self, t1: float, t2: float) -> float:
+        """[t1, t2] 초 동안 limit 대로 충전한 에너지 (Wh)"""
+        return self._energy_until(t2) - self._energy_until(t1)
+
+    def cost_between(self, t1: float, t2: float) -> float:
+        return self._cost_until(t2) - self._cost_until(t1)
+
+    @property
+    def total_energy(self) -> Optional[float]:
+        return None if self.duration is None else self._energy_until(self.duration)
+
+    @property
+    def total_cost(self) -> Optional[float]:
+        return None if self.duration is None else self._cost_until(self.duration)
@@ -0,0 +1,295 @@
+"""
+충전소 쪽 충전 세션 엔진.
+
+커넥터마다 세션 하나를 상태 기계로 두고, 프로세스에 하나인 스케줄러(heap + task 하나)가
+다음 할 일이 있는 세션만 깨운다. 세션 수천 개가 각자 sleep 하는 coroutine 을 들고 있지 않는다.
+
+    begin()     TransactionEvent(Started, seqNo 1)                      -> Charging
+    Charging    SESSION_METER_INTERVAL 마다 적산 + TransactionEvent(Updated)
+    Charging    프로파일의 limit 0 구간(duration) 도달, stop()  -> TransactionEvent(Ended) -> Ended
+    *           CSMS 연결 끊김 (interrupt(), ConnectionClosed)  -> Interrupted (더 보내지 않음)
+    *           그 밖의 예외 (버그, 잘못된 응답)               -> Interrupted, session.error 에 예외
+
+에너지는 마지막 적산 시각부터 지금까지를 limit 이 바뀌는 곳에서 나눠서 실제 limit 으로 적분한다.
+CSMS 가 SetChargingProfile 로 TxProfile 을 보내면 (사이트 전력 배분) 그 시작부터는 그 limit 을 쓴다.
+트랜잭션 id 는 세션마다 새로 만들고, seqNo 는 세션 안에서 1 씩 늘어난다.
+
+세션 시각 = 실제 경과 시간 x time_scale (SESSION_TIME_SCALE, loadgen --time-scale).
+60 이면 1시간 프로파일이 1분에, 86400 이면 하루치가 1초에 끝난다.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from websockets.exceptions import ConnectionClosed
+
+from charging_profile import ChargingProfileError, CompiledProfile
+
+SESSION_TIME_SCALE = float(os.getenv("SESSION_TIME_SCALE", "1"))
+SESSION_METER_INTERVAL = float(os.getenv("SESSION_METER_INTERVAL", "12"))  # 세션 시각 초
+
+CHARGING = "Charging"
+ENDED = "Ended"
+INTERRUPTED = "Interrupted"
+
+
+class ChargingSession:
+    def __init__(self, cp, authorization: Dict[str, Any], profile: CompiledProfile, started_at: float):
+        self.cp = cp
+        # Authorize 응답의 custom_data (예약, chargingSchedules)
+        self.authorization = authorization
+        self.transaction_id = str(uuid.uuid4())
+        self.evse_id = authorization["evse_id"]
+        self.connector_id = authorization["connector_id"]
+        self.reservation_id = authorization["reservation_id"]
+        self.id_token = authorization["id_token"]
+        self.profile = profile
+        # CSMS 가 보낸 TxProfile 과 그 시작 (세션 시각), 없으면 profile 의 limit
+        self.limit_profile: Optional[CompiledProfile] = None
+        self.limit_offset = 0.0
+        self.started_at = started_at  # loop.time()
+        self.started_wall = time.time()
+        self.state = CHARGING
+        self.seq_no = 0
+        self.energy_wh = 0.0
+        self.cost = 0.0
+        # 이 세션 시각(초)까지 적산했다
+        self.metered_until = 0.0
+        self.next_meter = 0.0
+        self.stop_reason: Optional[str] = None
+        # 세션을 Interrupted 로 끝낸 예상하지 못한 예외 (loadgen 이 실패로 센다)
+        self.error: Optional[BaseException] = None
+        # 세션이 끝나면 마지막 상태 (Ended | Interrupted)
+        self.finished: asyncio.Future = asyncio.get_running_loop().create_future()
+        # heap 에 들어 있는 깨울 시각 (보내는 중이면 None)
+        self._due: Optional[float] = None
+
+    def next_seq_no(self) -> int:
+        self.seq_no += 1
+        return self.seq_no
+
+    def limit_at(self, t: float) -> float:
+        if self.limit_profile is not None and t >= self.limit_offset:
+            return self.limit_profile.limit_at(t - self.limit_offset)
+        return self.profile.limit_at(t)
+
+    def _next_change(self, t: float) -> Optional[float]:
+        changes = [self.profile.next_change(t)]
+        if self.limit_profile is not None:
+            if t < self.limit_offset:
+                changes.append(self.limit_offset)
+            else:
+                change = self.limit_profile.next_change(t - self.limit_offset)
+                changes.append(None if change is None else change + self.limit_offset)
+        changes = [change for change in changes if change is not None]
+        return min(changes) if changes else None
+
+    def integrate(self, t: float):
+        """metered_until 부터 세션 시각 t 까지 충전한 에너지(Wh)와 요금을 더한다"""
+        if self.profile.duration is not None:
+            t = min(t, self.profile.duration)
+        while self.metered_until < t:
+            change = self._next_change(self.metered_until)
+            until = t if change is None or change <= self.metered_until else min(t, change)
+            energy = self.limit_at(self.metered_until) * (until - self.metered_until) / 3600
+            self.energy_wh += energy
+            self.cost += energy * self.profile.tariff_at(self.metered_until)
+            self.metered_until = until
+
+
+class SessionEngine:
+    def __init__(self, time_scale: float = SESSION_TIME_SCALE, meter_interval: float = SESSION_METER_INTERVAL):
+        self.time_scale = time_scale
+        self.meter_interval = meter_interval
+        # transactionId -> 진행 중인 세션
+        self._sessions: Dict[str, ChargingSession] = {}
+        self._heap: List[Tuple[float, int, ChargingSession]] = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # 메시지를 보내는 중인 step task
+        self._steps: Set[asyncio.Task] = set()
+        # 예외로 끝난 세션 수
+        self.failed = 0
+
+    def session_time(self, session: ChargingSession) -> float:
+        return (asyncio.get_running_loop().time() - session.started_at) * self.time_scale
+
+    def _schedule(self, session: ChargingSession, t: float):
+        """세션 시각 t 에 깨운다"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        due = session.started_at + t / self.time_scale
+        session._due = due
+        heapq.heappush(self._heap, (due, next(self._counter), session))
+        if self._heap[0][2] is session:
+            self._wakeup.set()
+
+    def _next_wakeup(self, session: ChargingSession) -> float:
+        if session.stop_reason is not None:
+            return session.metered_until
+        if session.profile.duration is not None:
+            return min(session.next_meter, session.profile.duration)
+        return session.next_meter
+
+    def _finish(self, session: ChargingSession, state: str):
+        session.state = state
+        session._due = None
+        if self._sessions.get(session.transaction_id) is session:
+            del self._sessions[session.transaction_id]
+        if not session.finished.done():
+            session.finished.set_result(state)
+        logging.info("Session %s %s: %.0f Wh, %.0f KRW", session.transaction_id, state,
+                     session.energy_wh, session.cost)
+
+    async def begin(self, cp, authorization: Dict[str, Any]) -> ChargingSession:
+        """TransactionEvent(Started) 를 보내고 세션을 시작한다. CSMS 가 거절하면 Interrupted 로 끝난 세션."""
+        profile = CompiledProfile.compile(authorization["charging_schedules"])
+        session = ChargingSession(cp, authorization, profile, asyncio.get_running_loop().time())
+        response = await cp.start_transaction(
+            authorization["user_id"], authorization["id_token"],
+            authorization["evse_id"], authorization["connector_id"],
+            authorization["reservation_id"], authorization["charging_schedules"],
+            authorization["start_time"], authorization["end_time"],
+            authorization["cost"], authorization["target_energy_wh"],
+            _transaction_id=session.transaction_id, _seq_no=session.next_seq_no())
+        if response is None:
+            self._finish(session, INTERRUPTED)
+            return session
+        session.next_meter = self.meter_interval
+        self._sessions[session.transaction_id] = session
+        self._schedule(session, self._next_wakeup(session))
+        return session
+
+    def stop(self, transaction_id: str, reason: str = "Local") -> bool:
+        """세션을 끝낸다 (지금까지 적산하고 TransactionEvent(Ended))"""
+        session = self._sessions.get(transaction_id)
+        if session is None or session.stop_reason is not None:
+            return False
+        session.stop_reason = reason
+        if session._due is not None:
+            # heap 에서 기다리는 중이면 지금 깨운다 (보내는 중이면 그 step 이 끝난 뒤 바로 깨어난다)
+            self._schedule(session, self.session_time(session))
+        return True
+
+    def interrupt(self, cp):
+        """CSMS 연결이 끊긴 충전소의 세션들을 더 보내지 않고 끝낸다"""
+        for session in [session for session in self._sessions.values() if session.cp is cp]:
+            self._finish(session, INTERRUPTED)
+
+    def find(self, cp, evse_id: Any) -> Optional[ChargingSession]:
+        for session in self._sessions.values():
+            if session.cp is cp and evse_id in (session.evse_id, session.connector_id):
+                return session
+        return None
+
+    def set_charging_profile(self, cp, evse_id: int, charging_profile: Dict[str, Any]) -> bool:
+        """CSMS 의 SetChargingProfile (TxProfile) 을 세션 limit 에 반영한다. 반영하지 못하면 False."""
+        if charging_profile.get("charging_profile_purpose") != "TxProfile":
+            return False
+        transaction_id = charging_profile.get("transaction_id")
+        session = self._sessions.get(transaction_id) if transaction_id else self.find(cp, evse_id)
+        if session is None or session.cp is not cp:
+            return False
+        schedule = charging_profile["charging_schedule"][0]
+        try:
+            limit_profile = CompiledProfile.compile(schedule["charging_schedule_period"])
+        except ChargingProfileError as e:
+            logging.error("Rejecting charging profile for %s: %s", session.transaction_id, e)
+            return False
+        now = self.session_time(session)
+        # 지금까지는 이전 limit 으로
+        session.integrate(now)
+        start_schedule = schedule.get("start_schedule")
+        if start_schedule:
+            offset = (datetime.fromisoformat(start_schedule).timestamp() - session.started_wall) * self.time_scale
+        else:
+            offset = now
+        session.limit_profile = limit_profile
+        session.limit_offset = offset
+        logging.info("Session %s limit is now %s W", session.transaction_id, session.limit_at(now))
+        return True
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def _step(self, session: ChargingSession):
+        try:
+            await self._advance(session)
+        except Exception as e:
+            # 여기서 끝내지 않으면 다시 깨어나지 않고 finished 도 끝나지 않는다
+            logging.exception("Session %s failed", session.transaction_id)
+            session.error = e
+            self.failed += 1
+            self._finish(session, INTERRUPTED)
+
+    async def _advance(self, session: ChargingSession):
+        t = self.session_time(session)
+        session.integrate(t)
+        if (session.stop_reason is None and session.profile.duration is not None
+                and t >= session.profile.duration):
+            session.stop_reason = "EVDisconnected"
+        try:
+            if session.stop_reason is not None:
+                await session.cp.stop_transaction(
+                    session.transaction_id, session.stop_reason, session.evse_id, session.connector_id,
+                    session.reservation_id, session.id_token, _seq_no=session.next_seq_no(),
+                    _total_cost=round(session.cost), _total_energy=round(session.energy_wh))
+                if session.state == CHARGING:
+                    self._finish(session, ENDED)
+                return
+            if t >= session.next_meter:
+                await session.cp.update_transaction(
+                    session.transaction_id, session.next_seq_no(), session.evse_id, session.connector_id,
+                    session.reservation_id, round(session.cost), round(session.energy_wh))
+                # 배속이 커서 밀렸으면 지난 주기는 건너뛴다
+                while session.next_meter <= t:
+                    session.next_meter += self.meter_interval
+        except ConnectionClosed:
+            self._finish(session, INTERRUPTED)
+            return
+        except asyncio.TimeoutError:
+            logging.warning("Session %s: no response from CSMS", session.transaction_id)
+        if session.state == CHARGING:
+            self._schedule(session, self._next_wakeup(session))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                due, _, session = heapq.heappop(self._heap)
+                if session._due != due or self._sessions.get(session.transaction_id) is not session:
+                    continue  # 끝났거나 다른 시각으로 바뀐 항목
+                session._due = None
+                step = asyncio.create_task(self._step(session))
+                self._steps.add(step)
+                step.add_done_callback(self._steps.discard)
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        for step in list(self._steps):
+            step.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# charge_point.py / gateway 의 충전소들이 같이 쓰는 엔진 (loadgen 은 --time-scale 로 따로 만든다)
+engine = SessionEngine()
@@ -2,15 +2,27 @@
 # Copyright 2020 - 2024 Pionix GmbH and Contributors to EVerest
 import asyncio
 import logging
+import multiprocessing
+import os
+import signal
+import socket
 from warnings import catch_warnings
 
+import admin_api
+import ocpp_codec
+from admission import HANDSHAKE_RETRY_AFTER, HandshakeGate
+import central_system
+import storage
 from central_system import ChargePointHandler
+from log_config import setup_logging
+from registry import registry
+from routing import Broker, BrokerClient
+import transport
 import http
 import websockets
 import ssl
 from pathlib import Path
 import argparse
-from pymongo import MongoClient
 import serial
 import serial_asyncio
 import time
@@ -26,9 +38,12 @@ __version__ = "0.1.0"
 
 reject_auth = False
 
+# 재접속 폭주 때 동시에 진행하는 핸드셰이크 수 제한
+handshake_gate = HandshakeGate()
 
-async def process_request(connection, request):
-    logging.info(f'request:\n{request}')
+
+async def process_request(path, request):
+    logging.debug('request:\n%s', request)
     if reject_auth:
         logging.info(
             'Rejecting authorization because of the --reject-auth command line parameter')
@@ -37,10 +52,18 @@ async def process_request(connection, request):
             [],
             b'Invalid credentials\n',
         )
+    # on_connect 가 같은 경로로 done() 을 부른다
+    if not handshake_gate.admit(path):
+        return (
+            http.HTTPStatus.SERVICE_UNAVAILABLE,
+            [("Retry-After", str(HANDSHAKE_RETRY_AFTER))],
+            b'Too many connections in progress\n',
+        )
     return None
 
 
 async def on_connect(websocket, path):
+    handshake_gate.done(path)
     try:
         requested_protocols = websocket.request_headers["Sec-WebSocket-Protocol"]
     except KeyError:
@@ -67,13 +90,25 @@ async def on_connect(websocket, path):
     else:
         charge_point_id = path.strip("/")
         cp = ChargePointHandler(charge_point_id, websocket)
-        logging.info(f"{charge_point_id} connected using OCPP2.0.1")
+        registry.register(cp)
+        if registry.router is not None:
+            # 다른 워커에 붙어 있던 사이에 바뀌었을 수 있는 상태는 믿지 않는다
+            central_system.station_state.forget(charge_point_id)
+        logging.info("%s connected using OCPP2.0.1 (compression: %s)", charge_point_id,
+                     transport.count_connection(websocket))
         try:
             await cp.start()
         except websockets.exceptions.ConnectionClosedOK:
             logging.info("Client closed the connection normally (code 1000).")
-            # 연결 종료될때
-            await cp.close_connection()
+        except websockets.exceptions.ConnectionClosedError as e:
+            # 전원 차단, 네트워크 단절 등 close frame 없이 끊긴 경우
+            logging.warning("%s connection lost: code=%s reason=%s", charge_point_id, e.code, e.reason or "-")
+        except Exception:
+            logging.exception("%s connection handler failed", charge_point_id)
+        finally:
+            # 연결 종료될때 (이미 heartbeat 타임아웃으로 정리됐거나 재접속한 경우에는 상태를 바꾸지 않음)
+            if registry.unregister(cp):
+                await cp.close_connection()
 
 
 
@@ -93,19 +128,173 @@ async def main():
     parser.add_argument('--reject-auth', action='store_true', default=False,
                         help='Reply with 403 error in connection')
 
+    parser.add_argument('--admin-host', type=str, default="127.0.0.1",
+                        help='Host for the admin command API (default: 127.0.0.1)')
+
+    parser.add_argument('--admin-port', type=int, default=9001,
+                        help='Port for the admin command API, 0 to disable (default: 9001)')
+
+    parser.add_argument('--storage', choices=["mongo", "memory"], default=storage.DEFAULT_BACKEND,
+                        help='Storage backend, memory keeps everything in process (default: STORAGE_BACKEND or mongo)')
+
+    parser.add_argument('--skip-index-bootstrap', action='store_true', default=False,
+                        help='Do not create MongoDB indexes at startup')
+
+    parser.add_argument('--check-indexes', action='store_true', default=False,
+                        help='Explain every handler query, exit with status 1 if any does a COLLSCAN')
+
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes sharing the port with SO_REUSEPORT (default: 1)')
+
+    parser.add_argument('--ws-profile', choices=sorted(transport.PROFILES), default=transport.WS_PROFILE,
+                        help='WebSocket compression, queue, buffer and ping settings (default: WS_PROFILE or default)')
+
+    parser.add_argument('--log-format', choices=["color", "json"], default="color",
+                        help='Log output format (default: color)')
+
+    parser.add_argument('--log-level', type=str, default="INFO",
+                        help='Root log level (default: INFO)')
+
     args = parser.parse_args()
-    host = args.host
-    port = args.port
+    setup_logging(args.log_format, args.log_level)
+    if args.workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("--workers needs SO_REUSEPORT, which this platform does not support")
+    if args.workers > 1 and args.storage == "memory":
+        parser.error("--storage memory is per process and cannot be shared by --workers")
+
+    central_system.init_storage(args.storage)
+    if not args.skip_index_bootstrap:
+        await central_system.storage.ensure_indexes()
+
+    if args.check_indexes:
+        collscans = await central_system.storage.check_query_plans()
+        for query in collscans:
+            logging.error("COLLSCAN: %s", query)
+        if collscans:
+            raise SystemExit(1)
+        logging.info("All handler queries use an index")
+        return
+
+    if args.workers > 1:
+        await run_workers(args)
+    else:
+        await serve(args)
+
+
+async def serve(args, sock=None, broker_port=None, primary=True):
+    """primary: 프로세스 전체에서 한 번만 돌아야 하는 작업(예약 스케줄러 등)을 이 프로세스에서 실행"""
     global reject_auth
     reject_auth = args.reject_auth
+    # 워커 프로세스는 여기서 저장소를 만든다
+    central_system.init_storage(getattr(args, "storage", None))
 
+    if broker_port is not None:
+        # 다른 워커에 연결된 충전소로 가는 명령은 broker 를 거친다
+        router = BrokerClient(registry)
+        await router.connect(broker_port)
+        registry.router = router
 
-    server = await websockets.serve(
-        on_connect, host, port, subprotocols=["ocpp2.0.1"], process_request=process_request
-    )
+    profile = transport.load_profile(getattr(args, "ws_profile", None))
+    logging.info("WebSocket transport: %s", profile)
+    logging.info("OCPP codec: %s (JSON: %s)", ocpp_codec.OCPP_CODEC, ocpp_codec.JSON_BACKEND)
+    if ocpp_codec.OCPP_CODEC == "fast" and ocpp_codec.orjson is None:
+        logging.warning("OCPP_CODEC=fast without orjson, encoding and decoding use the json module")
+    if sock is not None:
+        server = await websockets.serve(
+            on_connect, sock=sock, subprotocols=["ocpp2.0.1"], process_request=process_request,
+            **transport.serve_kwargs(profile)
+        )
+    else:
+        server = await websockets.serve(
+            on_connect, args.host, args.port, subprotocols=["ocpp2.0.1"], process_request=process_request,
+            **transport.serve_kwargs(profile)
+        )
+
+    await central_system.station_state.load(central_system.storage)
+    central_system.cost_buffer.start()
+    central_system.status_buffer.start()
+    central_system.meter_buffer.start()
+    central_system.heartbeat_sweeper.start()
+    central_system.site_allocator.start()
+    # 반영되지 않은 채 남은 트랜잭션(이전 프로세스가 중간에 죽은 경우 등)은 primary 가 다시 반영
+    await central_system.session_sync.start(central_system.storage, recover=primary)
+    if primary:
+        await central_system.reservation_scheduler.start(central_system.storage)
+        # admin API(예약, 빈 슬롯 조회)도 primary 에서만 열린다
+        await central_system.slot_index.start(central_system.storage)
+
+    if args.admin_port:
+        await admin_api.serve(args.admin_host, args.admin_port)
 
     logging.info("OCPP CSMS Started listening to new connections...")
-    await server.wait_closed()
+    try:
+        await server.wait_closed()
+    finally:
+        await central_system.reservation_scheduler.close()
+        await central_system.slot_index.close()
+        await central_system.heartbeat_sweeper.close()
+        await central_system.site_allocator.close()
+        await central_system.session_sync.close()
+        # 종료 전에 남은 CostUpdated, 충전소 상태, 계량값 기록
+        await central_system.cost_buffer.close()
+        await central_system.status_buffer.close()
+        await central_system.meter_buffer.close()
+
+
+def _reuseport_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # 같은 포트를 여러 워커가 listen 하고, 커널이 새 연결을 워커들에 나눠준다
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(socket.SOMAXCONN)
+    sock.setblocking(False)
+    return sock
+
+
+def run_worker(args, worker_index, broker_port):
+    # 관리 API 는 첫 번째 워커에서만 (다른 워커의 충전소는 broker 로 전달)
+    if worker_index != 0:
+        args.admin_port = 0
+    setup_logging(args.log_format, args.log_level)
+    try:
+        asyncio.run(serve(args, _reuseport_socket(args.host, args.port), broker_port, primary=worker_index == 0))
+    except KeyboardInterrupt:
+        pass
+
+
+async def run_workers(args):
+    broker = Broker()
+    broker_port = await broker.start()
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=run_worker, args=(args, index, broker_port), name=f"csms-worker-{index}")
+        for index in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    logging.info("Started %d CSMS workers on %s:%d", args.workers, args.host, args.port)
+
+    # SIGTERM 을 받으면 워커들에 SIGINT 를 보내서 정상 종료시킨다 (Ctrl+C 는 워커에도 직접 전달됨)
+    terminated = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, terminated.set)
+    try:
+        while any(worker.is_alive() for worker in workers) and not terminated.is_set():
+            try:
+                await asyncio.wait_for(terminated.wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for worker in workers:
+            if terminated.is_set() and worker.is_alive():
+                os.kill(worker.pid, signal.SIGINT)
+        for worker in workers:
+            # 각자 남은 쓰기를 정리할 시간을 준다
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+
 
 if __name__ == "__main__":
     try:
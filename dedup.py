@@ -0,0 +1,93 @@
+"""
+재전송된 CALL 중복 처리 방지.
+
+충전소는 응답을 받지 못하면 같은 CALL 을 다시 보낸다 (재접속 후에 보내기도 한다).
+충전소별로 최근 CALLRESULT payload 를 들고 있다가, 같은 메시지가 다시 오면 핸들러와 DB 를 거치지 않고
+저장해 둔 응답을 그대로 보낸다.
+
+    (Action, 메시지 id, payload 해시)       UNCACHED_ACTIONS 를 뺀 모든 Action
+    (transactionId, seqNo, eventType,      TransactionEvent, 메시지 id 를 새로 만들어 보내는 충전소용
+     customData.reservationId)             (transactionId 를 세션마다 새로 만들지 않는 충전소도 있다)
+
+캐시는 연결이 아니라 충전소 id 기준이라 재접속해도 남아 있다.
+재접속하면 메시지 id 를 처음부터 다시 세는 펌웨어가 있어서, id 만으로는 재전송인지 알 수 없다.
+Action 과 payload 까지 같아야 재전송으로 보고, 같은 id 의 다른 메시지는 핸들러가 처리한다.
+프로세스가 다시 시작된 뒤의 재전송은 transaction 의 (reservationId, transactionId) unique 인덱스가 막는다.
+
+응답이 지금 상태에 따라 달라지는 Action (Boot 의 currentTime/Pending, Authorize 의 예약 상태 등)은
+저장하지 않는다. 재접속한 충전소의 BootNotification 은 핸들러가 다시 처리해야 EVSE 가 OFFLINE 에서 돌아온다.
+"""
+import hashlib
+import json
+import os
+from typing import Any, Dict, Hashable, List, Optional
+
+import metrics
+from cache import TTLCache
+
+DEDUP_PER_STATION = int(os.getenv("DEDUP_PER_STATION", "32"))
+DEDUP_MAX_STATIONS = int(os.getenv("DEDUP_MAX_STATIONS", "20000"))
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", "600"))  # 초
+
+# 응답이 시각이나 지금 상태에 따라 달라야 하는 Action (다시 처리해도 같은 결과가 되는 조회/등록)
+UNCACHED_ACTIONS = frozenset({"Heartbeat", "BootNotification", "Authorize", "GetCertificateStatus"})
+
+duplicate_calls = metrics.Counter("ocpp_duplicate_calls_total",
+                                  "Retransmitted CALL messages answered from the replay cache", ["action"])
+
+
+def payload_digest(payload: Dict[str, Any]) -> bytes:
+    """키 순서와 공백에 상관없는 payload 해시"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).digest()
+
+
+def replay_keys(action: str, unique_id: str, payload: Dict[str, Any]) -> List[Hashable]:
+    keys: List[Hashable] = [("id", action, unique_id, payload_digest(payload))]
+    if action == "TransactionEvent":
+        transaction_id = (payload.get("transactionInfo") or {}).get("transactionId")
+        if transaction_id is not None and "seqNo" in payload:
+            reservation_id = (payload.get("customData") or {}).get("reservationId")
+            keys.append((action, transaction_id, payload["seqNo"], payload.get("eventType"), reservation_id))
+    return keys
+
+
+class ReplayCache:
+    def __init__(self, per_station: int = DEDUP_PER_STATION, max_stations: int = DEDUP_MAX_STATIONS,
+                 ttl: float = DEDUP_TTL):
+        self.per_station = per_station
+        self.ttl = ttl
+        # stationId -> TTLCache(replay key -> CALLRESULT payload)
+        self._stations = TTLCache(maxsize=max_stations, ttl=ttl)
+
+    def lookup(self, station_id: str, action: str, unique_id: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """재전송이면 저장해 둔 CALLRESULT payload, 처음 보는 메시지면 None"""
+        if action in UNCACHED_ACTIONS:
+            return None
+        responses = self._stations.get(station_id)
+        if responses is None:
+            return None
+        for key in replay_keys(action, unique_id, payload):
+            response = responses.get(key)
+            if response is not None:
+                duplicate_calls.inc(action)
+                return response
+        return None
+
+    def store(self, station_id: str, action: str, unique_id: str, payload: Dict[str, Any],
+              response: Dict[str, Any]):
+        if action in UNCACHED_ACTIONS:
+            return
+        responses = self._stations.get(station_id)
+        if responses is None:
+            responses = TTLCache(maxsize=self.per_station, ttl=self.ttl)
+        # 충전소가 계속 메시지를 보내는 동안에는 만료되지 않도록 다시 넣는다
+        self._stations.set(station_id, responses)
+        for key in replay_keys(action, unique_id, payload):
+            responses.set(key, response)
+
+    def __len__(self) -> int:
+        return len(self._stations)
+
+
+replay_cache = ReplayCache()
@@ -0,0 +1,260 @@
+"""
+게이트웨이 모드: 한 프로세스(이벤트 루프 하나)에서 여러 충전소와 여러 EVSE 시리얼 포트를 처리한다.
+
+설정 파일(JSON)의 표대로 USB 시리얼 포트를 충전소/EVSE 에 연결한다.
+
+    {
+      "csms_uri": "ws://192.168.0.10:9000/",
+      "stations": [
+        {"station_id": "ST-001", "connectors": [
+          {"evse_id": "EVSE-ST1-001", "connector_id": 1, "location": "1-1.2:1.0"},
+          {"evse_id": "EVSE-ST1-002", "connector_id": 1, "serial_number": "A50285BI"}
+        ]},
+        {"station_id": "ST-002", "connectors": [
+          {"evse_id": "EVSE-ST2-001", "connector_id": 1, "device": "/dev/ttyUSB3", "framing": "cobs"}
+        ]}
+      ]
+    }
+
+포트는 device, location (USB 허브 위치, 재부팅해도 같음), serial_number 중 주어진 값이 모두 맞는 것을 쓴다.
+표에 없는 포트는 열지 않는다.
+
+포트 연결/분리는 pyudev 가 있으면 udev 이벤트로, 없으면 GATEWAY_POLL_INTERVAL 초마다 comports() 를 비교해서 알아낸다.
+충전소 WebSocket 이 끊기면 다시 연결하고, 그 충전소의 시리얼 포트는 열어 둔 채 새 연결에 붙인다.
+
+    GATEWAY_CONFIG=gateway.json python charge_point.py
+    python gateway.py gateway.json
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import serial.tools.list_ports
+import serial_asyncio
+import websockets
+from ocpp.v201.enums import RegistrationStatusEnumType
+
+from charge_point import SERIAL_FRAMING, ChargePoint201, ESP32Protocol
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+GATEWAY_POLL_INTERVAL = float(os.getenv("GATEWAY_POLL_INTERVAL", "2.0"))  # 초, udev 를 쓸 수 없을 때
+GATEWAY_RECONNECT_MIN = float(os.getenv("GATEWAY_RECONNECT_MIN", "1"))  # 초
+GATEWAY_RECONNECT_MAX = float(os.getenv("GATEWAY_RECONNECT_MAX", "60"))  # 초
+SERIAL_BAUDRATE = 115200
+
+
+@dataclass(frozen=True)
+class ConnectorConfig:
+    station_id: str
+    evse_id: str
+    connector_id: int
+    device: Optional[str] = None
+    location: Optional[str] = None
+    serial_number: Optional[str] = None
+    # line | cobs (없으면 SERIAL_FRAMING)
+    framing: Optional[str] = None
+
+    def matches(self, port) -> bool:
+        return ((self.device is None or port.device == self.device)
+                and (self.location is None or port.location == self.location)
+                and (self.serial_number is None or port.serial_number == self.serial_number))
+
+
+@dataclass
+class GatewayConfig:
+    csms_uri: Optional[str]
+    station_ids: List[str]
+    connectors: List[ConnectorConfig]
+
+
+def load_config(path: str) -> GatewayConfig:
+    with open(path, encoding="utf-8") as f:
+        raw: Dict[str, Any] = json.load(f)
+    connectors = []
+    for station in raw["stations"]:
+        for connector in station.get("connectors", ()):
+            config = ConnectorConfig(station_id=station["station_id"], evse_id=connector["evse_id"],
+                                     connector_id=int(connector.get("connector_id", 1)),
+                                     device=connector.get("device"), location=connector.get("location"),
+                                     serial_number=connector.get("serial_number"),
+                                     framing=connector.get("framing"))
+            if config.device is None and config.location is None and config.serial_number is None:
+                raise ValueError(f"{config.evse_id}: one of device, location or serial_number is required")
+            connectors.append(config)
+    return GatewayConfig(raw.get("csms_uri"), [station["station_id"] for station in raw["stations"]], connectors)
+
+
+class PortWatcher:
+    """
+    시리얼 포트 연결/분리를 on_added(ListPortInfo), on_removed(device) 로 알린다.
+    udev 이벤트가 오면 그때만 comports() 를 다시 읽는다.
+    """
+
+    def __init__(self, on_added: Callable[[Any], None], on_removed: Callable[[str], None],
+                 poll_interval: float = GATEWAY_POLL_INTERVAL):
+        self._on_added = on_added
+        self._on_removed = on_removed
+        self.poll_interval = poll_interval
+        self._ports: Dict[str, Any] = {}
+        self._monitor = None
+        self._task: Optional[asyncio.Task] = None
+
+    def scan(self):
+        ports = {port.device: port for port in serial.tools.list_ports.comports()}
+        for device in self._ports.keys() - ports.keys():
+            self._on_removed(device)
+        for device in ports.keys() - self._ports.keys():
+            self._on_added(ports[device])
+        self._ports = ports
+
+    def _udev_event(self):
+        # 쌓인 이벤트를 모두 읽고 한 번만 다시 읽는다
+        while self._monitor.poll(timeout=0) is not None:
+            pass
+        self.scan()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self.scan()
+
+    def start(self):
+        if pyudev is not None:
+            try:
+                self._monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+                self._monitor.filter_by("tty")
+                self._monitor.start()
+                asyncio.get_running_loop().add_reader(self._monitor.fileno(), self._udev_event)
+                logging.info("Watching serial ports with udev")
+            except Exception:
+                logging.exception("udev monitor unavailable, polling serial ports instead")
+                self._monitor = None
+        if self._monitor is None:
+            logging.info("Polling serial ports every %.1f s", self.poll_interval)
+            self._task = asyncio.create_task(self._poll())
+        self.scan()
+
+    def close(self):
+        if self._monitor is not None:
+            asyncio.get_running_loop().remove_reader(self._monitor.fileno())
+            self._monitor = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class Gateway:
+    def __init__(self, config: GatewayConfig, uri: str):
+        self.config = config
+        self.uri = uri
+        # stationId -> 연결된 ChargePoint201 (연결 중이 아니면 없음)
+        self._stations: Dict[str, ChargePoint201] = {}
+        # device -> 열린 시리얼 포트
+        self._links: Dict[str, ESP32Protocol] = {}
+        self._watcher = PortWatcher(self._port_added, self._port_removed)
+
+    def _connector(self, port) -> Optional[ConnectorConfig]:
+        for connector in self.config.connectors:
+            if connector.matches(port):
+                return connector
+        return None
+
+    def _port_added(self, port):
+        connector = self._connector(port)
+        if connector is None:
+            logging.debug("[EV] %s is not in the gateway config, ignoring", port.device)
+            return
+        if port.device in self._links:
+            return
+        logging.info("[EV] %s -> %s %s", port.device, connector.station_id, connector.evse_id)
+        protocol = ESP32Protocol(port, self._stations.get(connector.station_id), connector, self._link_lost,
+                                 connector.framing or SERIAL_FRAMING)
+        self._links[port.device] = protocol
+        asyncio.create_task(self._open_link(port, protocol))
+
+    def _port_removed(self, device: str):
+        link = self._links.get(device)
+        if link is not None and getattr(link, "transport", None) is not None:
+            link.transport.close()
+
+    def _link_lost(self, device: str):
+        self._links.pop(device, None)
+
+    async def _open_link(self, port, protocol: ESP32Protocol):
+        try:
+            await serial_asyncio.create_serial_connection(
+                asyncio.get_running_loop(), lambda: protocol, port.device, baudrate=SERIAL_BAUDRATE)
+        except Exception:
+            logging.exception("[EV] Failed to open %s", port.device)
+            self._links.pop(port.device, None)
+
+    def _attach(self, station_id: str, cp: Optional[ChargePoint201]):
+        # 충전소가 다시 연결되면 열려 있는 포트들이 새 연결을 사용한다
+        for protocol in self._links.values():
+            if protocol.connector.station_id == station_id:
+                protocol.cp = cp
+
+    async def _run_station(self, station_id: str):
+        """충전소 연결 하나를 계속 유지한다. 어떤 에러가 나도 다른 충전소와 시리얼 포트에 번지지 않는다."""
+        delay = GATEWAY_RECONNECT_MIN
+        while True:
+            try:
+                async with websockets.connect(self.uri + station_id, subprotocols=["ocpp2.0.1"]) as ws:
+                    cp = ChargePoint201(station_id, ws)
+                    reader = asyncio.create_task(cp.start())
+                    heartbeat = None
+                    try:
+                        boot_response = await cp.boot()
+                        if boot_response is None or boot_response.status != RegistrationStatusEnumType.accepted:
+                            # CALLERROR 또는 Rejected, 다시 연결해서 Boot
+                            logging.warning("%s BootNotification was not accepted: %s", station_id, boot_response)
+                        else:
+                            heartbeat = asyncio.create_task(cp.heartbeat_loop(boot_response.interval))
+                            self._stations[station_id] = cp
+                            self._attach(station_id, cp)
+                            logging.info("ChargeStation %s is ready to charge.", station_id)
+                            delay = GATEWAY_RECONNECT_MIN
+                            await reader
+                    finally:
+                        if heartbeat is not None:
+                            heartbeat.cancel()
+                        reader.cancel()
+                        await asyncio.gather(reader, return_exceptions=True)
+                        cp.engine.interrupt(cp)
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                logging.warning("%s connection failed: %r", station_id, e)
+            except Exception:
+                logging.exception("%s station link failed", station_id)
+            self._stations.pop(station_id, None)
+            self._attach(station_id, None)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, GATEWAY_RECONNECT_MAX)
+
+    async def run(self):
+        self._watcher.start()
+        try:
+            await asyncio.gather(*(self._run_station(station_id) for station_id in self.config.station_ids))
+        finally:
+            self._watcher.close()
+
+
+async def run(config: GatewayConfig, uri: Optional[str] = None):
+    uri = config.csms_uri or uri
+    if not uri:
+        raise ValueError("csms_uri is not set in the gateway config or CSMS_URI")
+    logging.info("Gateway: %d stations, %d connectors", len(config.station_ids), len(config.connectors))
+    await Gateway(config, uri).run()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    asyncio.run(run(load_config(sys.argv[1]), os.getenv("CSMS_URI")))
@@ -0,0 +1,95 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# 컬렉션별 인덱스 (ChargePointHandler 의 조회 조건 기준)
+INDEXES: Dict[str, List[IndexModel]] = {
+    "reservation": [
+        IndexModel([("idToken", ASCENDING), ("reservationStatus", ASCENDING)], name="idToken_reservationStatus"),
+        # reservation_scheduler 의 horizon 조회
+        IndexModel([("reservationStatus", ASCENDING), ("startTime", ASCENDING)], name="reservationStatus_startTime"),
+        # 예약 시간 겹침 확인 (insert_reservation, slot_index)
+        IndexModel([("evseId", ASCENDING), ("startTime", ASCENDING)], name="evseId_startTime"),
+    ],
+    "chargingProfile": [
+        # 예약 하나에 충전 프로파일 하나
+        IndexModel([("reservationId", ASCENDING)], name="reservationId_unique", unique=True),
+    ],
+    "transaction": [
+        IndexModel([("reservationId", ASCENDING)], name="reservationId"),
+        # 재전송된 TransactionEvent Started 가 트랜잭션을 두 번 만들지 않도록 (dedup)
+        # (transactionId 를 세션마다 새로 만들지 않는 충전소도 있으므로 예약과 묶어서)
+        IndexModel([("reservationId", ASCENDING), ("transactionId", ASCENDING)],
+                   name="reservationId_transactionId_unique", unique=True,
+                   partialFilterExpression={"transactionId": {"$exists": True}}),
+        # session_sync: 예약/EVSE 에 아직 반영되지 않은 트랜잭션만
+        IndexModel([("syncAt", ASCENDING)], name="syncAt_partial",
+                   partialFilterExpression={"syncAt": {"$exists": True}}),
+    ],
+    "evse": [
+        IndexModel([("stationId", ASCENDING)], name="stationId"),
+        IndexModel([("evseId", ASCENDING)], name="evseId_unique", unique=True),
+    ],
+    # time-series 를 쓸 수 없을 때의 계량값 버킷 (meter_values)
+    "meterValueBucket": [
+        IndexModel([("reservationId", ASCENDING), ("bucketStart", ASCENDING)],
+                   name="reservationId_bucketStart_unique", unique=True),
+    ],
+}
+
+# ChargePointHandler 가 실행하는 조회 (컬렉션, 조건) - explain 확인용
+_SAMPLE_ID = ObjectId("000000000000000000000000")
+HOT_QUERIES: List[Tuple[str, Dict[str, Any]]] = [
+    ("reservation", {"idToken": "token-0000", "reservationStatus": "ACTIVE"}),  # Authorize
+    ("reservation", {"_id": _SAMPLE_ID}),  # TransactionEvent Ended
+    ("reservation", {"reservationStatus": {"$in": ["ACTIVE", "WAITING"]},
+                     "startTime": {"$lt": datetime(2000, 1, 1)}}),  # reservation_scheduler
+    ("reservation", {"evseId": "EVSE-ST0-000", "reservationStatus": {"$in": ["ACTIVE", "WAITING", "ONGOING"]},
+                     "startTime": {"$lt": datetime(2000, 1, 1)},
+                     "endTime": {"$gt": datetime(2000, 1, 1)}}),  # 예약 겹침 확인
+    ("chargingProfile", {"reservationId": str(_SAMPLE_ID)}),  # Authorize ($lookup)
+    ("transaction", {"reservationId": _SAMPLE_ID}),  # TransactionEvent Ended, CostUpdated
+    ("transaction", {"syncAt": {"$lt": datetime(2000, 1, 1)}}),  # session_sync
+    ("evse", {"stationId": "ST-000"}),  # BootNotification, 연결 종료
+    ("evse", {"evseId": "EVSE-ST0-000"}),  # TransactionEvent
+    ("meterValueBucket", {"reservationId": _SAMPLE_ID, "bucketStart": datetime(2000, 1, 1)}),  # CostUpdated
+]
+
+
+def ensure_indexes(db):
+    """인덱스 생성. 이미 같은 인덱스가 있으면 아무것도 하지 않는다."""
+    for collection_name, models in INDEXES.items():
+        try:
+            created = db[collection_name].create_indexes(models)
+            logging.info("Indexes ready on %s: %s", collection_name, ", ".join(created))
+        except OperationFailure as e:
+            # 같은 이름에 다른 옵션이 있거나, unique 인덱스인데 중복 데이터가 있는 경우
+            logging.error("Failed to create indexes on %s: %s", collection_name, e)
+
+
+def _plan_stages(plan: Dict[str, Any]):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def check_query_plans(db) -> List[str]:
+    """
+    HOT_QUERIES 를 explain() 해서 COLLSCAN 을 하는 조회 목록을 반환한다.
+    반환값이 비어 있으면 모든 조회가 인덱스를 사용한다.
+    """
+    collscans = []
+    for collection_name, query in HOT_QUERIES:
+        explain = db[collection_name].find(query).explain()
+        stages = list(_plan_stages(explain["queryPlanner"]["winningPlan"]))
+        logging.info("explain %s %s -> %s", collection_name, list(query), " <- ".join(filter(None, stages)))
+        if "COLLSCAN" in stages:
+            collscans.append(f"{collection_name} {list(query)}")
+    return collscans
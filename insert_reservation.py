@@ -31,6 +31,16 @@ doc1 = {
     "reservationStatus": "ACTIVE",
     "createdAt": now
 }
+# 같은 EVSE 에 시간이 겹치는 예약이 있으면 넣지 않는다 (evseId_startTime 인덱스)
+overlap = reservation_collection.find_one({
+    "evseId": doc1["evseId"],
+    "reservationStatus": {"$in": ["ACTIVE", "WAITING", "ONGOING"]},
+    "startTime": {"$lt": doc1["endTime"]},
+    "endTime": {"$gt": doc1["startTime"]},
+}, {"_id": 1})
+if overlap is not None:
+    raise SystemExit(f"{doc1['evseId']} is already reserved by {overlap['_id']}")
+
 result = reservation_collection.insert_one(doc1)
 print("Inserted reservation_collection ID:", result.inserted_id)
 
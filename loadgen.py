@@ -0,0 +1,469 @@
+"""
+가상 충전소 부하 생성기 (ChargePoint201 기반, 화면/시리얼 없이 동작).
+
+수천 개의 충전소를 asyncio task 로 (필요하면 여러 프로세스로 나눠서) CSMS 에 붙이고,
+충전소마다 메시지를 포아송 과정으로 보낸다.
+
+    BootNotification   연결 직후 1회 (Pending 이면 interval 뒤에 다시) + --boot-rate
+    Heartbeat          --heartbeat-rate
+    Authorize          --authorize-rate (충전 없이 인증만)
+    충전 세션          --session-rate: Authorize -> TransactionEvent(Started)
+                       -> TransactionEvent(Updated) (--cost-interval 마다) -> TransactionEvent(Ended)
+    CostUpdated        --cost-updated-rate: 충전 중인 세션의 지금까지 cost/energy (세션이 없는 충전소는 보내지 않음)
+
+충전 세션은 charging_session.SessionEngine 이 프로세스마다 스케줄러 하나로 진행한다.
+세션 시각은 --time-scale 배로 흐르므로 (기본 60) 예약 데이터의 1시간 프로파일이 1분에 끝난다.
+
+rate 는 모두 "충전소 하나당 초당 횟수" 이다. 충전소들은 --ramp-up 초 동안
+--ramp-shape (linear | step | instant) 에 따라 접속한다.
+
+    # CSMS 를 MemoryStorage(예약 데이터 자동 생성)로 같이 띄워서 측정
+    python loadgen.py --local --stations 2000 --processes 2 --duration 120 --ramp-up 30 --report report.html
+
+    # 이미 떠 있는 CSMS 에 붙이기 (충전 세션은 그 DB 에 loadgen 예약이 있어야 성공)
+    python loadgen.py --uri ws://127.0.0.1:9000/ --stations 500 --report report.json
+
+결과는 Action 별 처리량과 지연시간 p50/p95/p99, 초 단위 처리량 시계열이다.
+--report 확장자가 .html 이면 HTML, 그 외에는 JSON 으로 저장한다.
+"""
+import argparse
+import asyncio
+import html
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+from charge_point import ChargePoint201
+from charging_session import CHARGING, ENDED, INTERRUPTED, ChargingSession, SessionEngine
+
+ACTIONS = ["BootNotification", "Heartbeat", "Authorize", "TransactionEvent", "CostUpdated"]
+
+
+class _Stats:
+    """한 프로세스의 측정값. 프로세스가 끝나면 dict 로 바꿔서 부모로 보낸다."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        # 초(측정 시작 기준) -> 완료된 메시지 수
+        self.per_second: Dict[int, int] = defaultdict(int)
+        self.connected = 0
+        self.connect_failed = 0
+        self.disconnected = 0
+        self.sessions_started = 0
+        self.sessions_completed = 0
+        self.sessions_rejected = 0
+        # 예외로 Interrupted 가 된 세션 (보내지 못한 TransactionEvent 는 errors 에 잡히지 않는다)
+        self.sessions_failed = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "latencies": dict(self.latencies),
+            "errors": dict(self.errors),
+            "per_second": dict(self.per_second),
+            "connected": self.connected,
+            "connect_failed": self.connect_failed,
+            "disconnected": self.disconnected,
+            "sessions_started": self.sessions_started,
+            "sessions_completed": self.sessions_completed,
+            "sessions_rejected": self.sessions_rejected,
+            "sessions_failed": self.sessions_failed,
+        }
+
+
+class LoadStation(ChargePoint201):
+    """보낸 메시지마다 Action 별 왕복 시간을 기록하는 ChargePoint201"""
+
+    def __init__(self, id, ws, stats: _Stats, started_at: float, response_timeout: float,
+                 engine: Optional[SessionEngine] = None):
+        super().__init__(id, ws, engine)
+        self._response_timeout = response_timeout
+        self._stats = stats
+        self._started_at = started_at
+        self.session_index = 0
+        # 충전 중인 세션 (CostUpdated 를 보낼 대상)
+        self.charging: Optional[ChargingSession] = None
+
+    async def call(self, payload, *args, **kwargs):
+        action = type(payload).__name__
+        started = time.perf_counter()
+        try:
+            response = await super().call(payload, *args, **kwargs)
+        except Exception:
+            self._stats.errors[action] += 1
+            raise
+        if response is None:
+            # CallError
+            self._stats.errors[action] += 1
+        else:
+            self._stats.latencies[action].append(time.perf_counter() - started)
+        self._stats.per_second[int(time.time() - self._started_at)] += 1
+        return response
+
+
+def _connect_delay(index: int, args) -> float:
+    """index 번째 충전소의 접속 시각 (측정 시작 기준, 초)"""
+    if args.ramp_up <= 0 or args.ramp_shape == "instant":
+        return 0.0
+    position = index / max(1, args.stations)
+    if args.ramp_shape == "step":
+        return int(position * args.ramp_steps) * args.ramp_up / args.ramp_steps
+    return position * args.ramp_up
+
+
+def station_token(station_id: str, session_index: int) -> str:
+    return f"{station_id}-tok-{session_index}"
+
+
+async def _run_session(cp: LoadStation, args, stats: _Stats, stop_at: float):
+    response = await cp.send_authorize(station_token(cp.id, cp.session_index))
+    cp.session_index += 1
+    if response is None or response.id_token_info["status"] != "Accepted" or not response.custom_data:
+        stats.sessions_rejected += 1
+        return
+
+    try:
+        session = await cp.engine.begin(cp, response.custom_data)
+    except (websockets.exceptions.ConnectionClosed, asyncio.TimeoutError):
+        raise
+    except Exception:
+        logging.exception("%s: could not start a session", cp.id)
+        stats.sessions_failed += 1
+        return
+    if session.state == INTERRUPTED:
+        return
+    stats.sessions_started += 1
+    cp.charging = session
+
+    # 프로파일이 끝나면 엔진이 Ended 를 보낸다, 그 전에 --session-length 나 측정 종료가 오면 멈춘다
+    timeout = max(0.0, min(stop_at, time.monotonic() + args.session_length) - time.monotonic())
+    try:
+        await asyncio.wait_for(asyncio.shield(session.finished), timeout)
+    except asyncio.TimeoutError:
+        cp.engine.stop(session.transaction_id)
+        await session.finished
+    finally:
+        cp.charging = None
+    if session.finished.result() == ENDED:
+        stats.sessions_completed += 1
+    elif session.error is not None:
+        stats.sessions_failed += 1
+
+
+async def _run_station(uri: str, station_id: str, index: int, args, stats: _Stats,
+                       started_at: float, stop_at: float, engine: SessionEngine):
+    await asyncio.sleep(_connect_delay(index, args))
+    if time.monotonic() >= stop_at:
+        return
+    try:
+        ws = await websockets.connect(uri + station_id, subprotocols=["ocpp2.0.1"], open_timeout=30,
+                                      ping_interval=None)
+    except Exception:
+        stats.connect_failed += 1
+        return
+    stats.connected += 1
+
+    cp = LoadStation(station_id, ws, stats, started_at, args.response_timeout, engine)
+    reader = asyncio.create_task(cp.start())
+    session: Optional[asyncio.Task] = None
+    rates = [("boot", args.boot_rate), ("heartbeat", args.heartbeat_rate),
+             ("authorize", args.authorize_rate), ("session", args.session_rate),
+             ("cost", args.cost_updated_rate)]
+    total_rate = sum(rate for _, rate in rates)
+    try:
+        await cp.boot()
+        while True:
+            # 종류별 포아송 과정의 합 = 전체 rate 의 포아송 과정, 종류는 rate 비율로 고른다
+            wait = random.expovariate(total_rate) if total_rate > 0 else stop_at - time.monotonic()
+            if time.monotonic() + wait >= stop_at:
+                await asyncio.sleep(max(0.0, stop_at - time.monotonic()))
+                break
+            await asyncio.sleep(wait)
+            kind = random.choices([name for name, _ in rates], [rate for _, rate in rates])[0]
+            if kind == "boot":
+                await cp.send_boot_notification()
+            elif kind == "heartbeat":
+                await cp.send_heartbeat()
+            elif kind == "authorize":
+                await cp.send_authorize(station_token(station_id, cp.session_index))
+            elif kind == "cost":
+                if cp.charging is not None and cp.charging.state == CHARGING:
+                    charging = cp.charging
+                    charging.integrate(engine.session_time(charging))
+                    await cp.cost_energy_updated(charging.reservation_id, round(charging.cost),
+                                                 round(charging.energy_wh))
+            elif session is None or session.done():
+                # 충전소당 세션은 하나씩
+                session = asyncio.create_task(_run_session(cp, args, stats, stop_at))
+        if session is not None:
+            await session
+    except (websockets.exceptions.ConnectionClosed, asyncio.TimeoutError):
+        stats.disconnected += 1
+    finally:
+        engine.interrupt(cp)
+        reader.cancel()
+        await ws.close()
+
+
+async def _run_stations(uri: str, station_ids: List[str], first_index: int, args, started_at: float) -> _Stats:
+    stats = _Stats()
+    # 프로세스마다 monotonic 기준이 다르므로 벽시계 시각으로 맞춘다
+    await asyncio.sleep(max(0.0, started_at - time.time()))
+    stop_at = time.monotonic() + args.duration
+    engine = SessionEngine(args.time_scale, args.cost_interval * args.time_scale)
+    try:
+        await asyncio.gather(*(
+            _run_station(uri, station_id, first_index + i, args, stats, started_at, stop_at, engine)
+            for i, station_id in enumerate(station_ids)
+        ), return_exceptions=True)
+    finally:
+        await engine.close()
+    return stats
+
+
+def _client_process(uri, station_ids, first_index, args, started_at) -> Dict[str, Any]:
+    logging.getLogger().setLevel(logging.WARNING)
+    return asyncio.run(_run_stations(uri, station_ids, first_index, args, started_at)).to_dict()
+
+
+def station_ids(args) -> List[str]:
+    return [f"{args.id_prefix}-{i:05d}" for i in range(args.stations)]
+
+
+# 로컬 CSMS (MemoryStorage)
+
+async def seed_reservations(storage, ids: List[str], sessions_per_station: int):
+    """충전소마다 sessions_per_station 개의 ACTIVE 예약과 충전 프로파일, EVSE 를 만든다."""
+    now = datetime.now()
+    reservations = []
+    for station_index, station_id in enumerate(ids):
+        for session_index in range(sessions_per_station):
+            reservations.append({
+                "stationId": station_id,
+                "evseId": f"EVSE-{station_id}-001",
+                "connectorId": 1,
+                "userId": f"user-{station_index:05d}",
+                "idToken": station_token(station_id, session_index),
+                "startTime": now + timedelta(hours=1),
+                "endTime": now + timedelta(hours=2),
+                "targetEnergyWh": 1200,
+                "cost": 420,
+                "reservationStatus": "ACTIVE",
+                "createdAt": now,
+            })
+    reservation_ids = await storage.insert_reservations(reservations)
+    await storage.insert_charging_profiles([{
+        "reservationId": str(reservation_id),
+        "chargingProfileKind": "ABSOLUTE",
+        "startSchedule": now,
+        "chargingSchedules": [
+            {"startPeriod": 0, "limit": 6000, "useESS": False},
+            {"startPeriod": 3600, "limit": 0, "useESS": False},
+        ],
+    } for reservation_id in reservation_ids])
+    await storage.insert_evses([{"stationId": station_id, "evseId": f"EVSE-{station_id}-001", "evseStatus": "OFFLINE"}
+                                for station_id in ids])
+
+
+async def _serve_local(port: int, ids: List[str], sessions_per_station: int):
+    import central_system
+    import csms
+
+    await seed_reservations(central_system.init_storage("memory"), ids, sessions_per_station)
+    args = argparse.Namespace(host="127.0.0.1", port=port, reject_auth=False, admin_host="127.0.0.1", admin_port=0)
+    await csms.serve(args)
+
+
+def _local_csms(port: int, ids: List[str], sessions_per_station: int, log_level: str):
+    from log_config import setup_logging
+
+    setup_logging("color", log_level)
+    try:
+        asyncio.run(_serve_local(port, ids, sessions_per_station))
+    except KeyboardInterrupt:
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"local CSMS did not start on port {port}")
+
+
+# 리포트
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def build_report(results: List[Dict[str, Any]], args, elapsed: float) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    per_second: Dict[int, int] = defaultdict(int)
+    totals = defaultdict(int)
+    for result in results:
+        for action, values in result["latencies"].items():
+            latencies[action].extend(values)
+        for action, count in result["errors"].items():
+            errors[action] += count
+        for second, count in result["per_second"].items():
+            per_second[int(second)] += count
+        for key in ("connected", "connect_failed", "disconnected",
+                    "sessions_started", "sessions_completed", "sessions_rejected", "sessions_failed"):
+            totals[key] += result[key]
+
+    actions = {}
+    for action in ACTIONS + sorted(set(latencies) - set(ACTIONS)):
+        values = latencies.get(action, [])
+        if not values and not errors.get(action):
+            continue
+        actions[action] = {
+            "count": len(values),
+            "errors": errors.get(action, 0),
+            "per_second": round(len(values) / args.duration, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "max_ms": round(max(values, default=0.0) * 1000, 2),
+        }
+    last_second = max(per_second, default=-1)
+    return {
+        "config": {key: value for key, value in vars(args).items() if key != "report"},
+        "elapsed_s": round(elapsed, 1),
+        **totals,
+        "messages": sum(action["count"] for action in actions.values()),
+        "messages_per_second": round(sum(action["count"] for action in actions.values()) / args.duration, 2),
+        "actions": actions,
+        "throughput": [per_second.get(second, 0) for second in range(last_second + 1)],
+    }
+
+
+def render_html(report: Dict[str, Any]) -> str:
+    rows = "".join(
+        f"<tr><td>{html.escape(action)}</td>" + "".join(f"<td>{stats[key]}</td>" for key in (
+            "count", "errors", "per_second", "p50_ms", "p95_ms", "p99_ms", "max_ms")) + "</tr>"
+        for action, stats in report["actions"].items())
+    throughput = report["throughput"]
+    peak = max(throughput, default=0) or 1
+    width = max(1, len(throughput)) * 4
+    bars = "".join(f'<rect x="{i * 4}" y="{100 - count * 100 / peak:.1f}" width="3" height="{count * 100 / peak:.1f}"/>'
+                   for i, count in enumerate(throughput))
+    summary = "".join(f"<li>{key}: {report[key]}</li>" for key in (
+        "connected", "connect_failed", "disconnected", "sessions_started", "sessions_completed",
+        "sessions_rejected", "sessions_failed", "messages", "messages_per_second"))
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>CSMS load test</title>
+<style>body{{font-family:sans-serif}} table{{border-collapse:collapse}} td,th{{border:1px solid #ccc;padding:4px 8px;text-align:right}} rect{{fill:#3a7}}</style>
+</head><body>
+<h1>CSMS load test</h1>
+<pre>{html.escape(json.dumps(report["config"], indent=2))}</pre>
+<ul>{summary}</ul>
+<table><tr><th>Action</th><th>count</th><th>errors</th><th>/s</th><th>p50 ms</th><th>p95 ms</th><th>p99 ms</th><th>max ms</th></tr>{rows}</table>
+<h2>Messages per second (peak {peak})</h2>
+<svg width="{width}" height="100">{bars}</svg>
+</body></html>
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual charge point load generator")
+    parser.add_argument("--uri", default=os.getenv("CSMS_URI", "ws://127.0.0.1:9000/"),
+                        help="CSMS websocket URI ending with / (ignored with --local)")
+    parser.add_argument("--local", action="store_true",
+                        help="start a CSMS on a free port with in-memory storage and seeded reservations")
+    parser.add_argument("--stations", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=1, help="client processes")
+    parser.add_argument("--id-prefix", default="LOAD")
+    parser.add_argument("--duration", type=float, default=60, help="seconds from the first connection")
+    parser.add_argument("--ramp-up", type=float, default=10, help="seconds until every station is connected")
+    parser.add_argument("--ramp-shape", choices=["linear", "step", "instant"], default="linear")
+    parser.add_argument("--ramp-steps", type=int, default=4, help="number of steps for --ramp-shape step")
+    parser.add_argument("--boot-rate", type=float, default=0.0, help="extra BootNotifications per station per second")
+    parser.add_argument("--heartbeat-rate", type=float, default=1 / 30, help="Heartbeats per station per second")
+    parser.add_argument("--authorize-rate", type=float, default=0.0,
+                        help="stand-alone Authorize per station per second")
+    parser.add_argument("--session-rate", type=float, default=1 / 300,
+                        help="charging sessions started per station per second")
+    parser.add_argument("--cost-updated-rate", type=float, default=0.0,
+                        help="CostUpdated per station per second while the station has a charging session")
+    parser.add_argument("--session-length", type=float, default=60,
+                        help="maximum seconds between Started and Ended (sessions end earlier when the profile ends)")
+    parser.add_argument("--cost-interval", type=float, default=10,
+                        help="seconds between TransactionEvent(Updated) in a session")
+    parser.add_argument("--time-scale", type=float, default=60,
+                        help="session time runs this many times faster than real time (1 = real time)")
+    parser.add_argument("--sessions-per-station", type=int, default=5,
+                        help="reservations seeded per station with --local")
+    parser.add_argument("--response-timeout", type=float, default=30)
+    parser.add_argument("--csms-log-level", default="WARNING")
+    parser.add_argument("--report", help="write the report to this .json or .html file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    ids = station_ids(args)
+    uri = args.uri
+    csms_process = None
+    if args.local:
+        port = _free_port()
+        csms_process = multiprocessing.get_context("spawn").Process(
+            target=_local_csms, args=(port, ids, args.sessions_per_station, args.csms_log_level))
+        csms_process.start()
+        _wait_for_port(port)
+        uri = f"ws://127.0.0.1:{port}/"
+
+    processes = max(1, min(args.processes, args.stations))
+    chunk = -(-args.stations // processes)
+    started_at = time.time() + 1.0
+    begin = time.monotonic()
+    try:
+        if processes == 1:
+            results = [_client_process(uri, ids, 0, args, started_at)]
+        else:
+            with multiprocessing.get_context("spawn").Pool(processes) as pool:
+                started_at = time.time() + 3.0  # 프로세스 기동 시간
+                results = pool.starmap(_client_process, [
+                    (uri, ids[i:i + chunk], i, args, started_at) for i in range(0, args.stations, chunk)])
+    finally:
+        if csms_process is not None:
+            os.kill(csms_process.pid, signal.SIGINT)
+            csms_process.join(10)
+            if csms_process.is_alive():
+                csms_process.terminate()
+
+    report = build_report(results, args, time.monotonic() - begin)
+    summary = {key: value for key, value in report.items() if key not in ("config", "throughput")}
+    print(json.dumps(summary, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            if args.report.endswith(".html"):
+                f.write(render_html(report))
+            else:
+                json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+from typing import Optional
+
+# 지금 처리 중인 충전소 id (ChargePointHandler 가 메시지마다 설정)
+station_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("station_id", default=None)
+
+LOG_FORMAT = "[%(asctime)s] %(levelname)-8s | %(name)s | %(message)s"
+DATE_FORMAT = "%H:%M:%S"
+
+# LogRecord 기본 속성 (나머지는 extra= 로 넘긴 필드)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "station"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class ColorFormatter(logging.Formatter):
+    COLORS = {
+        logging.DEBUG: "\033[94m",    # 파랑
+        logging.INFO: "\033[92m",     # 초록
+        logging.WARNING: "\033[93m",  # 노랑
+        logging.ERROR: "\033[91m",    # 빨강
+        logging.CRITICAL: "\033[95m", # 보라
+    }
+    RESET = "\033[0m"
+
+    def format(self, record):
+        log_color = self.COLORS.get(record.levelno, self.RESET)
+        message = super().format(record)
+        return f"{log_color}{message}{self.RESET}"
+
+
+class JsonFormatter(logging.Formatter):
+    """한 줄에 JSON 하나. station 과 extra= 로 넘긴 필드가 그대로 들어간다."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "station", None):
+            entry["station"] = record.station
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _StationQueueHandler(logging.handlers.QueueHandler):
+    """
+    이벤트 루프 스레드에서는 레코드를 큐에 넣기만 한다.
+    메시지 포맷(msg % args)과 출력은 QueueListener 스레드에서 한다.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # contextvar 는 로그를 남긴 쪽(루프 스레드)에서 읽어야 한다
+        record.station = station_id.get()
+        return record
+
+
+def setup_logging(log_format: str = "color", level: str = "INFO"):
+    """
+    루트 로거 설정. log_format 은 "color" (기존 출력) 또는 "json".
+    두 경우 모두 출력은 QueueListener 스레드에서 한다.
+    """
+    global _listener
+    _stop_listener()
+
+    stream_handler = logging.StreamHandler()
+    if log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(ColorFormatter(LOG_FORMAT, DATE_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_StationQueueHandler(log_queue))
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        # 큐에 남은 로그를 모두 출력하고 종료
+        _listener.stop()
+        _listener = None
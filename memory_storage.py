@@ -0,0 +1,181 @@
+import copy
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+
+import meter_values
+from meter_values import MeterSample
+from storage import Storage
+
+
+class MemoryStorage(Storage):
+    """
+    프로세스 메모리에 두는 저장소 (벤치마크, 테스트용).
+
+    MongoStorage 와 같은 문서 형식을 사용하고, 핸들러가 조회하는 키마다 dict 인덱스를 둔다.
+    모든 연산이 이벤트 루프에서 바로 끝나므로 OCPP/JSON 처리 경로만 따로 측정할 수 있다.
+    프로세스 사이에 공유되지 않으므로 --workers 1 에서만 사용한다.
+    """
+
+    def __init__(self):
+        self._reservations: Dict[ObjectId, Dict[str, Any]] = {}
+        # idToken -> 예약 _id (삽입 순서)
+        self._reservations_by_token: Dict[str, List[ObjectId]] = {}
+        # reservationId(문자열) -> 충전 프로파일
+        self._charging_profiles: Dict[str, Dict[str, Any]] = {}
+        # reservationId -> 트랜잭션 (MongoStorage 의 update_one 처럼 첫 번째 문서만 갱신)
+        self._transactions: Dict[ObjectId, List[Dict[str, Any]]] = {}
+        # (reservationId, transactionId) unique 인덱스
+        self._transaction_ids: Set[Tuple[ObjectId, str]] = set()
+        self._evses: Dict[str, Dict[str, Any]] = {}
+        # stationId -> evseId
+        self._evses_by_station: Dict[str, List[str]] = {}
+        # reservationId -> (시각, energyWh, cost)
+        self._meter_samples: Dict[str, List[Tuple[datetime, int, int]]] = {}
+
+    @staticmethod
+    def _with_id(document: Dict[str, Any]) -> Dict[str, Any]:
+        document = dict(document)
+        document.setdefault("_id", ObjectId())
+        return document
+
+    # evse
+    async def insert_evses(self, evses: List[Dict[str, Any]]):
+        for evse in evses:
+            evse = self._with_id(evse)
+            self._evses[evse["evseId"]] = evse
+            self._evses_by_station.setdefault(evse["stationId"], []).append(evse["evseId"])
+
+    async def set_stations_evse_status(self, updates: Dict[str, str]):
+        now = datetime.now()
+        for station_id, status in updates.items():
+            for evse_id in self._evses_by_station.get(station_id, ()):
+                self._evses[evse_id].update(evseStatus=status, lastUpdated=now)
+
+    async def set_evse_status(self, evse_id: str, status: str, updated_at: Optional[datetime] = None) -> bool:
+        evse = self._evses.get(evse_id)
+        if evse is None:
+            return False
+        if updated_at is not None and evse.get("lastUpdated") is not None and evse["lastUpdated"] >= updated_at:
+            return False
+        evse.update(evseStatus=status, lastUpdated=updated_at or datetime.now())
+        return True
+
+    async def find_evse_statuses(self) -> List[Dict[str, Any]]:
+        return [{key: evse.get(key) for key in ("stationId", "evseId", "evseStatus")} for evse in self._evses.values()]
+
+    # reservation
+    async def insert_reservations(self, reservations: List[Dict[str, Any]]) -> List[ObjectId]:
+        inserted_ids = []
+        for reservation in reservations:
+            reservation = self._with_id(reservation)
+            self._reservations[reservation["_id"]] = reservation
+            self._reservations_by_token.setdefault(reservation["idToken"], []).append(reservation["_id"])
+            inserted_ids.append(reservation["_id"])
+        return inserted_ids
+
+    async def find_authorization(self, id_token: str) -> Optional[Dict[str, Any]]:
+        for reservation_id in self._reservations_by_token.get(id_token, ()):
+            reservation = self._reservations[reservation_id]
+            if reservation["reservationStatus"] in ("ACTIVE", "WAITING"):
+                # 캐시에 들어가므로 내부 문서를 그대로 넘기지 않는다
+                reservation = dict(reservation)
+                charging_profile = self._charging_profiles.get(str(reservation_id))
+                reservation["chargingSchedules"] = (
+                    copy.deepcopy(charging_profile["chargingSchedules"]) if charging_profile else None)
+                return reservation
+        return None
+
+    async def set_reservation_status(self, reservation_id: str, status: str):
+        reservation = self._reservations.get(ObjectId(reservation_id))
+        if reservation is not None:
+            reservation["reservationStatus"] = status
+
+    async def find_reservation_deadlines(self, statuses: List[str], start_after: Optional[datetime],
+                                         start_before: datetime) -> List[Dict[str, Any]]:
+        return [
+            {key: reservation[key] for key in ("_id", "idToken", "startTime", "reservationStatus")}
+            for reservation in self._reservations.values()
+            if reservation["reservationStatus"] in statuses
+            and reservation["startTime"] < start_before
+            and (start_after is None or reservation["startTime"] >= start_after)
+        ]
+
+    async def transition_reservations(self, reservation_ids: List[str], from_status: str, to_status: str,
+                                      start_before: datetime) -> List[str]:
+        moved = []
+        for reservation_id in reservation_ids:
+            reservation = self._reservations.get(ObjectId(reservation_id))
+            if (reservation is not None and reservation["reservationStatus"] == from_status
+                    and reservation["startTime"] <= start_before):
+                reservation["reservationStatus"] = to_status
+                moved.append(reservation_id)
+        return moved
+
+    async def find_open_reservations(self, statuses: List[str], end_after: datetime) -> List[Dict[str, Any]]:
+        return [
+            {key: reservation[key] for key in ("_id", "stationId", "evseId", "startTime", "endTime", "reservationStatus")}
+            for reservation in self._reservations.values()
+            if reservation["reservationStatus"] in statuses and reservation["endTime"] > end_after
+        ]
+
+    # chargingProfile
+    async def insert_charging_profiles(self, charging_profiles: List[Dict[str, Any]]):
+        for charging_profile in charging_profiles:
+            charging_profile = self._with_id(charging_profile)
+            self._charging_profiles.setdefault(charging_profile["reservationId"], charging_profile)
+
+    # transaction
+    async def insert_transaction(self, transaction: Dict[str, Any]) -> bool:
+        if transaction.get("transactionId") is not None:
+            key = (transaction["reservationId"], transaction["transactionId"])
+            if key in self._transaction_ids:
+                return False
+            self._transaction_ids.add(key)
+        transaction = self._with_id(transaction)
+        self._transactions.setdefault(transaction["reservationId"], []).append(transaction)
+        return True
+
+    def _transaction(self, reservation_id: str) -> Optional[Dict[str, Any]]:
+        transactions = self._transactions.get(ObjectId(reservation_id))
+        return transactions[0] if transactions else None
+
+    async def end_transaction(self, reservation_id: str, status: str, costs: Optional[Tuple[int, int]],
+                              sync_at: datetime):
+        transaction = self._transaction(reservation_id)
+        if transaction is not None:
+            transaction.update(transactionStatus=status, syncAt=sync_at)
+            if costs is not None:
+                transaction.update(cost=costs[0], energyWh=costs[1])
+
+    async def find_unsynced_transactions(self, sync_before: datetime) -> List[Dict[str, Any]]:
+        return [
+            {key: transaction[key] for key in ("reservationId", "evseId", "transactionStatus", "syncAt")}
+            for transactions in self._transactions.values()
+            for transaction in transactions
+            if transaction.get("syncAt") is not None and transaction["syncAt"] < sync_before
+        ]
+
+    async def clear_transaction_sync(self, keys: List[Tuple[str, datetime]]):
+        for reservation_id, sync_at in keys:
+            for transaction in self._transactions.get(ObjectId(reservation_id), ()):
+                if transaction.get("syncAt") == sync_at:
+                    del transaction["syncAt"]
+
+    async def update_transaction_costs(self, updates: Dict[str, Tuple[int, int]]):
+        for reservation_id, (cost, energy_wh) in updates.items():
+            transaction = self._transaction(reservation_id)
+            if transaction is not None:
+                transaction.update(cost=cost, energyWh=energy_wh)
+
+    # meterValue
+    async def insert_meter_samples(self, samples: List[MeterSample]):
+        for reservation_id, ts, energy_wh, cost in samples:
+            self._meter_samples.setdefault(reservation_id, []).append((ts, energy_wh, cost))
+
+    async def find_meter_curve(self, reservation_id: str, resolution: float,
+                               start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        samples = sorted(sample for sample in self._meter_samples.get(reservation_id, ())
+                         if meter_values.in_range(sample[0], start, end))
+        return meter_values.downsample(samples, resolution)
@@ -0,0 +1,79 @@
+"""
+트랜잭션 계량값(meter sample) 시계열.
+
+CostUpdated 를 받을 때마다 (시각, 누적 energyWh, 누적 cost) 샘플을 하나 남긴다.
+MongoDB 는 time-series 컬렉션(meterValue)에 저장하고, time-series 를 쓸 수 없으면
+트랜잭션별 METER_BUCKET_MINUTES 분 단위 문서(meterValueBucket)에 배열로 모아서 저장한다.
+
+    {"reservationId": ObjectId, "bucketStart": datetime, "count": 3,
+     "ts": [t1, t2, t3], "energyWh": [20, 40, 60], "cost": [6, 12, 18]}
+
+조회는 resolution 초 단위로 다운샘플링한 곡선 (구간마다 마지막 누적값 + 평균 전력).
+"""
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# auto (time-series 컬렉션을 만들 수 없으면 buckets) | timeseries | buckets
+METER_STORAGE = os.getenv("METER_STORAGE", "auto")
+METER_BUCKET_MINUTES = int(os.getenv("METER_BUCKET_MINUTES", "10"))
+METER_COLLECTION = "meterValue"
+METER_BUCKET_COLLECTION = "meterValueBucket"
+
+# (reservationId, 시각, 누적 energyWh, 누적 cost)
+MeterSample = Tuple[str, datetime, int, int]
+
+
+def bucket_start(ts: datetime) -> datetime:
+    """ts 가 들어가는 METER_BUCKET_MINUTES 분 구간의 시작 시각"""
+    minutes = ts.minute - ts.minute % METER_BUCKET_MINUTES
+    return ts.replace(minute=minutes, second=0, microsecond=0)
+
+
+def time_range(start: Optional[datetime], end: Optional[datetime]) -> Dict[str, datetime]:
+    """[start, end] 조건 (None 이면 그쪽은 제한 없음)"""
+    condition = {}
+    if start is not None:
+        condition["$gte"] = start
+    if end is not None:
+        condition["$lte"] = end
+    return condition
+
+
+def in_range(ts: datetime, start: Optional[datetime], end: Optional[datetime]) -> bool:
+    return (start is None or ts >= start) and (end is None or ts <= end)
+
+
+def bucket_range(start: Optional[datetime], end: Optional[datetime]) -> Dict[str, datetime]:
+    """[start, end] 구간의 샘플을 담을 수 있는 bucketStart 조건"""
+    return time_range(start and start - timedelta(minutes=METER_BUCKET_MINUTES), end)
+
+
+def downsample(samples: Iterable[Tuple[datetime, int, int]], resolution: float) -> List[Dict[str, Any]]:
+    """시각순 샘플을 resolution 초 구간으로 나눠 구간마다 마지막 샘플을 남긴다."""
+    points: List[Dict[str, Any]] = []
+    last_bin = None
+    for ts, energy_wh, cost in samples:
+        current_bin = math.floor(ts.timestamp() / resolution)
+        point = {"ts": ts, "energyWh": energy_wh, "cost": cost}
+        if current_bin == last_bin:
+            points[-1] = point
+        else:
+            points.append(point)
+            last_bin = current_bin
+    return with_power(points)
+
+
+def with_power(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """앞 점과의 에너지 차이로 평균 전력(W)을 붙인다. 첫 점은 None."""
+    previous = None
+    for point in points:
+        power_w = None
+        if previous is not None:
+            seconds = (point["ts"] - previous["ts"]).total_seconds()
+            if seconds > 0:
+                power_w = round((point["energyWh"] - previous["energyWh"]) * 3600 / seconds, 1)
+        point["powerW"] = power_w
+        previous = point
+    return points
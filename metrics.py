@@ -0,0 +1,159 @@
+"""
+Prometheus 텍스트 형식의 간단한 메트릭 (Counter, Gauge, Histogram).
+
+모든 메트릭은 이벤트 루프 스레드에서만 갱신한다. render() 결과는 관리 API 의 GET /metrics 로 나간다.
+"""
+import bisect
+import contextvars
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics: List["_Metric"] = []
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics.append(self)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def _samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                for labels, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        # 값을 저장하지 않고 render 할 때 계산 (예: 연결된 충전소 수)
+        self._function = function
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels: str) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(labels, 0.0)
+
+    def _samples(self):
+        if self._function is not None:
+            return [f"{self.name} {self._function()}"]
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                for labels, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (버킷별 개수, 합계, 전체 개수)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[0][index] += 1
+        state[1] += value
+        state[2] += 1
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def _samples(self):
+        lines = []
+        for labels, (bucket_counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in _metrics) + "\n"
+
+
+# 현재 처리 중인 OCPP 메시지에서 DB 를 기다린 시간 합계 (핸들러 시간과 DB 시간을 나누기 위해 사용)
+db_time: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("db_time", default=None)
+
+
+def add_db_time(seconds: float):
+    accumulator = db_time.get()
+    if accumulator is not None:
+        accumulator[0] += seconds
+
+
+# OCPP
+messages_received = Counter("ocpp_messages_received_total", "CALL messages received from stations", ["action"])
+handler_seconds = Histogram("ocpp_handler_seconds",
+                            "Time spent handling a CALL, excluding time waiting for the database", ["action"])
+handler_db_seconds = Histogram("ocpp_handler_db_seconds", "Time a CALL handler spent waiting for the database",
+                               ["action"])
+station_handler_seconds = Counter("ocpp_station_handler_seconds_total",
+                                  "Total CALL handling time (including database) per station", ["station"])
+station_messages = Counter("ocpp_station_messages_received_total", "CALL messages received per station", ["station"])
+calls_sent = Counter("ocpp_calls_sent_total", "CALL messages sent to stations", ["action", "result"])
+call_seconds = Histogram("ocpp_call_seconds", "Round trip of CALL messages sent to stations", ["action"])
+calls_in_flight = Gauge("ocpp_calls_in_flight", "CALL messages sent to stations and waiting for a reply")
+
+# MongoDB
+db_operation_seconds = Histogram("mongo_operation_seconds", "MongoDB operation time including executor queueing",
+                                 ["operation"])
@@ -0,0 +1,209 @@
+"""
+OCPP 메시지 JSON 인코딩/디코딩 빠른 경로 (OCPP_CODEC=fast 이면 ChargePointHandler 가 사용, 기본값은 라이브러리 경로).
+
+    디코드/인코드    orjson (requirements.txt), 설치되어 있지 않으면 json (CSMS 가 시작할 때 JSON_BACKEND 를 로그로 남김)
+    키 변환          camelCase <-> snake_case 를 키마다 한 번만 계산해서 캐시 (라이브러리 함수와 같은 결과)
+    응답 직렬화      dataclass -> camelCase dict 를 한 번에 (asdict 복사, remove_nones, 키 변환을 따로 돌지 않음)
+    스키마 검증      Action 별 on | off | sampled (OCPP_VALIDATION_SAMPLE_RATE 비율만 검증)
+
+    OCPP_VALIDATION=on
+    OCPP_VALIDATION_ACTIONS=Heartbeat=off,TransactionEvent=sampled,CostUpdated=sampled
+
+    OCPP_CODEC=fast   (결과는 라이브러리 경로와 같다: tests/test_ocpp_codec.py)
+
+키 캐시는 크기 제한이 있다 (customData 에는 충전소가 아무 키나 넣을 수 있음). 넘으면 캐시하지 않고 계산한다.
+"""
+import dataclasses
+import decimal
+import enum
+import json
+import os
+import random
+from typing import Any, Callable, Dict
+
+from ocpp.charge_point import camel_to_snake_case as _camel_to_snake_case
+from ocpp.charge_point import snake_to_camel_case as _snake_to_camel_case
+from ocpp.exceptions import FormatViolationError, PropertyConstraintViolationError, ProtocolError
+from ocpp.messages import Call, CallError, CallResult
+
+import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+OCPP_CODEC = os.getenv("OCPP_CODEC", "ocpp")  # ocpp | fast
+OCPP_VALIDATION = os.getenv("OCPP_VALIDATION", "on")  # on | off | sampled
+OCPP_VALIDATION_ACTIONS = os.getenv("OCPP_VALIDATION_ACTIONS", "")
+OCPP_VALIDATION_SAMPLE_RATE = float(os.getenv("OCPP_VALIDATION_SAMPLE_RATE", "0.01"))
+KEY_CACHE_SIZE = 4096
+
+validations = metrics.Counter("ocpp_payload_validations_total",
+                              "OCPP payload schema validations by Action and whether they ran", ["action", "result"])
+
+
+def _default(obj: Any) -> Any:
+    # ocpp.messages._DecimalEncoder 와 같게
+    if isinstance(obj, decimal.Decimal):
+        return float("%.1f" % obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(data: Any) -> str:
+        return orjson.dumps(data, default=_default).decode()
+
+    def loads(raw) -> Any:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # orjson 이 받지 않는 값 (64비트를 넘는 정수 등) 은 json 으로
+            return json.loads(raw)
+else:
+    _encoder = json.JSONEncoder(separators=(",", ":"), default=_default)
+
+    def dumps(data: Any) -> str:
+        return _encoder.encode(data)
+
+    loads = json.loads
+
+
+class _KeyCache:
+    """키 하나의 변환 결과 캐시 (변환 함수는 ocpp 라이브러리 것을 그대로 사용)"""
+
+    def __init__(self, convert: Callable[[Dict[str, Any]], Dict[str, Any]], maxsize: int = KEY_CACHE_SIZE):
+        self._convert = convert
+        self._keys: Dict[str, str] = {}
+        self.maxsize = maxsize
+
+    def __call__(self, key: str) -> str:
+        converted = self._keys.get(key)
+        if converted is None:
+            converted = next(iter(self._convert({key: None})))
+            if len(self._keys) < self.maxsize:
+                self._keys[key] = converted
+        return converted
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+snake_key = _KeyCache(_camel_to_snake_case)
+camel_key = _KeyCache(_snake_to_camel_case)
+
+
+# 그대로 두는 값 (정확한 타입 비교가 isinstance 보다 빠르다)
+_SCALARS = frozenset({str, int, float, bool, type(None)})
+
+
+def camel_to_snake_case(data: Any) -> Any:
+    if type(data) is dict:
+        return {snake_key(key): value if type(value) in _SCALARS else camel_to_snake_case(value)
+                for key, value in data.items()}
+    if type(data) is list:
+        return [value if type(value) in _SCALARS else camel_to_snake_case(value) for value in data]
+    if isinstance(data, (dict, list)):
+        return _camel_to_snake_case(data)
+    return data
+
+
+def snake_to_camel_case(data: Any) -> Any:
+    if type(data) is dict:
+        return {camel_key(key): value if type(value) in _SCALARS else snake_to_camel_case(value)
+                for key, value in data.items()}
+    if type(data) is list:
+        return [value if type(value) in _SCALARS else snake_to_camel_case(value) for value in data]
+    if isinstance(data, (dict, list)):
+        return _snake_to_camel_case(data)
+    return data
+
+
+# dataclass 타입 -> 필드 이름들 (dataclasses.fields 는 호출마다 튜플을 새로 만든다)
+_fields: Dict[type, tuple] = {}
+
+
+def to_payload(value: Any) -> Any:
+    """
+    call/call_result dataclass 를 보낼 payload 로.
+    serialize_as_dict -> remove_nones -> snake_to_camel_case 와 같은 결과.
+    """
+    cls = type(value)
+    if cls in _SCALARS:
+        return value
+    if cls is dict:
+        return {camel_key(key): item if type(item) in _SCALARS else to_payload(item)
+                for key, item in value.items() if item is not None}
+    if cls is list or cls is tuple:
+        return [item if type(item) in _SCALARS else to_payload(item) for item in value if item is not None]
+    names = _fields.get(cls)
+    if names is None and dataclasses.is_dataclass(cls):
+        names = _fields[cls] = tuple(field.name for field in dataclasses.fields(cls))
+    if names is not None:
+        payload = {}
+        for name in names:
+            item = getattr(value, name)
+            if item is not None:
+                payload[camel_key(name)] = item if type(item) in _SCALARS else to_payload(item)
+        return payload
+    if isinstance(value, dict):
+        return to_payload(dict(value))
+    if isinstance(value, (list, tuple)):
+        return to_payload(list(value))
+    if isinstance(value, enum.Enum) and not isinstance(value, str):
+        return value.value
+    return value
+
+
+def unpack(raw: str):
+    """ocpp.messages.unpack 과 같은 메시지/예외, 디코드만 loads 로"""
+    try:
+        message = loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        raise FormatViolationError(details={"cause": "Message is not valid JSON", "ocpp_message": raw})
+    if not isinstance(message, list):
+        raise ProtocolError(details={"cause": f"OCPP message hasn't the correct format. It should be a list, "
+                                              f"but got '{type(message)}' instead"})
+    if not message:
+        raise ProtocolError(details={"cause": "Message does not contain MessageTypeId"})
+    for cls in (Call, CallResult, CallError):
+        if message[0] == cls.message_type_id:
+            try:
+                return cls(*message[1:])
+            except TypeError:
+                raise ProtocolError(details={"cause": "Message is missing elements."})
+    raise PropertyConstraintViolationError(details={"cause": f"MessageTypeId '{message[0]}' isn't valid"})
+
+
+def call_result_json(unique_id: str, payload: Dict[str, Any]) -> str:
+    return dumps([CallResult.message_type_id, unique_id, payload])
+
+
+class ValidationPolicy:
+    def __init__(self, default: str = OCPP_VALIDATION, actions: str = OCPP_VALIDATION_ACTIONS,
+                 sample_rate: float = OCPP_VALIDATION_SAMPLE_RATE):
+        self.default = default
+        self.sample_rate = sample_rate
+        # Action -> on | off | sampled
+        self.actions: Dict[str, str] = {}
+        for item in filter(None, (part.strip() for part in actions.split(","))):
+            action, _, mode = item.partition("=")
+            self.actions[action.strip()] = mode.strip()
+        for mode in [default, *self.actions.values()]:
+            if mode not in ("on", "off", "sampled"):
+                raise ValueError(f"Unknown OCPP validation mode: {mode}")
+
+    def mode(self, action: str) -> str:
+        return self.actions.get(action, self.default)
+
+    def should_validate(self, action: str) -> bool:
+        """이 메시지(요청과 응답)를 검증할지"""
+        mode = self.mode(action)
+        validate = mode == "on" or (mode == "sampled" and random.random() < self.sample_rate)
+        validations.inc(action, "validated" if validate else "skipped")
+        return validate
+
+
+validation_policy = ValidationPolicy()
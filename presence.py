@@ -0,0 +1,65 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, List, Optional
+
+from registry import StationEntry, StationRegistry
+
+# Heartbeat 주기의 몇 배 동안 메시지가 없으면 오프라인으로 보는지
+OFFLINE_TIMEOUT_FACTOR = float(os.getenv("OFFLINE_TIMEOUT_FACTOR", "2.0"))
+OFFLINE_SWEEP_INTERVAL = float(os.getenv("OFFLINE_SWEEP_INTERVAL", "10"))  # 초
+
+
+class HeartbeatSweeper:
+    """
+    Heartbeat 타임아웃 검사 (충전소마다 타이머를 두지 않고 task 하나로).
+
+    registry 는 연결을 last_seen 순서로 들고 있으므로 오래된 쪽부터 타임아웃된 연결만 확인한다.
+    타임아웃된 충전소는 registry 에서 빼고 on_stale 로 넘긴 뒤 소켓을 닫는다.
+    """
+
+    def __init__(self, registry: StationRegistry, on_stale: Callable[[List[StationEntry]], None],
+                 heartbeat_interval: float, timeout_factor: float = OFFLINE_TIMEOUT_FACTOR,
+                 sweep_interval: float = OFFLINE_SWEEP_INTERVAL):
+        self._registry = registry
+        self._on_stale = on_stale
+        self.timeout = heartbeat_interval * timeout_factor
+        self.sweep_interval = sweep_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def sweep(self) -> List[StationEntry]:
+        stale = self._registry.stale(time.time() - self.timeout)
+        if not stale:
+            return stale
+        handlers = [entry.handler for entry in stale]
+        for handler in handlers:
+            self._registry.unregister(handler)
+        logging.warning("%d stations missed their heartbeat, marking offline: %s",
+                        len(stale), ", ".join(entry.charge_point_id for entry in stale[:20]))
+        self._on_stale(stale)
+        for handler in handlers:
+            # 반쯤 끊긴 연결도 close_timeout 이 지나면 정리된다
+            asyncio.create_task(handler._connection.close(code=1001, reason="heartbeat timeout"))
+        return stale
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                logging.exception("Heartbeat sweep failed")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
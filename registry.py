@@ -0,0 +1,159 @@
+import asyncio
+import dataclasses
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import metrics
+
+DEFAULT_COMMAND_TIMEOUT = 30.0
+DEFAULT_FAN_OUT_CONCURRENCY = 50
+
+
+@dataclass
+class StationEntry:
+    charge_point_id: str
+    handler: Any
+    connected: bool = True
+    connected_at: float = field(default_factory=time.time)
+    disconnected_at: Optional[float] = None
+    last_seen: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "chargePointId": self.charge_point_id,
+            "connected": self.connected,
+            "connectedAt": self.connected_at,
+            "disconnectedAt": self.disconnected_at,
+            "lastSeen": self.last_seen,
+        }
+
+
+class StationRegistry:
+    """
+    연결된 충전소 목록 (charge_point_id -> StationEntry).
+
+    CSMS 가 먼저 보내는 명령(ChargePointHandler 의 *_req 메서드)을 밖에서 호출할 수 있게 한다.
+    """
+
+    def __init__(self):
+        self._stations: Dict[str, StationEntry] = {}
+        # 연결된 충전소를 last_seen 오래된 순서로 (touch 할 때마다 맨 뒤로)
+        self._by_last_seen: "OrderedDict[str, StationEntry]" = OrderedDict()
+        # 다른 워커 프로세스로 명령을 전달하는 routing.BrokerClient (워커가 1개이면 None)
+        self.router = None
+
+    def register(self, handler) -> StationEntry:
+        entry = StationEntry(handler.charge_point_id, handler)
+        self._stations[handler.charge_point_id] = entry
+        self._by_last_seen[handler.charge_point_id] = entry
+        self._by_last_seen.move_to_end(handler.charge_point_id)
+        if self.router is not None:
+            self.router.station_connected(handler.charge_point_id)
+        return entry
+
+    def unregister(self, handler) -> bool:
+        """현재 등록된 연결이 handler 이면 연결 해제로 표시하고 True"""
+        entry = self._stations.get(handler.charge_point_id)
+        # 같은 id 로 다시 연결된 경우 새 연결은 건드리지 않는다
+        if entry is None or entry.handler is not handler:
+            return False
+        entry.connected = False
+        entry.disconnected_at = time.time()
+        entry.handler = None
+        self._by_last_seen.pop(handler.charge_point_id, None)
+        if self.router is not None:
+            self.router.station_disconnected(handler.charge_point_id)
+        return True
+
+    def touch(self, charge_point_id: str):
+        entry = self._by_last_seen.get(charge_point_id)
+        if entry is not None:
+            entry.last_seen = time.time()
+            self._by_last_seen.move_to_end(charge_point_id)
+
+    def get(self, charge_point_id: str) -> Optional[StationEntry]:
+        return self._stations.get(charge_point_id)
+
+    def connected_ids(self) -> List[str]:
+        return list(self._by_last_seen)
+
+    def connected_count(self) -> int:
+        return len(self._by_last_seen)
+
+    def stale(self, last_seen_before: float) -> List[StationEntry]:
+        """last_seen 이 last_seen_before 보다 오래된 연결 (오래된 것만 앞에서부터 확인)"""
+        entries = []
+        for entry in self._by_last_seen.values():
+            if entry.last_seen >= last_seen_before:
+                break
+            entries.append(entry)
+        return entries
+
+    async def all_connected_ids(self) -> List[str]:
+        """다른 워커에 연결된 충전소까지 포함한 id 목록"""
+        if self.router is None:
+            return self.connected_ids()
+        return await self.router.station_ids()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [entry.to_dict() for entry in self._stations.values()]
+
+    def __len__(self) -> int:
+        return len(self._stations)
+
+    async def send_command(self, charge_point_id: str, command: str, params: Optional[Dict[str, Any]] = None,
+                           timeout: float = DEFAULT_COMMAND_TIMEOUT) -> Dict[str, Any]:
+        """
+        충전소 하나에 명령을 보낸다. command 는 *_req 메서드 이름에서 _req 를 뺀 것
+        (예: "reset", "set_charging_profile"), params 는 해당 call 의 snake_case 인자.
+        """
+        entry = self._stations.get(charge_point_id)
+        if (entry is None or not entry.connected) and self.router is not None:
+            return await self.router.send_command(charge_point_id, command, params, timeout)
+        return await self.send_local_command(charge_point_id, command, params, timeout)
+
+    async def send_local_command(self, charge_point_id: str, command: str, params: Optional[Dict[str, Any]] = None,
+                                 timeout: float = DEFAULT_COMMAND_TIMEOUT) -> Dict[str, Any]:
+        entry = self._stations.get(charge_point_id)
+        if entry is None or not entry.connected:
+            return {"status": "NotConnected"}
+
+        method = getattr(entry.handler, f"{command}_req", None)
+        if method is None:
+            return {"status": "UnknownCommand"}
+
+        try:
+            response = await asyncio.wait_for(method(**(params or {})), timeout)
+        except asyncio.TimeoutError:
+            return {"status": "Timeout"}
+        except Exception as e:
+            logging.exception("%s to %s failed", command, charge_point_id)
+            return {"status": "Error", "error": str(e)}
+
+        if response is None:
+            # CallError (ocpp 라이브러리가 suppress 함)
+            return {"status": "CallError"}
+        return {"status": "Ok", "response": dataclasses.asdict(response)}
+
+    async def fan_out(self, charge_point_ids: Iterable[str], command: str, params: Optional[Dict[str, Any]] = None,
+                      timeout: float = DEFAULT_COMMAND_TIMEOUT,
+                      concurrency: int = DEFAULT_FAN_OUT_CONCURRENCY) -> Dict[str, Dict[str, Any]]:
+        """여러 충전소에 같은 명령을 동시에 보낸다 (동시 실행 수 제한, 충전소별 timeout)"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _send(charge_point_id):
+            async with semaphore:
+                return charge_point_id, await self.send_command(charge_point_id, command, params, timeout)
+
+        charge_point_ids = list(dict.fromkeys(charge_point_ids))
+        results = await asyncio.gather(*(_send(charge_point_id) for charge_point_id in charge_point_ids))
+        return dict(results)
+
+
+registry = StationRegistry()
+
+connected_stations = metrics.Gauge("ocpp_connected_stations", "Stations connected to this process",
+                                   function=registry.connected_count)
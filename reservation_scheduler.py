@@ -0,0 +1,168 @@
+"""
+예약 상태 스케줄러.
+
+    ACTIVE  --(startTime)-->          WAITING
+    WAITING --(startTime + 유예시간)--> EXPIRED
+
+앞으로 HORIZON 안에 시작하는 예약만 메모리(heap)에 올려 두고, REFRESH_INTERVAL 마다 그 구간만
+다시 읽는다 ({reservationStatus, startTime} 인덱스 범위 조회). 컬렉션 전체를 읽지 않는다.
+같은 시각에 도래한 예약들은 상태 전이별로 묶어서 update_many 한 번으로 바꾼다.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+GRACE_PERIOD = timedelta(minutes=float(os.getenv("RESERVATION_GRACE_MINUTES", "10")))
+HORIZON = timedelta(seconds=float(os.getenv("RESERVATION_SCHEDULER_HORIZON", "3600")))
+REFRESH_INTERVAL = float(os.getenv("RESERVATION_SCHEDULER_REFRESH", "60"))
+
+# 현재 상태 -> (다음 상태, startTime 기준 전이 시각)
+TRANSITIONS: Dict[str, Tuple[str, timedelta]] = {
+    "ACTIVE": ("WAITING", timedelta(0)),
+    "WAITING": ("EXPIRED", GRACE_PERIOD),
+}
+
+
+class _Entry:
+    __slots__ = ("due", "reservation_id", "id_token", "start_time", "status")
+
+    def __init__(self, due, reservation_id, id_token, start_time, status):
+        self.due = due
+        self.reservation_id = reservation_id
+        self.id_token = id_token
+        self.start_time = start_time
+        self.status = status
+
+
+class ReservationScheduler:
+    def __init__(self, on_transition: Optional[Callable[[str, str, str], None]] = None):
+        # on_transition(reservation_id, id_token, new_status): 캐시 무효화 등
+        self._on_transition = on_transition
+        self._storage = None
+        self._heap: List[Tuple[datetime, int, _Entry]] = []
+        # reservation_id -> 현재 유효한 항목 (heap 에서 지우지 않고 여기서 교체/삭제)
+        self._entries: Dict[str, _Entry] = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._loaded_until: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, reservation: Dict[str, Any]):
+        """예약 문서(_id, idToken, startTime, reservationStatus)의 다음 전이를 등록한다."""
+        reservation_id = str(reservation["_id"])
+        transition = TRANSITIONS.get(reservation["reservationStatus"])
+        if transition is None:
+            self.cancel(reservation_id)
+            return
+        due = reservation["startTime"] + transition[1]
+        if self._loaded_until is not None and due >= self._loaded_until:
+            # horizon 밖이면 다음 refresh 때 읽는다
+            self.cancel(reservation_id)
+            return
+
+        entry = _Entry(due, reservation_id, reservation.get("idToken"), reservation["startTime"],
+                       reservation["reservationStatus"])
+        current = self._entries.get(reservation_id)
+        if current is not None and current.due == entry.due and current.status == entry.status:
+            return
+        self._entries[reservation_id] = entry
+        heapq.heappush(self._heap, (due, next(self._counter), entry))
+        if self._heap[0][2] is entry:
+            self._wakeup.set()
+
+    def cancel(self, reservation_id: str):
+        self._entries.pop(reservation_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def _load(self, start_after: Optional[datetime], start_before: datetime):
+        reservations = await self._storage.find_reservation_deadlines(list(TRANSITIONS), start_after, start_before)
+        for reservation in reservations:
+            self.schedule(reservation)
+        logging.debug("Reservation scheduler loaded %d reservations (%d scheduled)", len(reservations), len(self))
+
+    async def _refresh(self):
+        now = datetime.now()
+        if self._loaded_until is None:
+            # 처음에는 이미 지난 예약까지 모두 (서버가 꺼져 있던 동안 밀린 전이)
+            start_after = None
+        else:
+            # 유예시간 안의 WAITING 예약과 그 사이에 새로 생기거나 바뀐 예약
+            start_after = now - GRACE_PERIOD
+        self._loaded_until = now + HORIZON
+        await self._load(start_after, self._loaded_until)
+
+    async def _apply_due(self):
+        now = datetime.now()
+        due: Dict[Tuple[str, str], List[_Entry]] = {}
+        while self._heap and self._heap[0][0] <= now:
+            _, _, entry = heapq.heappop(self._heap)
+            if self._entries.get(entry.reservation_id) is not entry:
+                continue  # 취소되었거나 다른 시각으로 바뀐 항목
+            del self._entries[entry.reservation_id]
+            due.setdefault((entry.status, TRANSITIONS[entry.status][0]), []).append(entry)
+
+        for (from_status, to_status), entries in due.items():
+            offset = TRANSITIONS[from_status][1]
+            try:
+                # startTime 조건: 다른 곳에서 예약 시간을 뒤로 옮긴 경우에는 바꾸지 않는다
+                moved = await self._storage.transition_reservations(
+                    [entry.reservation_id for entry in entries], from_status, to_status, now - offset)
+            except Exception:
+                logging.exception("Failed to move %d reservations %s -> %s", len(entries), from_status, to_status)
+                for entry in entries:
+                    self._entries.setdefault(entry.reservation_id, entry)
+                    heapq.heappush(self._heap, (now + timedelta(seconds=5), next(self._counter), entry))
+                continue
+            logging.info("Reservations %s -> %s: %d of %d", from_status, to_status, len(moved), len(entries))
+            moved = set(moved)
+            for entry in entries:
+                if entry.reservation_id not in moved:
+                    # 다른 곳(TransactionEvent, 다른 워커)에서 이미 상태가 바뀐 예약, 그쪽이 알린다
+                    continue
+                if self._on_transition is not None:
+                    self._on_transition(entry.reservation_id, entry.id_token, to_status)
+                # 다음 전이 (WAITING -> EXPIRED)
+                self.schedule({"_id": entry.reservation_id, "idToken": entry.id_token,
+                               "startTime": entry.start_time, "reservationStatus": to_status})
+
+    async def _run(self):
+        next_refresh = asyncio.get_running_loop().time() + REFRESH_INTERVAL
+        while True:
+            await self._apply_due()
+            loop_time = asyncio.get_running_loop().time()
+            if loop_time >= next_refresh:
+                try:
+                    await self._refresh()
+                except Exception:
+                    logging.exception("Failed to refresh reservation schedule")
+                next_refresh = loop_time + REFRESH_INTERVAL
+                continue
+
+            timeout = next_refresh - loop_time
+            if self._heap:
+                timeout = min(timeout, max(0.0, (self._heap[0][0] - datetime.now()).total_seconds()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self, storage):
+        self._storage = storage
+        await self._refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,143 @@
+"""
+워커 프로세스 간 명령 라우팅.
+
+csms.py --workers N 으로 실행하면 부모 프로세스가 Broker 를 띄우고, 각 워커는 BrokerClient 로 접속해서
+자기가 가진 충전소 id 를 등록한다. 다른 워커에 연결된 충전소로 가는 명령은 Broker 를 거쳐서
+해당 워커의 registry 에서 실행되고 결과가 돌아온다.
+
+Broker 와 워커 사이는 한 줄에 JSON 하나 (127.0.0.1 TCP).
+"""
+import asyncio
+import itertools
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+BROKER_HOST = "127.0.0.1"
+
+
+async def _write(writer: asyncio.StreamWriter, message: Dict[str, Any]):
+    writer.write(json.dumps(message, default=str).encode() + b"\n")
+    await writer.drain()
+
+
+class Broker:
+    """충전소 id -> 워커 연결 을 알고 있는 중계기 (부모 프로세스에서 실행)"""
+
+    def __init__(self):
+        self._owners: Dict[str, asyncio.StreamWriter] = {}
+        # 요청 id -> 요청한 워커 연결
+        self._pending: Dict[str, asyncio.StreamWriter] = {}
+        self._ids = itertools.count()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._on_worker, BROKER_HOST, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def _on_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                await self._handle(json.loads(line), writer)
+        except ConnectionError:
+            pass
+        finally:
+            for station_id in [s for s, w in self._owners.items() if w is writer]:
+                del self._owners[station_id]
+            for request_id in [r for r, w in self._pending.items() if w is writer]:
+                del self._pending[request_id]
+            writer.close()
+
+    async def _handle(self, message: Dict[str, Any], writer: asyncio.StreamWriter):
+        match message["type"]:
+            case "register":
+                self._owners[message["station"]] = writer
+            case "unregister":
+                if self._owners.get(message["station"]) is writer:
+                    del self._owners[message["station"]]
+            case "list":
+                await _write(writer, {"type": "result", "id": message["id"], "result": list(self._owners)})
+            case "command":
+                owner = self._owners.get(message["station"])
+                if owner is None:
+                    await _write(writer, {"type": "result", "id": message["id"], "result": {"status": "NotConnected"}})
+                    return
+                # 워커마다 요청 id 가 겹칠 수 있으므로 broker 에서 다시 번호를 매긴다
+                broker_id = f"b{next(self._ids)}"
+                self._pending[broker_id] = writer
+                await _write(owner, {**message, "id": broker_id, "reply_to": message["id"]})
+            case "result":
+                requester = self._pending.pop(message["id"], None)
+                if requester is not None:
+                    await _write(requester, {"type": "result", "id": message["reply_to"], "result": message["result"]})
+
+
+class BrokerClient:
+    """워커 쪽 Broker 연결. StationRegistry.router 로 설정해서 사용한다."""
+
+    def __init__(self, registry):
+        self._registry = registry
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._ids = itertools.count()
+        self._tasks = set()
+
+    async def connect(self, port: int):
+        reader, self._writer = await asyncio.open_connection(BROKER_HOST, port)
+        self._reader_task = asyncio.create_task(self._read_loop(reader))
+
+    def _send_nowait(self, message: Dict[str, Any]):
+        if self._writer is not None:
+            self._writer.write(json.dumps(message, default=str).encode() + b"\n")
+
+    def station_connected(self, station_id: str):
+        self._send_nowait({"type": "register", "station": station_id})
+
+    def station_disconnected(self, station_id: str):
+        self._send_nowait({"type": "unregister", "station": station_id})
+
+    async def _request(self, message: Dict[str, Any], timeout: float) -> Any:
+        if self._writer is None:
+            raise ConnectionError("not connected to the routing broker")
+        request_id = str(next(self._ids))
+        future = asyncio.get_running_loop().create_future()
+        self._futures[request_id] = future
+        try:
+            await _write(self._writer, {**message, "id": request_id})
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._futures.pop(request_id, None)
+
+    async def station_ids(self, timeout: float = 5.0) -> List[str]:
+        return await self._request({"type": "list"}, timeout)
+
+    async def send_command(self, station_id: str, command: str, params: Optional[Dict[str, Any]],
+                           timeout: float) -> Dict[str, Any]:
+        try:
+            # 원격 워커의 timeout 보다 조금 더 기다린다
+            return await self._request({"type": "command", "station": station_id, "command": command,
+                                        "params": params, "timeout": timeout}, timeout + 1)
+        except asyncio.TimeoutError:
+            return {"status": "Timeout"}
+        except ConnectionError:
+            return {"status": "NotConnected"}
+
+    async def _execute(self, message: Dict[str, Any]):
+        result = await self._registry.send_local_command(
+            message["station"], message["command"], message["params"], message["timeout"])
+        await _write(self._writer, {"type": "result", "id": message["id"], "reply_to": message["reply_to"],
+                                    "result": result})
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        while line := await reader.readline():
+            message = json.loads(line)
+            if message["type"] == "command":
+                task = asyncio.create_task(self._execute(message))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            elif message["type"] == "result":
+                future = self._futures.get(message["id"])
+                if future is not None and not future.done():
+                    future.set_result(message["result"])
+        logging.error("Lost connection to the routing broker")
+        self._writer = None
@@ -0,0 +1,179 @@
+"""
+ESP32 시리얼 링크 프레이밍.
+
+    line   줄바꿈(\\n)으로 끝나는 텍스트 한 줄 = 프레임 하나 (기존 펌웨어)
+    cobs   COBS 로 인코딩하고 0x00 으로 끝나는 바이너리 프레임, 첫 바이트가 종류
+
+COBS 프레임 종류:
+
+    0x01 ID_TOKEN    UTF-8 RFID 토큰
+    0x02 TELEMETRY   struct TELEMETRY_FORMAT (connectorId, uptime ms, 전력 W, 누적 에너지 Wh)
+    0x03 JSON        UTF-8 JSON (CSMS -> ESP32 응답은 이 형식)
+
+디코더는 구분자를 새로 받은 바이트에서만 찾고, 끝나지 않은 프레임 앞부분만 bytearray 에 모은다.
+프레임 단위로 잘라서 디코드하므로 UTF-8 문자가 두 번에 나뉘어 와도 깨지지 않는다.
+구분자 없이 MAX_FRAME_SIZE 를 넘으면 그 데이터는 버린다.
+"""
+import json
+import logging
+import struct
+from typing import Any, List, NamedTuple, Tuple
+
+MAX_FRAME_SIZE = 4096
+
+FRAME_ID_TOKEN = 0x01
+FRAME_TELEMETRY = 0x02
+FRAME_JSON = 0x03
+
+TELEMETRY_FORMAT = struct.Struct("<BIiI")
+
+
+class Telemetry(NamedTuple):
+    connector_id: int
+    uptime_ms: int
+    power_w: int
+    energy_wh: int
+
+
+class FrameError(ValueError):
+    pass
+
+
+def cobs_encode(data: bytes) -> bytes:
+    out = bytearray()
+    # 0x00 으로 나눈 조각마다 (길이 + 1) 바이트를 앞에 붙이고, 254 바이트가 넘는 조각은 0xFF 블록으로 나눈다
+    for segment in data.split(b"\x00"):
+        while len(segment) >= 254:
+            out.append(0xFF)
+            out += segment[:254]
+            segment = segment[254:]
+        out.append(len(segment) + 1)
+        out += segment
+    return bytes(out)
+
+
+def cobs_decode(data: bytes) -> bytes:
+    out = bytearray()
+    position = 0
+    while position < len(data):
+        code = data[position]
+        if code == 0:
+            raise FrameError("zero byte inside a COBS frame")
+        end = position + code
+        if end > len(data):
+            raise FrameError("truncated COBS frame")
+        out += data[position + 1:end]
+        position = end
+        if code < 0xFF and position < len(data):
+            out.append(0)
+    return bytes(out)
+
+
+class _DelimitedDecoder:
+    delimiter = b"\n"
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE):
+        # 아직 구분자를 받지 못한 프레임 앞부분
+        self._buffer = bytearray()
+        self.max_frame_size = max_frame_size
+        self.dropped = 0
+
+    def _raw_frames(self, data: bytes) -> List[bytes]:
+        # 새로 받은 바이트에서만 구분자를 찾는다 (버퍼에는 구분자가 없다)
+        if self.delimiter not in data:
+            self._buffer += data
+            self._check_size()
+            return []
+        frames = data.split(self.delimiter)
+        if self._buffer:
+            self._buffer += frames[0]
+            frames[0] = bytes(self._buffer)
+        self._buffer = bytearray(frames.pop())
+        self._check_size()
+        return frames
+
+    def _check_size(self):
+        if len(self._buffer) > self.max_frame_size:
+            logging.warning("Serial frame longer than %d bytes without a delimiter, dropping it", self.max_frame_size)
+            self.dropped += 1
+            self._buffer.clear()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+
+class LineDecoder(_DelimitedDecoder):
+    """줄 단위 텍스트 -> (FRAME_ID_TOKEN, str)"""
+
+    delimiter = b"\n"
+
+    def feed(self, data: bytes) -> List[Tuple[int, Any]]:
+        frames = []
+        for raw in self._raw_frames(data):
+            line = raw.decode("utf-8", errors="replace").strip()
+            if line:
+                frames.append((FRAME_ID_TOKEN, line))
+        return frames
+
+
+class CobsDecoder(_DelimitedDecoder):
+    """COBS 프레임 -> (종류, str | Telemetry | dict)"""
+
+    delimiter = b"\x00"
+
+    def feed(self, data: bytes) -> List[Tuple[int, Any]]:
+        frames = []
+        for raw in self._raw_frames(data):
+            if not raw:
+                continue
+            try:
+                frames.append(parse_frame(cobs_decode(raw)))
+            except (FrameError, ValueError, struct.error) as e:
+                logging.warning("Dropping malformed serial frame: %s", e)
+                self.dropped += 1
+        return frames
+
+
+def parse_frame(frame: bytes) -> Tuple[int, Any]:
+    if not frame:
+        raise FrameError("empty frame")
+    kind, body = frame[0], frame[1:]
+    if kind == FRAME_ID_TOKEN:
+        return kind, body.decode("utf-8").strip()
+    if kind == FRAME_TELEMETRY:
+        return kind, Telemetry(*TELEMETRY_FORMAT.unpack(body))
+    if kind == FRAME_JSON:
+        return kind, json.loads(body)
+    raise FrameError(f"unknown frame type 0x{kind:02x}")
+
+
+def encode_frame(kind: int, body: bytes) -> bytes:
+    return cobs_encode(bytes([kind]) + body) + b"\x00"
+
+
+def encode_telemetry(telemetry: Telemetry) -> bytes:
+    return encode_frame(FRAME_TELEMETRY, TELEMETRY_FORMAT.pack(*telemetry))
+
+
+class FramedWriter:
+    """ESP32 로 보내는 JSON 메시지를 링크의 프레이밍에 맞게 쓴다 (transport.write 와 같은 모양)"""
+
+    def __init__(self, transport, framing: str = "line"):
+        self.transport = transport
+        self.framing = framing
+
+    def write(self, data: bytes):
+        if self.framing == "cobs":
+            data = encode_frame(FRAME_JSON, data.rstrip(b"\n"))
+        self.transport.write(data)
+
+    def send_json(self, message: Any):
+        self.write(json.dumps(message).encode() + b"\n")
+
+
+def decoder(framing: str = "line"):
+    if framing == "line":
+        return LineDecoder()
+    if framing == "cobs":
+        return CobsDecoder()
+    raise ValueError(f"Unknown serial framing: {framing}")
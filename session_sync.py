@@ -0,0 +1,155 @@
+"""
+충전 세션 시작/종료 기록 (transaction, reservation, evse 를 한 단위로).
+
+트랜잭션 문서 하나에 상태와 syncAt(아직 reservation/evse 에 반영되지 않았다는 표시)을 같이 쓴다.
+이 쓰기 한 번이 기준이고, reservation/evse 갱신은 그 뒤에 동시에 보낸다.
+
+    Started  transaction 삽입 (CHARGING, syncAt)   ->  reservation ONGOING  +  evse CHARGING
+    Ended    transaction 갱신 (COMPLETED, cost, syncAt)  ->  reservation COMPLETED  +  evse AVAILABLE
+
+반영이 끝난 syncAt 은 SESSION_SYNC_INTERVAL 마다 bulk_write 한 번으로 지운다.
+중간에 프로세스가 죽거나 반영이 실패해서 SESSION_SYNC_GRACE 초 넘게 syncAt 이 남아 있는 트랜잭션은
+트랜잭션 상태대로 reservation/evse 를 다시 쓴다 (같은 값을 쓰므로 여러 번 실행되어도 같다).
+EVSE 는 저장된 lastUpdated 가 syncAt 보다 이전일 때만 다시 쓴다 (그 뒤에 기록된 상태를 되돌리지 않도록).
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from station_state import StationStateCache
+
+SESSION_SYNC_INTERVAL = float(os.getenv("SESSION_SYNC_INTERVAL", "5"))  # 초
+SESSION_SYNC_GRACE = timedelta(seconds=float(os.getenv("SESSION_SYNC_GRACE", "30")))
+
+# transactionStatus -> (reservationStatus, evseStatus)
+SYNC_TARGETS: Dict[str, Tuple[str, str]] = {
+    "CHARGING": ("ONGOING", "CHARGING"),
+    "COMPLETED": ("COMPLETED", "AVAILABLE"),
+}
+
+# (reservationId, syncAt)
+SyncKey = Tuple[str, datetime]
+
+
+class SessionSync:
+    def __init__(self, station_state: Optional[StationStateCache] = None, interval: float = SESSION_SYNC_INTERVAL,
+                 grace: timedelta = SESSION_SYNC_GRACE):
+        # 바뀌지 않는 EVSE 상태 쓰기를 건너뛰는 데 사용
+        self._station_state = station_state
+        self.interval = interval
+        self.grace = grace
+        self._storage = None
+        # 반영이 끝나서 syncAt 을 지울 트랜잭션
+        self._synced: List[SyncKey] = []
+        self._recover = False
+        self._last_sync_at = datetime.min
+        self._task: Optional[asyncio.Task] = None
+
+    def _sync_time(self) -> datetime:
+        # MongoDB 는 밀리초까지 저장하므로 밀리초로 맞추고, 같은 밀리초에 Started/Ended 가 와도 구분되게 늘린다
+        now = datetime.now()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        self._last_sync_at = max(now, self._last_sync_at + timedelta(milliseconds=1))
+        return self._last_sync_at
+
+    async def _apply(self, reservation_id: str, evse_id: str, transaction_status: str, sync_at: datetime,
+                     force: bool = False) -> bool:
+        """force: 캐시와 같아도 EVSE 상태를 쓴다, 단 sync_at 보다 나중에 기록된 상태는 덮어쓰지 않는다 (reconcile)"""
+        reservation_status, evse_status = SYNC_TARGETS[transaction_status]
+        writes = [self._storage.set_reservation_status(reservation_id, reservation_status)]
+        if force:
+            writes.append(self._set_evse_if_older(evse_id, evse_status, sync_at))
+        elif self._station_state is None or self._station_state.evse_changed(evse_id, evse_status):
+            writes.append(self._storage.set_evse_status(evse_id, evse_status))
+        try:
+            await asyncio.gather(*writes)
+        except Exception:
+            logging.exception("Failed to sync reservation/evse for %s, retrying in the background", reservation_id)
+            return False
+        self._synced.append((reservation_id, sync_at))
+        return True
+
+    async def _set_evse_if_older(self, evse_id: str, status: str, sync_at: datetime):
+        # 다른 워커나 status_buffer 가 그 뒤에 쓴 상태(StatusNotification, 연결/종료)가 남는다
+        written = await self._storage.set_evse_status(evse_id, status, updated_at=sync_at)
+        if self._station_state is not None:
+            if written:
+                self._station_state.evse_changed(evse_id, status)
+            else:
+                self._station_state.forget_evse(evse_id)
+
+    async def started(self, transaction: Dict[str, Any]):
+        """트랜잭션 문서(reservationId, evseId, transactionStatus=CHARGING)를 넣고 예약/EVSE 에 반영한다."""
+        sync_at = self._sync_time()
+        if not await self._storage.insert_transaction(dict(transaction, syncAt=sync_at)):
+            # 재전송된 Started (처음 삽입한 쪽의 syncAt 으로 반영된다)
+            logging.info("Transaction %s already recorded", transaction.get("transactionId"))
+            return
+        await self._apply(str(transaction["reservationId"]), transaction["evseId"],
+                          transaction["transactionStatus"], sync_at)
+
+    async def ended(self, reservation_id: str, evse_id: str, costs: Optional[Tuple[int, int]] = None):
+        """트랜잭션을 COMPLETED 로 (costs 가 있으면 cost/energyWh 도 같이) 바꾸고 예약/EVSE 에 반영한다."""
+        sync_at = self._sync_time()
+        await self._storage.end_transaction(reservation_id, "COMPLETED", costs, sync_at)
+        await self._apply(reservation_id, evse_id, "COMPLETED", sync_at)
+
+    async def flush(self):
+        """반영이 끝난 트랜잭션의 syncAt 을 지운다."""
+        if not self._synced:
+            return
+        synced, self._synced = self._synced, []
+        try:
+            await self._storage.clear_transaction_sync(synced)
+        except Exception:
+            logging.exception("Failed to clear %d transaction sync markers", len(synced))
+            self._synced.extend(synced)
+
+    async def reconcile(self) -> int:
+        """SESSION_SYNC_GRACE 넘게 반영되지 않은 트랜잭션을 다시 반영하고 그 수를 반환한다."""
+        pending = await self._storage.find_unsynced_transactions(datetime.now() - self.grace)
+        # 같은 EVSE 는 나중 상태가 남도록 syncAt 순서로
+        pending.sort(key=lambda transaction: transaction["syncAt"])
+        repaired = 0
+        for transaction in pending:
+            if transaction["transactionStatus"] not in SYNC_TARGETS:
+                continue
+            if await self._apply(str(transaction["reservationId"]), transaction["evseId"],
+                                 transaction["transactionStatus"], transaction["syncAt"], force=True):
+                repaired += 1
+        if repaired:
+            logging.warning("Repaired %d transactions left unsynced", repaired)
+        return repaired
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                if self._recover:
+                    await self.reconcile()
+                await self.flush()
+            except Exception:
+                logging.exception("Session sync failed")
+
+    async def start(self, storage, recover: bool = True):
+        """recover: 남아 있는 syncAt 을 찾아서 반영 (여러 워커 중 한 곳에서만)"""
+        self._storage = storage
+        self._recover = recover
+        if recover:
+            await self.reconcile()
+            await self.flush()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._storage is not None:
+            await self.flush()
@@ -0,0 +1,266 @@
+"""
+사이트 전력 배분 (load management).
+
+충전 중인 세션들의 충전 프로파일(CompiledProfile)을 ALLOCATION_SLOT_SECONDS 단위 시간 슬롯으로 펼쳐
+[세션 x 슬롯] 요청 전력 행렬을 만들고, 슬롯마다 사이트 용량을 넘으면 max-min 공평하게(water-filling) 줄인다.
+
+    1. useESS 구간의 요청은 먼저 ESS 예산(SITE_ESS_BUDGET_W)에서 배분
+    2. 나머지 요청을 계통 용량(SITE_CAPACITY_W)에서 배분
+
+모든 계산은 NumPy 행렬 연산 (세션 수백 개 x 하루치 슬롯도 수 ms).
+줄어든 세션에는 set_charging_profile 로 새 TxProfile 을 보내고, 다시 여유가 생기면 원래 프로파일을 보낸다.
+
+배분은 프로세스 안의 세션만 대상으로 한다 (--workers 를 쓰면 워커마다 SITE_CAPACITY_W 를 나눠서 설정).
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import metrics
+from charging_profile import CompiledProfile
+from registry import registry
+
+SITE_CAPACITY_W = float(os.getenv("SITE_CAPACITY_W", "0"))  # 0 이면 배분하지 않음
+SITE_ESS_BUDGET_W = float(os.getenv("SITE_ESS_BUDGET_W", "0"))
+ALLOCATION_SLOT_SECONDS = float(os.getenv("ALLOCATION_SLOT_SECONDS", "60"))
+ALLOCATION_HORIZON_SECONDS = float(os.getenv("ALLOCATION_HORIZON_SECONDS", str(24 * 3600)))
+# 슬롯이 지나가므로 세션 변화가 없어도 주기적으로 다시 계산
+ALLOCATION_INTERVAL = float(os.getenv("ALLOCATION_INTERVAL", "60"))
+# 세션 시작/종료가 몰릴 때 한 번에 계산
+ALLOCATION_DEBOUNCE = 0.2
+
+allocation_seconds = metrics.Histogram("site_allocation_seconds", "Time to recompute the site power allocation",
+                                       buckets=(0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0))
+limited_sessions = metrics.Gauge("site_limited_sessions", "Sessions currently limited below their charging profile")
+
+
+@dataclass
+class Session:
+    reservation_id: str
+    station_id: str
+    evse_id: int
+    transaction_id: str
+    started_at: float  # epoch 초
+    profile: CompiledProfile
+    # 구간 시작 시각과 그때의 limit / useESS 변화량 (앞 구간 대비), 배분할 때마다 다시 만들지 않도록
+    starts: np.ndarray = field(init=False, repr=False)
+    steps: np.ndarray = field(init=False, repr=False)
+    ess_steps: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self):
+        limits = np.asarray(self.profile.limits, dtype=float)
+        use_ess = np.asarray(self.profile.use_ess, dtype=np.int64)
+        self.starts = np.asarray(self.profile.start_periods, dtype=float) + self.started_at
+        self.steps = np.diff(limits, prepend=0.0)
+        self.ess_steps = np.diff(use_ess, prepend=0)
+
+
+@dataclass
+class Allocation:
+    slot_starts: np.ndarray  # [T] epoch 초
+    requested: np.ndarray    # [n, T] W
+    allocated: np.ndarray    # [n, T] W
+
+    def limited(self) -> np.ndarray:
+        """[n] 요청보다 적게 배분된 슬롯이 있는 세션"""
+        return (self.allocated < self.requested - 1e-6).any(axis=1)
+
+
+def requested_limits(sessions: Sequence[Session], times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """각 세션의 times(오름차순) 시각 limit 와 useESS 여부 ([n, T]). 시작 전은 0."""
+    rows = np.repeat(np.arange(len(sessions)), [len(session.starts) for session in sessions])
+    starts = np.concatenate([session.starts for session in sessions])
+    steps = np.concatenate([session.steps for session in sessions])
+    ess_steps = np.concatenate([session.ess_steps for session in sessions])
+
+    # 변화량을 해당 시각 이후 첫 슬롯에 더하고 누적합 -> 슬롯별 값 (세션 x 슬롯 한 번만 훑음)
+    shape = (len(sessions), len(times) + 1)
+    position = np.searchsorted(times, starts, side="left")
+    limits = np.zeros(shape)
+    np.add.at(limits, (rows, position), steps)
+    ess = np.zeros(shape, dtype=np.int64)
+    np.add.at(ess, (rows, position), ess_steps)
+    return np.cumsum(limits[:, :-1], axis=1), np.cumsum(ess[:, :-1], axis=1) > 0
+
+
+def waterfill(demand: np.ndarray, capacity: float) -> np.ndarray:
+    """
+    슬롯(열)마다 합이 capacity 를 넘으면 max-min 공평 배분: min(demand, level),
+    level 은 합이 capacity 가 되는 값.
+    """
+    allocated = demand.copy()
+    over = demand.sum(axis=0) > capacity
+    if not over.any():
+        return allocated
+    n = demand.shape[0]
+    columns = demand[:, over]
+    ordered = np.sort(columns, axis=0)
+    cumulative = np.cumsum(ordered, axis=0)
+    k = np.arange(n)[:, None]
+    # level 을 k 번째로 작은 요청으로 잡았을 때의 배분 합
+    filled = cumulative + ordered * (n - k - 1)
+    first = np.argmax(filled >= capacity, axis=0)
+    below = np.where(first > 0, np.take_along_axis(cumulative, np.maximum(first - 1, 0)[None, :], axis=0)[0], 0.0)
+    level = (capacity - below) / (n - first)
+    allocated[:, over] = np.minimum(columns, level)
+    return allocated
+
+
+def allocate(sessions: Sequence[Session], capacity: float, ess_budget: float, now: float,
+             slot_seconds: float = ALLOCATION_SLOT_SECONDS,
+             horizon: float = ALLOCATION_HORIZON_SECONDS) -> Allocation:
+    ends = [session.started_at + session.profile.duration for session in sessions
+            if session.profile.duration is not None]
+    last = now + horizon
+    if len(ends) == len(sessions):
+        last = min(last, max(ends))
+    slots = max(1, int(np.ceil((last - now) / slot_seconds)))
+    slot_starts = now + np.arange(slots) * slot_seconds
+
+    # 슬롯 중간에 limit 가 바뀌면 큰 쪽 기준
+    at_start, ess_at_start = requested_limits(sessions, slot_starts)
+    at_end, ess_at_end = requested_limits(sessions, slot_starts + slot_seconds - 1e-3)
+    requested = np.maximum(at_start, at_end)
+    use_ess = ess_at_start | ess_at_end
+
+    from_ess = waterfill(np.where(use_ess, requested, 0.0), ess_budget)
+    from_grid = waterfill(requested - from_ess, capacity)
+    return Allocation(slot_starts, requested, from_ess + from_grid)
+
+
+def _periods(slot_starts: np.ndarray, limits: np.ndarray, start: float) -> List[Dict[str, Any]]:
+    """슬롯별 limit -> start 기준 chargingSchedulePeriod (같은 값이 이어지면 합친다)"""
+    changes = np.flatnonzero(np.r_[True, np.abs(np.diff(limits)) > 1e-6])
+    return [{"start_period": int(round(slot_starts[i] - start)), "limit": round(float(limits[i]), 1)}
+            for i in changes]
+
+
+class SiteAllocator:
+    def __init__(self, capacity: float = SITE_CAPACITY_W, ess_budget: float = SITE_ESS_BUDGET_W):
+        self.capacity = capacity
+        self.ess_budget = ess_budget
+        self._sessions: Dict[str, Session] = {}
+        # reservationId -> 마지막으로 보낸 chargingSchedulePeriod (같은 내용은 다시 보내지 않음)
+        self._pushed: Dict[str, List[Dict[str, Any]]] = {}
+        self._profile_ids = itertools.count(1)
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def add(self, session: Session):
+        if self.enabled:
+            self._sessions[session.reservation_id] = session
+            self._changed.set()
+
+    def remove(self, reservation_id: str):
+        if self._sessions.pop(reservation_id, None) is not None:
+            self._pushed.pop(reservation_id, None)
+            self._changed.set()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def compute(self, now: Optional[float] = None) -> Tuple[List[Session], Optional[Allocation]]:
+        sessions = list(self._sessions.values())
+        if not sessions:
+            return sessions, None
+        started = time.perf_counter()
+        allocation = allocate(sessions, self.capacity, self.ess_budget, now if now is not None else time.time())
+        allocation_seconds.observe(time.perf_counter() - started)
+        return sessions, allocation
+
+    def _profile_request(self, session: Session, periods: List[Dict[str, Any]], start: float) -> Dict[str, Any]:
+        return {
+            "evse_id": session.evse_id,
+            "charging_profile": {
+                "id": next(self._profile_ids),
+                "stack_level": 1,
+                "charging_profile_purpose": "TxProfile",
+                "charging_profile_kind": "Absolute",
+                "transaction_id": session.transaction_id,
+                "charging_schedule": [{
+                    "id": 1,
+                    "start_schedule": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+                    "charging_rate_unit": "W",
+                    "charging_schedule_period": periods,
+                }],
+            },
+        }
+
+    async def recompute(self):
+        sessions, allocation = self.compute()
+        if allocation is None:
+            limited_sessions.set(0)
+            return
+        limited = allocation.limited()
+        limited_sessions.set(int(limited.sum()))
+
+        requests = []
+        start = float(allocation.slot_starts[0])
+        for i, session in enumerate(sessions):
+            if limited[i]:
+                periods = _periods(allocation.slot_starts, allocation.allocated[i], start)
+                schedule_start = start
+            elif session.reservation_id in self._pushed:
+                # 제한이 풀림: 원래 프로파일로
+                periods = [{"start_period": start_period, "limit": limit} for start_period, limit
+                           in zip(session.profile.start_periods, session.profile.limits)]
+                schedule_start = session.started_at
+            else:
+                continue
+            if self._pushed.get(session.reservation_id) == periods:
+                continue
+            if limited[i]:
+                self._pushed[session.reservation_id] = periods
+            else:
+                self._pushed.pop(session.reservation_id, None)
+            requests.append((session, self._profile_request(session, periods, schedule_start)))
+
+        if requests:
+            logging.info("Site over capacity: sending charging profiles to %d sessions (%d limited)",
+                         len(requests), int(limited.sum()))
+            results = await asyncio.gather(*(
+                registry.send_command(session.station_id, "set_charging_profile", params)
+                for session, params in requests))
+            for (session, _), result in zip(requests, results):
+                if result["status"] != "Ok":
+                    logging.warning("SetChargingProfile to %s (evse %s) failed: %s",
+                                    session.station_id, session.evse_id, result["status"])
+                    # 다음 계산 때 다시 보낸다 (빈 값은 어떤 결과와도 다르고, 제한이 풀린 경우에도 남아 있음)
+                    self._pushed[session.reservation_id] = []
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), ALLOCATION_INTERVAL)
+                await asyncio.sleep(ALLOCATION_DEBOUNCE)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            try:
+                await self.recompute()
+            except Exception:
+                logging.exception("Site allocation failed")
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
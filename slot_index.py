@@ -0,0 +1,244 @@
+"""
+예약 슬롯 인덱스 (EVSE 별 예약 구간).
+
+EVSE 마다 예약 구간을 startTime 순 배열로 들고 있고, 앞에서부터의 endTime 최댓값(prefix max)을
+같이 둔다. 그래서 "이 구간이 비어 있나", "다음 빈 슬롯" 은 bisect 한 번 + 겹치는 구간만 확인한다.
+
+    ACTIVE / WAITING / ONGOING   슬롯을 차지함
+    COMPLETED / EXPIRED / CANCELLED   슬롯을 비움
+
+시작할 때 DB 에서 끝나지 않은 예약을 읽어서 만들고, CSMS 안에서 일어나는 상태 변화는 바로 반영한다.
+다른 곳(예약 프론트엔드 등)에서 바꾼 예약은 SLOT_INDEX_REFRESH 초마다 다시 읽어서 맞춘다.
+"""
+import asyncio
+import logging
+import os
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+OCCUPYING_STATUSES = ("ACTIVE", "WAITING", "ONGOING")
+SLOT_INDEX_REFRESH = float(os.getenv("SLOT_INDEX_REFRESH", "300"))
+
+
+class SlotConflict(ValueError):
+    def __init__(self, reservation_id: str):
+        super().__init__(f"slot conflicts with reservation {reservation_id}")
+        self.reservation_id = reservation_id
+
+
+class _EvseSlots:
+    """한 EVSE 의 예약 구간 (startTime 순)"""
+    __slots__ = ("starts", "ends", "ids", "max_ends")
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+        self.ids: List[str] = []
+        # max_ends[i] = max(ends[:i + 1]), 기존 데이터에 겹치는 예약이 있어도 맞게 동작하도록
+        self.max_ends: List[datetime] = []
+
+    def _update_max_ends(self, position: int):
+        for i in range(position, len(self.ends)):
+            previous = self.max_ends[i - 1] if i else self.ends[i]
+            self.max_ends[i] = max(previous, self.ends[i])
+
+    @classmethod
+    def build(cls, entries: List[Tuple[datetime, datetime, str]]) -> "_EvseSlots":
+        """startTime 순으로 정렬된 (startTime, endTime, reservationId) 로 한 번에 만든다 (add 를 반복하면 O(n²))"""
+        slots = cls()
+        slots.starts = [start for start, _, _ in entries]
+        slots.ends = [end for _, end, _ in entries]
+        slots.ids = [reservation_id for _, _, reservation_id in entries]
+        slots.max_ends = list(accumulate(slots.ends, max))
+        return slots
+
+    def add(self, reservation_id: str, start: datetime, end: datetime):
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.ids.insert(position, reservation_id)
+        self.max_ends.insert(position, end)
+        self._update_max_ends(position)
+
+    def remove(self, reservation_id: str, start: datetime):
+        position = bisect_left(self.starts, start)
+        while self.ids[position] != reservation_id:
+            position += 1
+        for values in (self.starts, self.ends, self.ids, self.max_ends):
+            del values[position]
+        self._update_max_ends(position)
+
+    def conflict(self, start: datetime, end: datetime) -> Optional[str]:
+        """[start, end) 와 겹치는 예약 id"""
+        position = bisect_left(self.starts, end)  # [0, position) 은 end 전에 시작
+        if position == 0 or self.max_ends[position - 1] <= start:
+            return None
+        for i in range(position - 1, -1, -1):
+            if self.ends[i] > start:
+                return self.ids[i]
+        return None
+
+    def next_free(self, after: datetime, duration: timedelta) -> datetime:
+        candidate = after
+        position = bisect_right(self.starts, candidate)
+        if position and self.max_ends[position - 1] > candidate:
+            candidate = self.max_ends[position - 1]
+        while position < len(self.starts) and self.starts[position] < candidate + duration:
+            candidate = max(candidate, self.ends[position])
+            position += 1
+        return candidate
+
+    def busy(self, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        """[start, end) 안에서 예약된 구간 (겹치는 예약은 합쳐서)"""
+        merged: List[Tuple[datetime, datetime]] = []
+        position = bisect_right(self.starts, start)
+        # start 이전에 시작해서 start 이후까지 이어지는 예약
+        if position and self.max_ends[position - 1] > start:
+            merged.append((start, min(self.max_ends[position - 1], end)))
+        while position < len(self.starts) and self.starts[position] < end:
+            busy_start, busy_end = max(self.starts[position], start), min(self.ends[position], end)
+            if merged and busy_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], busy_end))
+            elif busy_end > busy_start:
+                merged.append((busy_start, busy_end))
+            position += 1
+        return merged
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+
+class SlotIndex:
+    def __init__(self):
+        self._evses: Dict[str, _EvseSlots] = {}
+        # reservationId -> (evseId, startTime)
+        self._reservations: Dict[str, Tuple[str, datetime]] = {}
+        self._station_evses: Dict[str, Set[str]] = {}
+        self._storage = None
+        self._task: Optional[asyncio.Task] = None
+        # load() 가 DB 를 읽는 동안 들어온 변경 (다시 만든 인덱스에 이어서 반영)
+        self._changes_during_load: Optional[List[Tuple[str, Any]]] = None
+
+    def add(self, reservation: Dict[str, Any]):
+        """예약 문서(_id, stationId, evseId, startTime, endTime, reservationStatus)를 반영한다."""
+        if self._changes_during_load is not None:
+            self._changes_during_load.append(("add", reservation))
+        reservation_id = str(reservation["_id"])
+        self._remove(reservation_id)
+        if reservation.get("reservationStatus", "ACTIVE") not in OCCUPYING_STATUSES:
+            return
+        evse_id = reservation["evseId"]
+        self._evses.setdefault(evse_id, _EvseSlots()).add(reservation_id, reservation["startTime"], reservation["endTime"])
+        self._reservations[reservation_id] = (evse_id, reservation["startTime"])
+        self._station_evses.setdefault(reservation["stationId"], set()).add(evse_id)
+
+    def remove(self, reservation_id: str):
+        if self._changes_during_load is not None:
+            self._changes_during_load.append(("remove", reservation_id))
+        self._remove(reservation_id)
+
+    def _remove(self, reservation_id: str):
+        entry = self._reservations.pop(reservation_id, None)
+        if entry is not None:
+            self._evses[entry[0]].remove(reservation_id, entry[1])
+
+    def update_status(self, reservation_id: str, status: str):
+        if status not in OCCUPYING_STATUSES:
+            self.remove(reservation_id)
+
+    def __len__(self) -> int:
+        return len(self._reservations)
+
+    # 조회
+    def conflict(self, evse_id: str, start: datetime, end: datetime) -> Optional[str]:
+        """[start, end) 와 겹치는 예약 id (없으면 None)"""
+        slots = self._evses.get(evse_id)
+        return slots.conflict(start, end) if slots is not None else None
+
+    def is_free(self, evse_id: str, start: datetime, end: datetime) -> bool:
+        return self.conflict(evse_id, start, end) is None
+
+    def next_free(self, evse_id: str, after: datetime, duration: timedelta) -> datetime:
+        """after 이후 duration 동안 비어 있는 가장 이른 시작 시각"""
+        slots = self._evses.get(evse_id)
+        return slots.next_free(after, duration) if slots is not None else after
+
+    def station_capacity(self, station_id: str, start: datetime, hours: int,
+                         evse_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        start 부터 1시간 단위로 충전소 전체 EVSE 의 비어 있는 분(minute).
+        evse_ids 를 주지 않으면 예약이 있었던 EVSE 만 센다.
+        """
+        evse_ids = sorted(set(evse_ids or ()) | self._station_evses.get(station_id, set()))
+        end = start + timedelta(hours=hours)
+        busy_seconds = [0.0] * hours
+        for evse_id in evse_ids:
+            slots = self._evses.get(evse_id)
+            if slots is None:
+                continue
+            for busy_start, busy_end in slots.busy(start, end):
+                hour = int((busy_start - start).total_seconds() // 3600)
+                while hour < hours and busy_start < busy_end:
+                    hour_end = start + timedelta(hours=hour + 1)
+                    busy_seconds[hour] += (min(busy_end, hour_end) - busy_start).total_seconds()
+                    busy_start = hour_end
+                    hour += 1
+        total = len(evse_ids) * 3600
+        return [{
+            "hour": start + timedelta(hours=hour),
+            "evses": len(evse_ids),
+            "freeMinutes": round((total - busy_seconds[hour]) / 60, 1),
+            "freeRatio": round(1 - busy_seconds[hour] / total, 3) if total else 0.0,
+        } for hour in range(hours)]
+
+    # DB 동기화
+    async def load(self):
+        self._changes_during_load = []
+        try:
+            reservations = await self._storage.find_open_reservations(list(OCCUPYING_STATUSES), datetime.now())
+        except BaseException:
+            self._changes_during_load = None
+            raise
+        changes, self._changes_during_load = self._changes_during_load, None
+        # 다시 읽은 예약으로 인덱스를 통째로 바꾼다 (DB 에서 사라진 예약, EVSE 는 남지 않는다)
+        by_evse: Dict[str, List[Tuple[datetime, datetime, str]]] = {}
+        self._reservations = {}
+        self._station_evses = {}
+        for reservation in sorted(reservations, key=lambda reservation: reservation["startTime"]):
+            if reservation.get("reservationStatus", "ACTIVE") not in OCCUPYING_STATUSES:
+                continue
+            reservation_id, evse_id = str(reservation["_id"]), reservation["evseId"]
+            by_evse.setdefault(evse_id, []).append((reservation["startTime"], reservation["endTime"], reservation_id))
+            self._reservations[reservation_id] = (evse_id, reservation["startTime"])
+            self._station_evses.setdefault(reservation["stationId"], set()).add(evse_id)
+        self._evses = {evse_id: _EvseSlots.build(entries) for evse_id, entries in by_evse.items()}
+        for change, value in changes:
+            if change == "add":
+                self.add(value)
+            else:
+                self.remove(value)
+        logging.info("Slot index loaded %d reservations on %d EVSEs", len(self._reservations), len(self._evses))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(SLOT_INDEX_REFRESH)
+            try:
+                await self.load()
+            except Exception:
+                logging.exception("Failed to reload slot index")
+
+    async def start(self, storage):
+        self._storage = storage
+        await self.load()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,84 @@
+"""
+충전소/EVSE 상태 캐시 (DB 에 기록된, 또는 기록하려고 버퍼에 넣은 evseStatus).
+
+시작할 때 evse 컬렉션에서 읽어 두고, 상태를 쓰기 전에 비교해서 바뀐 것만 기록한다.
+BootNotification 이 반복되거나 이미 OFFLINE 인 충전소를 다시 OFFLINE 으로 바꾸는 것처럼
+아무것도 바뀌지 않는 쓰기는 건너뛰고 evse_writes_skipped_total 로 센다.
+
+충전소 상태는 그 충전소가 연결된 프로세스만 쓴다. 워커가 여러 개이면 충전소가 다른 워커에 붙어 있던
+사이에 캐시가 틀릴 수 있으므로, 새 연결이 들어오면 그 충전소 항목을 지운다 (forget).
+캐시를 다시 읽지 않는 이유: 버퍼에 남아 있는 쓰기보다 오래된 DB 값으로 덮어쓰면 필요한 쓰기를 건너뛰게 된다.
+"""
+import logging
+from typing import Dict, Optional
+
+import metrics
+
+writes = metrics.Counter("evse_writes_total", "EVSE status writes sent to storage", ["kind"])
+writes_skipped = metrics.Counter("evse_writes_skipped_total",
+                                 "EVSE status writes skipped because nothing changed", ["kind"])
+
+
+class StationStateCache:
+    def __init__(self):
+        # stationId -> evseId -> evseStatus (None 이면 모름)
+        self._evses: Dict[str, Dict[str, Optional[str]]] = {}
+        # evseId -> stationId
+        self._stations: Dict[str, str] = {}
+        # EVSE 문서를 모르는 충전소에 마지막으로 쓴 충전소 단위 상태
+        self._station_status: Dict[str, str] = {}
+
+    def station_changed(self, station_id: str, status: str) -> bool:
+        """충전소의 모든 EVSE 를 status 로 바꾸는 쓰기가 필요하면 True (캐시는 status 로 바뀜)"""
+        evses = self._evses.get(station_id)
+        if evses:
+            changed = any(evse_status != status for evse_status in evses.values())
+            for evse_id in evses:
+                evses[evse_id] = status
+        else:
+            changed = self._station_status.get(station_id) != status
+            self._station_status[station_id] = status
+        (writes if changed else writes_skipped).inc("station")
+        return changed
+
+    def evse_changed(self, evse_id: str, status: str) -> bool:
+        """EVSE 하나의 상태 쓰기가 필요하면 True (캐시는 status 로 바뀜)"""
+        station_id = self._stations.get(evse_id)
+        if station_id is None:
+            writes.inc("evse")
+            return True
+        evses = self._evses[station_id]
+        changed = evses[evse_id] != status
+        evses[evse_id] = status
+        (writes if changed else writes_skipped).inc("evse")
+        return changed
+
+    def forget(self, station_id: str):
+        """상태를 모르는 것으로 (다음 쓰기는 건너뛰지 않는다)"""
+        self._station_status.pop(station_id, None)
+        evses = self._evses.get(station_id, {})
+        for evse_id in evses:
+            evses[evse_id] = None
+
+    def forget_evse(self, evse_id: str):
+        """EVSE 하나의 상태를 모르는 것으로"""
+        station_id = self._stations.get(evse_id)
+        if station_id is not None:
+            self._evses[station_id][evse_id] = None
+
+    def status(self, evse_id: str) -> Optional[str]:
+        station_id = self._stations.get(evse_id)
+        return self._evses[station_id][evse_id] if station_id is not None else None
+
+    def __len__(self) -> int:
+        return len(self._stations)
+
+    async def load(self, storage):
+        evses = await storage.find_evse_statuses()
+        self._evses.clear()
+        self._stations.clear()
+        self._station_status.clear()
+        for evse in evses:
+            self._evses.setdefault(evse["stationId"], {})[evse["evseId"]] = evse.get("evseStatus")
+            self._stations[evse["evseId"]] = evse["stationId"]
+        logging.info("Station state cache loaded %d EVSEs of %d stations", len(self._stations), len(self._evses))
@@ -0,0 +1,427 @@
+import abc
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, MongoClient, UpdateMany, UpdateOne
+from pymongo.errors import CollectionInvalid, DuplicateKeyError, OperationFailure
+
+import indexes
+import meter_values
+import metrics
+from meter_values import MeterSample
+
+# pymongo 호출을 이벤트 루프 밖에서 실행하기 위한 스레드 수 (0이면 루프에서 바로 실행)
+DEFAULT_MAX_WORKERS = int(os.getenv("MONGO_EXECUTOR_WORKERS", "16"))
+# mongo | memory
+DEFAULT_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+DATABASE_NAME = "charge-set"
+
+
+class Storage(abc.ABC):
+    """
+    ChargePointHandler 가 사용하는 저장소 인터페이스 (예약, 충전 프로파일, 트랜잭션, EVSE).
+    문서 형식은 MongoDB 컬렉션의 문서와 같다.
+    """
+
+    def close(self):
+        pass
+
+    # 인덱스
+    async def ensure_indexes(self):
+        pass
+
+    async def check_query_plans(self) -> List[str]:
+        """인덱스를 사용하지 않는 조회 목록"""
+        return []
+
+    # evse
+    @abc.abstractmethod
+    async def insert_evses(self, evses: List[Dict[str, Any]]):
+        ...
+
+    @abc.abstractmethod
+    async def set_stations_evse_status(self, updates: Dict[str, str]):
+        """stationId -> evseStatus"""
+
+    @abc.abstractmethod
+    async def set_evse_status(self, evse_id: str, status: str, updated_at: Optional[datetime] = None) -> bool:
+        """
+        updated_at 이 없으면 바로 쓴다 (lastUpdated 는 지금).
+        있으면 저장된 lastUpdated 가 그보다 이전일 때만 쓰고 lastUpdated 를 updated_at 으로. 썼으면 True.
+        """
+
+    @abc.abstractmethod
+    async def find_evse_statuses(self) -> List[Dict[str, Any]]:
+        """모든 EVSE 의 stationId, evseId, evseStatus"""
+
+    # reservation
+    @abc.abstractmethod
+    async def insert_reservations(self, reservations: List[Dict[str, Any]]) -> List[ObjectId]:
+        ...
+
+    @abc.abstractmethod
+    async def find_authorization(self, id_token: str) -> Optional[Dict[str, Any]]:
+        """idToken 의 ACTIVE/WAITING 예약 + chargingSchedules (충전 프로파일이 없으면 None)"""
+
+    @abc.abstractmethod
+    async def set_reservation_status(self, reservation_id: str, status: str):
+        ...
+
+    @abc.abstractmethod
+    async def find_reservation_deadlines(self, statuses: List[str], start_after: Optional[datetime],
+                                         start_before: datetime) -> List[Dict[str, Any]]:
+        """startTime 이 [start_after, start_before) 인 예약의 _id, idToken, startTime, reservationStatus"""
+
+    @abc.abstractmethod
+    async def transition_reservations(self, reservation_ids: List[str], from_status: str, to_status: str,
+                                      start_before: datetime) -> List[str]:
+        """from_status 이고 startTime <= start_before 인 예약만 to_status 로 바꾸고 바뀐 예약 id 를 반환"""
+
+    @abc.abstractmethod
+    async def find_open_reservations(self, statuses: List[str], end_after: datetime) -> List[Dict[str, Any]]:
+        """endTime 이 end_after 이후인 예약의 _id, stationId, evseId, startTime, endTime, reservationStatus"""
+
+    # chargingProfile
+    @abc.abstractmethod
+    async def insert_charging_profiles(self, charging_profiles: List[Dict[str, Any]]):
+        ...
+
+    # transaction
+    @abc.abstractmethod
+    async def insert_transaction(self, transaction: Dict[str, Any]) -> bool:
+        """같은 reservationId, transactionId 의 트랜잭션이 이미 있으면 넣지 않고 False"""
+
+    @abc.abstractmethod
+    async def end_transaction(self, reservation_id: str, status: str, costs: Optional[Tuple[int, int]],
+                              sync_at: datetime):
+        """transactionStatus, syncAt 과 (costs 가 있으면) cost, energyWh 를 한 번에 기록"""
+
+    @abc.abstractmethod
+    async def find_unsynced_transactions(self, sync_before: datetime) -> List[Dict[str, Any]]:
+        """syncAt 이 sync_before 이전인 트랜잭션의 reservationId, evseId, transactionStatus, syncAt"""
+
+    @abc.abstractmethod
+    async def clear_transaction_sync(self, keys: List[Tuple[str, datetime]]):
+        """(reservationId, syncAt) 이 그대로인 트랜잭션의 syncAt 을 지운다"""
+
+    @abc.abstractmethod
+    async def update_transaction_costs(self, updates: Dict[str, Tuple[int, int]]):
+        """reservationId -> (cost, energyWh)"""
+
+    # meterValue
+    @abc.abstractmethod
+    async def insert_meter_samples(self, samples: List[MeterSample]):
+        ...
+
+    @abc.abstractmethod
+    async def find_meter_curve(self, reservation_id: str, resolution: float,
+                               start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """resolution 초 단위로 다운샘플링한 [start, end] 구간의 ts, energyWh, cost, powerW"""
+
+
+def create_storage(backend: Optional[str] = None) -> Storage:
+    """설정(backend 또는 STORAGE_BACKEND)에 맞는 저장소를 만든다. MongoDB 연결은 이때 만들어진다."""
+    backend = backend or DEFAULT_BACKEND
+    if backend == "memory":
+        from memory_storage import MemoryStorage
+        return MemoryStorage()
+    if backend == "mongo":
+        client = MongoClient(os.getenv("MONGODB_URI"))
+        return MongoStorage(client[DATABASE_NAME])
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+class MongoStorage(Storage):
+    """
+    ChargePointHandler 가 사용하는 MongoDB 접근 계층.
+
+    pymongo 는 동기 드라이버이므로 모든 호출을 크기가 제한된 ThreadPoolExecutor 에서
+    실행한다. 핸들러는 await 만 하고 이벤트 루프는 막히지 않는다.
+    """
+
+    def __init__(self, db, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.db = db
+        self.reservation_collection = db["reservation"]
+        self.charging_profile_collection = db["chargingProfile"]
+        self.transaction_collection = db["transaction"]
+        self.evse_collection = db["evse"]
+        # "timeseries" | "buckets", 처음 사용할 때 정한다
+        self._meter_mode: Optional[str] = None
+
+        if max_workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mongo")
+        else:
+            # 비교용: 기존처럼 이벤트 루프에서 직접 실행
+            self._executor = None
+
+    async def _run(self, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            if self._executor is None:
+                return fn(*args, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.db_operation_seconds.observe(elapsed, fn.__name__)
+            metrics.add_db_time(elapsed)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    # 인덱스
+    async def ensure_indexes(self):
+        # 인덱스를 먼저 만들면 meterValue 가 일반 컬렉션으로 생기므로 그 전에
+        await self._run(self._meter_collection_mode)
+        await self._run(indexes.ensure_indexes, self.db)
+
+    async def check_query_plans(self) -> List[str]:
+        return await self._run(indexes.check_query_plans, self.db)
+
+    # evse
+    async def insert_evses(self, evses: List[Dict[str, Any]]):
+        await self._run(self.evse_collection.insert_many, evses)
+
+    async def set_stations_evse_status(self, updates: Dict[str, str]):
+        """stationId -> evseStatus 를 상태별 update_many 로 묶어서 bulk_write 한 번으로 기록"""
+        by_status: Dict[str, List[str]] = {}
+        for station_id, status in updates.items():
+            by_status.setdefault(status, []).append(station_id)
+        now = datetime.now()
+        requests = [
+            UpdateMany({"stationId": {"$in": station_ids}}, {"$set": {"evseStatus": status, "lastUpdated": now}})
+            for status, station_ids in by_status.items()
+        ]
+        await self._run(self.evse_collection.bulk_write, requests, ordered=False)
+
+    async def set_evse_status(self, evse_id: str, status: str, updated_at: Optional[datetime] = None) -> bool:
+        query: Dict[str, Any] = {"evseId": evse_id}
+        if updated_at is not None:
+            query["$or"] = [{"lastUpdated": {"$lt": updated_at}}, {"lastUpdated": {"$exists": False}}]
+        result = await self._run(self.evse_collection.update_one, query,
+                                 {"$set": {"evseStatus": status, "lastUpdated": updated_at or datetime.now()}})
+        return result.matched_count > 0
+
+    async def find_evse_statuses(self) -> List[Dict[str, Any]]:
+        return await self._run(self._find_list, self.evse_collection, {},
+                               {"_id": 0, "stationId": 1, "evseId": 1, "evseStatus": 1})
+
+    # reservation
+    async def insert_reservations(self, reservations: List[Dict[str, Any]]) -> List[ObjectId]:
+        result = await self._run(self.reservation_collection.insert_many, reservations)
+        return result.inserted_ids
+
+    async def find_authorization(self, id_token: str) -> Optional[Dict[str, Any]]:
+        """
+        idToken 으로 유효한 예약을 찾고 chargingProfile 의 chargingSchedules 를 붙여서 반환한다.
+        예약과 충전 프로파일을 $lookup 으로 한 번에 가져오므로 DB 왕복은 1회.
+        충전 프로파일이 없으면 chargingSchedules 는 None.
+        """
+        pipeline = [
+            # WAITING: 예약 시간이 되었고 유예시간 안 (reservation_scheduler)
+            {"$match": {"idToken": id_token, "reservationStatus": {"$in": ["ACTIVE", "WAITING"]}}},
+            {"$limit": 1},
+            # chargingProfile.reservationId 는 문자열로 저장되어 있음
+            {"$addFields": {"_reservationId": {"$toString": "$_id"}}},
+            {"$lookup": {
+                "from": self.charging_profile_collection.name,
+                "localField": "_reservationId",
+                "foreignField": "reservationId",
+                "as": "_chargingProfile",
+            }},
+            {"$project": {"_reservationId": 0}},
+        ]
+        reservation = await self._run(self._aggregate_one, self.reservation_collection, pipeline)
+        if reservation is None:
+            return None
+        charging_profiles = reservation.pop("_chargingProfile")
+        reservation["chargingSchedules"] = charging_profiles[0]["chargingSchedules"] if charging_profiles else None
+        return reservation
+
+    @staticmethod
+    def _aggregate_one(collection, pipeline):
+        return next(collection.aggregate(pipeline), None)
+
+    async def set_reservation_status(self, reservation_id: str, status: str):
+        await self._run(self.reservation_collection.update_one,
+                        {"_id": ObjectId(reservation_id)}, {"$set": {"reservationStatus": status}})
+
+    async def find_reservation_deadlines(self, statuses: List[str], start_after: Optional[datetime],
+                                         start_before: datetime) -> List[Dict[str, Any]]:
+        """startTime 이 [start_after, start_before) 인 예약 (start_after 가 None 이면 하한 없음)"""
+        start_time: Dict[str, Any] = {"$lt": start_before}
+        if start_after is not None:
+            start_time["$gte"] = start_after
+        return await self._run(self._find_list, self.reservation_collection,
+                               {"reservationStatus": {"$in": statuses}, "startTime": start_time},
+                               {"_id": 1, "idToken": 1, "startTime": 1, "reservationStatus": 1})
+
+    def _transition_reservations(self, reservation_ids: List[str], from_status: str, to_status: str,
+                                 start_before: datetime) -> List[str]:
+        object_ids = [ObjectId(reservation_id) for reservation_id in reservation_ids]
+        # 이 호출이 바꾼 예약을 다시 찾을 수 있도록 표시를 같이 남긴다 (다른 곳에서 먼저 바꾼 예약은 제외)
+        transition_id = ObjectId()
+        result = self.reservation_collection.update_many(
+            {"_id": {"$in": object_ids}, "reservationStatus": from_status, "startTime": {"$lte": start_before}},
+            {"$set": {"reservationStatus": to_status, "transitionId": transition_id}})
+        if result.modified_count == 0:
+            return []
+        if result.modified_count == len(set(object_ids)):
+            return list(reservation_ids)
+        moved = self.reservation_collection.find({"_id": {"$in": object_ids}, "transitionId": transition_id},
+                                                 {"_id": 1})
+        return [str(reservation["_id"]) for reservation in moved]
+
+    async def transition_reservations(self, reservation_ids: List[str], from_status: str, to_status: str,
+                                      start_before: datetime) -> List[str]:
+        """from_status 이고 startTime <= start_before 인 예약만 to_status 로 바꾼다"""
+        return await self._run(self._transition_reservations, reservation_ids, from_status, to_status,
+                               start_before)
+
+    async def find_open_reservations(self, statuses: List[str], end_after: datetime) -> List[Dict[str, Any]]:
+        return await self._run(self._find_list, self.reservation_collection,
+                               {"reservationStatus": {"$in": statuses}, "endTime": {"$gt": end_after}},
+                               {"_id": 1, "stationId": 1, "evseId": 1, "startTime": 1, "endTime": 1,
+                                "reservationStatus": 1})
+
+    @staticmethod
+    def _find_list(collection, query, projection=None):
+        return list(collection.find(query, projection))
+
+    # chargingProfile
+    async def insert_charging_profiles(self, charging_profiles: List[Dict[str, Any]]):
+        await self._run(self.charging_profile_collection.insert_many, charging_profiles)
+
+    # transaction
+    async def insert_transaction(self, transaction: Dict[str, Any]) -> bool:
+        try:
+            await self._run(self.transaction_collection.insert_one, transaction)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def end_transaction(self, reservation_id: str, status: str, costs: Optional[Tuple[int, int]],
+                              sync_at: datetime):
+        update: Dict[str, Any] = {"transactionStatus": status, "syncAt": sync_at}
+        if costs is not None:
+            update["cost"], update["energyWh"] = costs
+        await self._run(self.transaction_collection.update_one,
+                        {"reservationId": ObjectId(reservation_id)}, {"$set": update})
+
+    async def find_unsynced_transactions(self, sync_before: datetime) -> List[Dict[str, Any]]:
+        return await self._run(self._find_list, self.transaction_collection,
+                               {"syncAt": {"$lt": sync_before}},
+                               {"_id": 0, "reservationId": 1, "evseId": 1, "transactionStatus": 1, "syncAt": 1})
+
+    async def clear_transaction_sync(self, keys: List[Tuple[str, datetime]]):
+        """그 사이에 다시 기록된 트랜잭션(syncAt 이 바뀐 것)은 그대로 둔다"""
+        requests = [
+            UpdateOne({"reservationId": ObjectId(reservation_id), "syncAt": sync_at}, {"$unset": {"syncAt": ""}})
+            for reservation_id, sync_at in keys
+        ]
+        await self._run(self.transaction_collection.bulk_write, requests, ordered=False)
+
+    async def update_transaction_costs(self, updates: Dict[str, Tuple[int, int]]):
+        """reservationId -> (cost, energyWh) 를 bulk_write 한 번으로 기록"""
+        requests = [
+            UpdateOne({"reservationId": ObjectId(reservation_id)}, {"$set": {"cost": cost, "energyWh": energy_wh}})
+            for reservation_id, (cost, energy_wh) in updates.items()
+        ]
+        await self._run(self.transaction_collection.bulk_write, requests, ordered=False)
+
+    # meterValue
+    def _meter_collection_mode(self) -> str:
+        if self._meter_mode is not None:
+            return self._meter_mode
+        mode = "buckets" if meter_values.METER_STORAGE == "buckets" else None
+        while mode is None:
+            info = next(self.db.list_collections(filter={"name": meter_values.METER_COLLECTION}), None)
+            if info is not None:
+                mode = "timeseries" if info.get("type") == "timeseries" else "buckets"
+                break
+            try:
+                collection = self.db.create_collection(meter_values.METER_COLLECTION, timeseries={
+                    "timeField": "ts", "metaField": "reservationId", "granularity": "seconds"})
+                collection.create_index([("reservationId", ASCENDING), ("ts", ASCENDING)], name="reservationId_ts")
+                mode = "timeseries"
+            except CollectionInvalid:
+                continue  # 다른 워커가 먼저 만들었음
+            except OperationFailure as e:
+                # MongoDB 5.0 미만 등
+                if meter_values.METER_STORAGE == "timeseries":
+                    raise
+                logging.warning("Time-series collections unavailable (%s), storing meter values in buckets", e)
+                mode = "buckets"
+        logging.info("Meter values stored as %s", mode)
+        self._meter_mode = mode
+        return mode
+
+    def _write_meter_samples(self, samples: List[MeterSample]):
+        if self._meter_collection_mode() == "timeseries":
+            self.db[meter_values.METER_COLLECTION].insert_many([
+                {"reservationId": ObjectId(reservation_id), "ts": ts, "energyWh": energy_wh, "cost": cost}
+                for reservation_id, ts, energy_wh, cost in samples
+            ], ordered=False)
+            return
+
+        buckets: Dict[Tuple[str, datetime], List[MeterSample]] = {}
+        for sample in sorted(samples, key=lambda sample: sample[1]):
+            buckets.setdefault((sample[0], meter_values.bucket_start(sample[1])), []).append(sample)
+        requests = [
+            UpdateOne({"reservationId": ObjectId(reservation_id), "bucketStart": start}, {
+                "$push": {
+                    "ts": {"$each": [sample[1] for sample in bucket]},
+                    "energyWh": {"$each": [sample[2] for sample in bucket]},
+                    "cost": {"$each": [sample[3] for sample in bucket]},
+                },
+                "$inc": {"count": len(bucket)},
+            }, upsert=True)
+            for (reservation_id, start), bucket in buckets.items()
+        ]
+        self.db[meter_values.METER_BUCKET_COLLECTION].bulk_write(requests, ordered=False)
+
+    async def insert_meter_samples(self, samples: List[MeterSample]):
+        await self._run(self._write_meter_samples, samples)
+
+    def _read_meter_curve(self, reservation_id: str, resolution: float,
+                          start: Optional[datetime], end: Optional[datetime]) -> List[Dict[str, Any]]:
+        if self._meter_collection_mode() == "timeseries":
+            match: Dict[str, Any] = {"reservationId": ObjectId(reservation_id)}
+            if start or end:
+                match["ts"] = meter_values.time_range(start, end)
+            # 서버에서 구간별 마지막 샘플만 남긴다
+            points = list(self.db[meter_values.METER_COLLECTION].aggregate([
+                {"$match": match},
+                {"$sort": {"ts": 1}},
+                {"$group": {
+                    "_id": {"$dateTrunc": {"date": "$ts", "unit": "millisecond", "binSize": max(1, int(resolution * 1000))}},
+                    "ts": {"$last": "$ts"},
+                    "energyWh": {"$last": "$energyWh"},
+                    "cost": {"$last": "$cost"},
+                }},
+                {"$sort": {"_id": 1}},
+                {"$project": {"_id": 0}},
+            ]))
+            return meter_values.with_power(points)
+
+        query: Dict[str, Any] = {"reservationId": ObjectId(reservation_id)}
+        if start or end:
+            query["bucketStart"] = meter_values.bucket_range(start, end)
+        buckets = self.db[meter_values.METER_BUCKET_COLLECTION].find(query, sort=[("bucketStart", ASCENDING)])
+        samples = sorted(
+            sample for bucket in buckets
+            for sample in zip(bucket["ts"], bucket["energyWh"], bucket["cost"])
+            if meter_values.in_range(sample[0], start, end))
+        return meter_values.downsample(samples, resolution)
+
+    async def find_meter_curve(self, reservation_id: str, resolution: float,
+                               start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        return await self._run(self._read_meter_curve, reservation_id, resolution, start, end)
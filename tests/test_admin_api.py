@@ -0,0 +1,115 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import admin_api
+import central_system
+from central_system import ChargePointHandler
+from memory_storage import MemoryStorage
+from reservation_scheduler import ReservationScheduler
+from slot_index import SlotIndex
+
+START = datetime.now().replace(microsecond=0) + timedelta(hours=1)
+SCHEDULES = [{"startPeriod": 0, "limit": 7000}, {"startPeriod": 3600, "limit": 0}]
+
+
+def reservation(**overrides):
+    value = {"stationId": "ST-001", "evseId": "EVSE-ST1-001", "connectorId": 1, "userId": "user-1",
+             "idToken": "token-1", "startTime": START.isoformat(), "endTime": (START + timedelta(hours=1)).isoformat(),
+             "cost": 420, "targetEnergyWh": 7000}
+    value.update(overrides)
+    return {key: value for key, value in value.items() if value is not None}
+
+
+@pytest.fixture
+def csms(monkeypatch):
+    storage = MemoryStorage()
+    monkeypatch.setattr(central_system, "storage", storage)
+    monkeypatch.setattr(central_system, "slot_index", SlotIndex())
+    monkeypatch.setattr(central_system, "reservation_scheduler", ReservationScheduler())
+    monkeypatch.setattr(central_system, "authorize_cache", central_system.TTLCache(100, 30))
+    return storage
+
+
+def reserve(params):
+    return asyncio.run(admin_api.handle_request({"command": "reserve", "params": params}))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+def test_booked_reservation_authorizes(csms):
+    response = reserve({"reservation": reservation(), "charging_schedules": SCHEDULES})
+    assert "error" not in response
+
+    connection = FakeConnection()
+    message = [2, "a-1", "Authorize", {"idToken": {"idToken": "token-1", "type": "Central"}}]
+    asyncio.run(ChargePointHandler("ST-001", connection).route_message(json.dumps(message)))
+    result = connection.sent[-1]
+    assert result[0] == 3 and result[2]["idTokenInfo"]["status"] == "Accepted"
+    assert result[2]["customData"]["reservationId"] == response["reservation_id"]
+    assert result[2]["customData"]["targetEnergyWh"] == 7000
+
+
+@pytest.mark.parametrize("params", [
+    {"reservation": reservation(userId=None), "charging_schedules": SCHEDULES},
+    {"reservation": reservation(connectorId="1"), "charging_schedules": SCHEDULES},
+    {"reservation": reservation(connectorId=True), "charging_schedules": SCHEDULES},
+    {"reservation": reservation(cost=None), "charging_schedules": SCHEDULES},
+    {"reservation": reservation(targetEnergyWh="7000"), "charging_schedules": SCHEDULES},
+    {"reservation": reservation(endTime=START.isoformat()), "charging_schedules": SCHEDULES},
+    {"reservation": reservation(startTime="tomorrow"), "charging_schedules": SCHEDULES},
+    {"reservation": reservation()},
+    {"reservation": reservation(), "charging_schedules": [{"startPeriod": 60, "limit": 7000}]},
+    {"reservation": reservation(), "charging_schedules": [1, 2]},
+    {"reservation": ["not", "a", "reservation"], "charging_schedules": SCHEDULES},
+])
+def test_invalid_reservation_is_rejected_and_not_stored(csms, params):
+    response = reserve(params)
+    assert "error" in response and "reservation_id" not in response
+    assert asyncio.run(csms.find_authorization("token-1")) is None
+    assert central_system.slot_index.conflict("EVSE-ST1-001", START, START + timedelta(hours=1)) is None
+
+
+def test_overlapping_reservation_conflicts(csms):
+    first = reserve({"reservation": reservation(), "charging_schedules": SCHEDULES})
+    second = reserve({"reservation": reservation(idToken="token-2", startTime=(START + timedelta(minutes=30)).isoformat(),
+                                                 endTime=(START + timedelta(hours=2)).isoformat()),
+                      "charging_schedules": SCHEDULES})
+    assert second["conflict"] == first["reservation_id"]
+
+
+@pytest.mark.parametrize("message", ["[1, 2]", "42", "\"list\"", "null", "{\"id\": 3}", "not json"])
+def test_every_message_gets_a_response(message):
+    sent = []
+
+    class Admin:
+        def __init__(self):
+            self.messages = [message, json.dumps({"id": 4, "command": "list"})]
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            if not self.messages:
+                raise StopAsyncIteration
+            return self.messages.pop(0)
+
+        async def send(self, data):
+            sent.append(json.loads(data))
+
+    async def run():
+        await admin_api.on_admin_connect(Admin(), "/")
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert len(sent) == 2
+    error = next(response for response in sent if response.get("id") != 4)
+    assert "error" in error
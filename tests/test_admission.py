@@ -0,0 +1,50 @@
+import admission
+from admission import HandshakeGate
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_done_after_expiry_does_not_release_another_handshake(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    gate = HandshakeGate(limit=2, timeout=10)
+
+    assert gate.admit("/ST-1")
+    clock.now += 8
+    assert gate.admit("/ST-2")
+    # ST-1 의 핸드셰이크는 시간이 지나서 버려지고 ST-3 이 들어온다
+    clock.now += 5
+    assert gate.admit("/ST-3")
+    assert len(gate) == 2
+
+    # 늦게 끝난 ST-1 은 진행 중인 ST-2, ST-3 을 지우지 않는다
+    gate.done("/ST-1")
+    assert len(gate) == 2
+    assert not gate.admit("/ST-4")
+
+    gate.done("/ST-3")
+    assert len(gate) == 1
+    assert gate.admit("/ST-4")
+    assert not gate.admit("/ST-5")
+
+
+def test_same_path_is_released_once_per_admission():
+    gate = HandshakeGate(limit=3, timeout=10)
+    assert gate.admit("/ST-1") and gate.admit("/ST-1") and gate.admit("/ST-2")
+    gate.done("/ST-1")
+    gate.done("/ST-1")
+    gate.done("/ST-1")
+    assert len(gate) == 1
+
+
+def test_unlimited_gate_ignores_done():
+    gate = HandshakeGate(limit=0)
+    assert gate.admit("/ST-1")
+    gate.done("/ST-1")
+    assert len(gate) == 0
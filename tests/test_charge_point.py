@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+import websockets
+
+import central_system
+import csms
+from charge_point import ChargePoint201
+from charging_session import ENDED, SessionEngine
+from dedup import ReplayCache
+from memory_storage import MemoryStorage
+from session_sync import SessionSync
+from station_state import StationStateCache
+from write_behind import CostWriteBuffer, MeterSampleBuffer
+
+STATION = "ST-E2E"
+EVSE = "EVSE-ST-E2E-001"
+TOKEN = "ST-E2E-tok-0"
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = MemoryStorage()
+    state = StationStateCache()
+    monkeypatch.setattr(central_system, "storage", storage)
+    monkeypatch.setattr(central_system, "station_state", state)
+    monkeypatch.setattr(central_system, "session_sync", SessionSync(state))
+    monkeypatch.setattr(central_system, "replay_cache", ReplayCache())
+    monkeypatch.setattr(central_system, "cost_buffer", CostWriteBuffer(central_system._write_costs))
+    monkeypatch.setattr(central_system, "meter_buffer", MeterSampleBuffer(central_system._write_meter_samples))
+    monkeypatch.setattr(central_system, "set_station_status", lambda station_id, status: None)
+    return storage
+
+
+async def seed(storage) -> str:
+    now = datetime.now()
+    [reservation_id] = await storage.insert_reservations([{
+        "stationId": STATION, "evseId": EVSE, "connectorId": 1, "userId": "user-1", "idToken": TOKEN,
+        "startTime": now, "endTime": now + timedelta(hours=1), "targetEnergyWh": 3600, "cost": 420,
+        "reservationStatus": "ACTIVE", "createdAt": now,
+    }])
+    await storage.insert_charging_profiles([{
+        "reservationId": str(reservation_id), "chargingProfileKind": "ABSOLUTE", "startSchedule": now,
+        "chargingSchedules": [{"startPeriod": 0, "limit": 3600, "useESS": False},
+                              {"startPeriod": 3600, "limit": 0, "useESS": False}],
+    }])
+    await storage.insert_evses([{"stationId": STATION, "evseId": EVSE, "evseStatus": "AVAILABLE"}])
+    return str(reservation_id)
+
+
+def test_charge_point_session_started_updated_ended(storage):
+    """실제 ChargePoint201 과 ChargePointHandler 사이에서 Started -> Updated -> Ended"""
+
+    async def run():
+        reservation_id = await seed(storage)
+        await central_system.session_sync.start(storage, recover=False)
+        server = await websockets.serve(csms.on_connect, "127.0.0.1", 0, subprotocols=["ocpp2.0.1"])
+        port = server.sockets[0].getsockname()[1]
+        # 1시간 프로파일을 0.2초에, 10분마다 Updated
+        engine = SessionEngine(time_scale=18000, meter_interval=600)
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{port}/{STATION}", subprotocols=["ocpp2.0.1"]) as ws:
+                cp = ChargePoint201(STATION, ws, engine)
+                reader = asyncio.create_task(cp.start())
+                await cp.boot()
+                response = await cp.send_authorize(TOKEN)
+                assert response.id_token_info["status"] == "Accepted"
+                session = await engine.begin(cp, response.custom_data)
+                state = await asyncio.wait_for(asyncio.shield(session.finished), 5)
+                reader.cancel()
+            await central_system.meter_buffer.flush()
+            return reservation_id, session, state, engine.failed
+        finally:
+            await engine.close()
+            await central_system.session_sync.close()
+            server.close()
+            await server.wait_closed()
+
+    reservation_id, session, state, failed = asyncio.run(run())
+    assert state == ENDED and session.error is None and failed == 0
+    assert session.seq_no >= 3  # Started + Updated (배속 때문에 몇 번인지는 달라질 수 있음) + Ended
+
+    transaction = storage._transaction(reservation_id)
+    assert transaction["transactionStatus"] == "COMPLETED"
+    assert transaction["energyWh"] == 3600
+    assert storage._reservations[transaction["reservationId"]]["reservationStatus"] == "COMPLETED"
+    assert storage._evses[EVSE]["evseStatus"] == "AVAILABLE"
+    energies = [sample[1] for sample in storage._meter_samples[reservation_id]]
+    assert energies == sorted(energies) and energies[-1] == 3600 and len(energies) >= 2
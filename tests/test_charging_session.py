@@ -0,0 +1,57 @@
+import asyncio
+
+from charging_session import ENDED, INTERRUPTED, SessionEngine
+
+SCHEDULES = [{"startPeriod": 0, "limit": 3600}, {"startPeriod": 3600, "limit": 0}]
+
+
+def authorization(index):
+    return {"evse_id": f"EVSE-{index}", "connector_id": 1, "reservation_id": f"res-{index}",
+            "id_token": f"tok-{index}", "user_id": f"user-{index}", "charging_schedules": SCHEDULES,
+            "start_time": "", "end_time": "", "cost": 0, "target_energy_wh": 0}
+
+
+class FakeStation:
+    def __init__(self, fail_updates=False):
+        self.fail_updates = fail_updates
+        self.ended = {}
+
+    async def start_transaction(self, *args, _transaction_id, _seq_no):
+        return {}
+
+    async def update_transaction(self, *args):
+        if self.fail_updates:
+            raise ValueError("unexpected response")
+        return {}
+
+    async def stop_transaction(self, transaction_id, *args, _seq_no, _total_cost, _total_energy):
+        self.ended[transaction_id] = _total_energy
+        return {}
+
+
+def run_sessions(station, sessions=3):
+    async def run():
+        # 1시간 프로파일을 0.1초에, 10분마다 Updated
+        engine = SessionEngine(time_scale=36000, meter_interval=600)
+        running = [await engine.begin(station, authorization(i)) for i in range(sessions)]
+        states = await asyncio.wait_for(asyncio.gather(*(session.finished for session in running)), 5)
+        remaining = len(engine)
+        assert engine.failed == sum(session.error is not None for session in running)
+        await engine.close()
+        return running, states, remaining
+
+    return asyncio.run(run())
+
+
+def test_sessions_end_with_the_profile_energy():
+    station = FakeStation()
+    running, states, remaining = run_sessions(station)
+    assert states == [ENDED] * 3 and remaining == 0
+    assert all(station.ended[session.transaction_id] == 3600 for session in running)
+
+
+def test_unexpected_step_error_interrupts_the_session():
+    running, states, remaining = run_sessions(FakeStation(fail_updates=True))
+    assert states == [INTERRUPTED] * 3
+    assert remaining == 0
+    assert all(isinstance(session.error, ValueError) for session in running)
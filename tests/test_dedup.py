@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+import pytest
+
+import central_system
+import dedup
+from central_system import ChargePointHandler
+from dedup import ReplayCache, replay_keys
+
+BOOT = {"chargingStation": {"model": "m", "vendorName": "v"}, "reason": "PowerUp"}
+STATUS = {"timestamp": "2024-05-01T10:00:00+00:00", "connectorStatus": "Available", "evseId": 1, "connectorId": 1}
+
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+@pytest.fixture
+def replay_cache(monkeypatch):
+    cache = ReplayCache()
+    monkeypatch.setattr(central_system, "replay_cache", cache)
+    return cache
+
+
+def test_replay_keys_ignore_key_order():
+    reordered = {"reason": "PowerUp", "chargingStation": {"vendorName": "v", "model": "m"}}
+    assert replay_keys("BootNotification", "1", BOOT) == replay_keys("BootNotification", "1", reordered)
+
+
+def test_replay_keys_differ_by_action_and_payload():
+    key = replay_keys("BootNotification", "1", BOOT)
+    assert replay_keys("StatusNotification", "1", BOOT) != key
+    assert replay_keys("BootNotification", "1", {**BOOT, "reason": "Watchdog"}) != key
+
+
+def test_lookup_only_matches_the_same_message(replay_cache):
+    replay_cache.store("ST-1", "StatusNotification", "1", STATUS, {})
+    assert replay_cache.lookup("ST-1", "StatusNotification", "1", STATUS) == {}
+    assert replay_cache.lookup("ST-1", "NotifyEVChargingNeeds", "1", STATUS) is None
+    assert replay_cache.lookup("ST-1", "StatusNotification", "1", {**STATUS, "connectorStatus": "Occupied"}) is None
+    assert replay_cache.lookup("ST-2", "StatusNotification", "1", STATUS) is None
+
+
+def test_transaction_event_matches_on_seq_no_with_a_new_message_id(replay_cache):
+    event = {"eventType": "Updated", "seqNo": 3, "transactionInfo": {"transactionId": "tx-1"},
+             "timestamp": "2024-05-01T10:00:00+00:00", "triggerReason": "MeterValuePeriodic"}
+    replay_cache.store("ST-1", "TransactionEvent", "7", event, {})
+    assert replay_cache.lookup("ST-1", "TransactionEvent", "8", event) == {}
+
+
+@pytest.mark.parametrize("action,payload", [
+    ("Heartbeat", {}),
+    ("BootNotification", BOOT),
+    ("Authorize", {"idToken": {"idToken": "tok", "type": "Central"}}),
+])
+def test_state_dependent_actions_are_never_replayed(replay_cache, action, payload):
+    replay_cache.store("ST-1", action, "1", payload, {"currentTime": "2024-05-01T10:00:00"})
+    assert replay_cache.lookup("ST-1", action, "1", payload) is None
+
+
+def _handle(connection, unique_id, action, payload):
+    handler = ChargePointHandler("ST-1", connection)
+    asyncio.run(handler.route_message(json.dumps([2, unique_id, action, payload])))
+    return connection.sent[-1]
+
+
+def test_reused_message_id_after_reconnect_runs_the_handler(replay_cache, monkeypatch):
+    monkeypatch.setattr(central_system, "set_station_status", lambda *args: None)
+    boot = _handle(FakeConnection(), "1", "BootNotification", BOOT)
+    assert boot[0] == 3 and boot[2]["status"] == "Accepted"
+
+    # 재접속한 충전소가 메시지 id 를 1 부터 다시 사용
+    status = _handle(FakeConnection(), "1", "StatusNotification", STATUS)
+    assert status == [3, "1", {}]
+
+
+def test_retransmitted_call_is_replayed_without_the_handler(replay_cache, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(central_system, "record_costs", lambda *args: recorded.append(args))
+    cost = {"totalCost": 100, "transactionId": "tx-1",
+            "customData": {"vendorId": "v", "reservationId": "0" * 24, "totalEnergy": 10}}
+    first = _handle(FakeConnection(), "1", "CostUpdated", cost)
+    replayed = dedup.duplicate_calls.value("CostUpdated")
+
+    # 응답을 받지 못한 충전소가 재접속해서 같은 CALL 을 다시 보냄
+    assert _handle(FakeConnection(), "1", "CostUpdated", cost) == first
+    assert dedup.duplicate_calls.value("CostUpdated") == replayed + 1
+    assert len(recorded) == 1
+
+
+def test_boot_after_reconnect_runs_the_handler(replay_cache, monkeypatch):
+    statuses = []
+    monkeypatch.setattr(central_system, "set_station_status", lambda *args: statuses.append(args))
+    first = _handle(FakeConnection(), "1", "BootNotification", BOOT)
+    # 연결이 끊겨서 OFFLINE 이 된 뒤 같은 id, 같은 payload 로 다시 Boot
+    statuses.append(("ST-1", "OFFLINE"))
+    second = _handle(FakeConnection(), "1", "BootNotification", BOOT)
+    assert first[2]["status"] == second[2]["status"] == "Accepted"
+    assert statuses == [("ST-1", "AVAILABLE"), ("ST-1", "OFFLINE"), ("ST-1", "AVAILABLE")]
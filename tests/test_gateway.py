@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+import websockets
+
+import gateway
+from gateway import Gateway, GatewayConfig
+
+
+class FakeEngine:
+    def __init__(self):
+        self.interrupted = []
+
+    def interrupt(self, cp):
+        self.interrupted.append(cp)
+
+
+class FakeConnect:
+    async def __aenter__(self):
+        return object()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def fake_station(boots, readers, engine):
+    """boots: 연결마다 boot() 가 할 일 (예외 또는 응답)"""
+
+    class FakeChargePoint:
+        def __init__(self, station_id, ws):
+            self.engine = engine
+
+        async def start(self):
+            readers.append(asyncio.current_task())
+            await asyncio.Event().wait()
+
+        async def boot(self):
+            outcome = boots.pop(0) if boots else asyncio.TimeoutError()
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+
+        async def heartbeat_loop(self, interval):
+            await asyncio.Event().wait()
+
+    return FakeChargePoint
+
+
+def test_station_failures_reconnect_without_stopping_the_gateway(monkeypatch):
+    accepted = SimpleNamespace(status="Accepted", interval=300)
+    boots = [asyncio.TimeoutError(), None, SimpleNamespace(status="Rejected", interval=300),
+             RuntimeError("bug"), accepted]
+    readers = []
+    engine = FakeEngine()
+    monkeypatch.setattr(gateway, "ChargePoint201", fake_station(boots, readers, engine))
+    monkeypatch.setattr(gateway.websockets, "connect", lambda *args, **kwargs: FakeConnect())
+    monkeypatch.setattr(gateway, "GATEWAY_RECONNECT_MIN", 0.001)
+    monkeypatch.setattr(gateway, "GATEWAY_RECONNECT_MAX", 0.001)
+
+    async def run():
+        gw = Gateway(GatewayConfig("ws://csms/", ["ST-1"], []), "ws://csms/")
+        station = asyncio.create_task(gw._run_station("ST-1"))
+        for _ in range(200):
+            if "ST-1" in gw._stations:
+                break
+            await asyncio.sleep(0.005)
+        assert "ST-1" in gw._stations
+        assert not station.done()
+        # 실패한 연결의 reader 는 모두 취소되어 끝났다
+        await asyncio.sleep(0)
+        assert all(reader.done() for reader in readers[:-1])
+        assert len(engine.interrupted) == 4
+
+        station.cancel()
+        await asyncio.gather(station, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_connection_errors_are_retried(monkeypatch):
+    attempts = []
+
+    def connect(*args, **kwargs):
+        attempts.append(args)
+        if len(attempts) == 1:
+            raise OSError("connection refused")
+        raise websockets.exceptions.InvalidHandshake("bad handshake")
+
+    monkeypatch.setattr(gateway.websockets, "connect", connect)
+    monkeypatch.setattr(gateway, "GATEWAY_RECONNECT_MIN", 0.001)
+    monkeypatch.setattr(gateway, "GATEWAY_RECONNECT_MAX", 0.001)
+
+    async def run():
+        gw = Gateway(GatewayConfig("ws://csms/", ["ST-1"], []), "ws://csms/")
+        station = asyncio.create_task(gw._run_station("ST-1"))
+        await asyncio.sleep(0.05)
+        assert not station.done()
+        station.cancel()
+        await asyncio.gather(station, return_exceptions=True)
+
+    asyncio.run(run())
+    assert len(attempts) >= 3
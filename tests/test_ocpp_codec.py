@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+import central_system
+import ocpp_codec
+from central_system import ChargePointHandler
+from dedup import ReplayCache
+from memory_storage import MemoryStorage
+
+BOOT = {"chargingStation": {"model": "m", "vendorName": "v"}, "reason": "PowerUp"}
+STATUS = {"timestamp": "2024-05-01T10:00:00+00:00", "connectorStatus": "Available", "evseId": 1, "connectorId": 1}
+
+MESSAGES = {
+    "boot": [[2, "1", "BootNotification", BOOT]],
+    "status": [[2, "1", "StatusNotification", STATUS]],
+    "heartbeat": [[2, "1", "Heartbeat", {}]],
+    "authorize_unknown_token": [[2, "1", "Authorize", {"idToken": {"idToken": "nobody", "type": "Central"}}]],
+    "unknown_action": [[2, "1", "NoSuchAction", {}]],
+    "missing_required_field": [[2, "1", "StatusNotification", {k: v for k, v in STATUS.items() if k != "evseId"}]],
+    "wrong_type": [[2, "1", "BootNotification", {**BOOT, "reason": 5}]],
+    "unknown_enum_value": [[2, "1", "StatusNotification", {**STATUS, "connectorStatus": "Sleeping"}]],
+    "additional_property": [[2, "1", "StatusNotification", {**STATUS, "extra": 1}]],
+    "handler_error": [[2, "1", "CostUpdated", {"totalCost": 1, "transactionId": "tx-1",
+                                               "customData": {"vendorId": "v", "reservationId": "bad",
+                                                              "totalEnergy": 1}}]],
+    "retransmitted": [[2, "1", "BootNotification", BOOT], [2, "1", "BootNotification", BOOT]],
+    "invalid_json": ["[2, \"1\", \"Heartbeat\", {"],
+    "not_a_list": [{"messageTypeId": 2}],
+    "bad_message_type": [[9, "1", "Heartbeat", {}]],
+}
+
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+def _normalize(frame):
+    # 응답 시각은 실행마다 다르다
+    if frame[0] == 3 and "currentTime" in frame[2]:
+        frame[2]["currentTime"] = "<now>"
+    return frame
+
+
+def exchange(monkeypatch, codec, messages):
+    monkeypatch.setattr(ocpp_codec, "OCPP_CODEC", codec)
+    monkeypatch.setattr(central_system, "replay_cache", ReplayCache())
+    monkeypatch.setattr(central_system, "storage", MemoryStorage())
+    monkeypatch.setattr(central_system, "authorize_cache", central_system.TTLCache(100, 30))
+    monkeypatch.setattr(central_system, "set_station_status", lambda *args: None)
+    connection = FakeConnection()
+    handler = ChargePointHandler("ST-1", connection)
+
+    async def run():
+        for message in messages:
+            await handler.route_message(message if isinstance(message, str) else json.dumps(message))
+
+    asyncio.run(run())
+    return [_normalize(frame) for frame in connection.sent]
+
+
+@pytest.mark.parametrize("name", list(MESSAGES))
+def test_fast_codec_sends_the_same_frames(monkeypatch, name):
+    expected = exchange(monkeypatch, "ocpp", MESSAGES[name])
+    assert exchange(monkeypatch, "fast", MESSAGES[name]) == expected
+
+
+def test_schema_errors_are_call_errors(monkeypatch):
+    for name in ("missing_required_field", "wrong_type", "unknown_enum_value", "additional_property",
+                 "unknown_action"):
+        frames = exchange(monkeypatch, "fast", MESSAGES[name])
+        assert len(frames) == 1 and frames[0][0] == 4, name
+
+
+@pytest.mark.parametrize("data", [
+    {"chargingStation": {"serialNumber": "s-1", "model": "m"}, "customData": {"vendorId": "v", "someKey": [1, {"a": None}]}},
+    [{"startPeriod": 0, "numberPhases": 3}, {"startPeriod": 60, "limit": 1.5}],
+    {"evseId": 1, "connectorId": None, "ID": "x", "camelCaseURL": True},
+])
+def test_key_conversion_matches_the_library(data):
+    from ocpp.charge_point import camel_to_snake_case, snake_to_camel_case
+
+    assert ocpp_codec.camel_to_snake_case(data) == camel_to_snake_case(data)
+    snake = camel_to_snake_case(data)
+    assert ocpp_codec.snake_to_camel_case(snake) == snake_to_camel_case(snake)
+
+
+def test_to_payload_matches_the_library():
+    from dataclasses import asdict
+
+    from ocpp.charge_point import remove_nones, snake_to_camel_case
+    from ocpp.v201 import call_result
+    from ocpp.v201.datatypes import IdTokenInfoType
+
+    response = call_result.Authorize(id_token_info=IdTokenInfoType(status="Accepted"),
+                                     custom_data={"vendor_id": "v", "charging_schedules": [{"start_period": 0}]})
+    assert ocpp_codec.to_payload(response) == snake_to_camel_case(remove_nones(asdict(response)))
@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from memory_storage import MemoryStorage
+from reservation_scheduler import ReservationScheduler
+
+
+def reservation(token, start, status="ACTIVE"):
+    return {"_id": ObjectId(), "stationId": "ST-001", "evseId": f"EVSE-{token}", "connectorId": 1, "userId": "u", "idToken": token,
+            "startTime": start, "endTime": start + timedelta(hours=1), "cost": 0, "targetEnergyWh": 1000,
+            "reservationStatus": status}
+
+
+def test_only_reservations_that_moved_are_notified_and_rescheduled():
+    storage = MemoryStorage()
+    transitions = []
+    scheduler = ReservationScheduler(on_transition=lambda *args: transitions.append(args))
+    scheduler._storage = storage
+    start = datetime.now() - timedelta(minutes=1)
+
+    async def run():
+        moved, taken = (reservation("token-1", start), reservation("token-2", start))
+        await storage.insert_reservations([moved, taken])
+        scheduler.schedule(moved)
+        scheduler.schedule(taken)
+        # 충전이 시작되어 다른 곳에서 먼저 ONGOING 으로 바꿈
+        await storage.set_reservation_status(str(taken["_id"]), "ONGOING")
+        await scheduler._apply_due()
+        return str(moved["_id"]), str(taken["_id"])
+
+    moved_id, taken_id = asyncio.run(run())
+    assert transitions == [(moved_id, "token-1", "WAITING")]
+    # WAITING -> EXPIRED 만 다시 등록된다
+    assert len(scheduler) == 1 and moved_id in scheduler._entries
+    assert scheduler._entries[moved_id].status == "WAITING"
+
+
+def test_nothing_moved_means_no_callbacks():
+    storage = MemoryStorage()
+    transitions = []
+    scheduler = ReservationScheduler(on_transition=lambda *args: transitions.append(args))
+    scheduler._storage = storage
+
+    async def run():
+        late = reservation("token-1", datetime.now() - timedelta(minutes=1))
+        await storage.insert_reservations([late])
+        scheduler.schedule(late)
+        await storage.set_reservation_status(str(late["_id"]), "CANCELLED")
+        await scheduler._apply_due()
+
+    asyncio.run(run())
+    assert transitions == []
+    assert len(scheduler) == 0
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from serial_framing import (FRAME_ID_TOKEN, FRAME_JSON, FRAME_TELEMETRY, CobsDecoder, FrameError, LineDecoder,
+                            Telemetry, cobs_decode, cobs_encode, encode_frame, encode_telemetry)
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"\x00",
+    b"\x00\x00",
+    b"abc",
+    b"a\x00b\x00",
+    bytes(range(256)),
+    b"x" * 253,
+    b"x" * 254,
+    b"x" * 255,
+    b"x" * 600 + b"\x00" + b"y" * 300,
+])
+def test_cobs_round_trip(data):
+    encoded = cobs_encode(data)
+    assert b"\x00" not in encoded
+    assert cobs_decode(encoded) == data
+
+
+@pytest.mark.parametrize("data", [b"\x03a\x00b", b"\x05ab"])
+def test_cobs_decode_rejects_malformed(data):
+    with pytest.raises(FrameError):
+        cobs_decode(data)
+
+
+def test_cobs_decoder_byte_by_byte():
+    telemetry = Telemetry(1, 123456, 7200, 3100)
+    stream = (encode_frame(FRAME_ID_TOKEN, "카드-01".encode()) + encode_telemetry(telemetry)
+              + encode_frame(FRAME_JSON, json.dumps({"a": [0, 1]}).encode()))
+    decoder = CobsDecoder()
+    frames = []
+    for i in range(len(stream)):
+        frames += decoder.feed(stream[i:i + 1])
+    assert frames == [(FRAME_ID_TOKEN, "카드-01"), (FRAME_TELEMETRY, telemetry), (FRAME_JSON, {"a": [0, 1]})]
+    assert len(decoder) == 0
+
+
+def test_cobs_decoder_resyncs_after_garbage():
+    decoder = CobsDecoder()
+    token = encode_frame(FRAME_ID_TOKEN, b"TOKEN")
+    # 중간부터 받은 프레임, 모르는 종류, 깨진 COBS 는 버리고 다음 구분자부터 다시 맞춘다
+    frames = decoder.feed(b"\x07\x01garb" + b"\x00" + encode_frame(0x7F, b"?") + b"\x09ab\x00" + token)
+    assert frames == [(FRAME_ID_TOKEN, "TOKEN")]
+    assert decoder.dropped == 3
+
+
+def test_cobs_decoder_drops_oversized_frame():
+    decoder = CobsDecoder(max_frame_size=16)
+    assert decoder.feed(b"\x01" * 40) == []
+    assert decoder.dropped == 1
+    assert len(decoder) == 0
+    assert decoder.feed(encode_frame(FRAME_ID_TOKEN, b"OK")) == [(FRAME_ID_TOKEN, "OK")]
+
+
+def test_line_decoder_split_utf8_and_blank_lines():
+    decoder = LineDecoder()
+    data = "카드-01\r\n\n04AB\n".encode()
+    frames = decoder.feed(data[:2]) + decoder.feed(data[2:])
+    assert frames == [(FRAME_ID_TOKEN, "카드-01"), (FRAME_ID_TOKEN, "04AB")]
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from site_allocator import waterfill
+
+
+def check(demand, capacity, allocated):
+    assert allocated.shape == demand.shape
+    assert (allocated >= 0).all()
+    assert (allocated <= demand + 1e-9).all()
+    totals = allocated.sum(axis=0)
+    np.testing.assert_allclose(totals, np.minimum(demand.sum(axis=0), capacity), atol=1e-6)
+    # max-min 공평: 요청보다 적게 받은 세션은 같은 슬롯의 다른 누구보다 적게 받지 않는다
+    for column in range(demand.shape[1]):
+        limited = allocated[:, column] < demand[:, column] - 1e-9
+        if limited.any():
+            level = allocated[limited, column]
+            np.testing.assert_allclose(level, level.max())
+            assert (allocated[:, column] <= level.max() + 1e-9).all()
+
+
+def test_under_capacity_is_unchanged():
+    demand = np.array([[1000.0, 2000.0], [3000.0, 0.0]])
+    allocated = waterfill(demand, 10000)
+    np.testing.assert_array_equal(allocated, demand)
+    assert allocated is not demand
+
+
+def test_fair_share():
+    demand = np.array([[1000.0], [5000.0], [7000.0]])
+    allocated = waterfill(demand, 9000)
+    np.testing.assert_allclose(allocated[:, 0], [1000, 4000, 4000])
+    check(demand, 9000, allocated)
+
+
+def test_zero_capacity():
+    demand = np.array([[1000.0, 0.0], [2000.0, 0.0]])
+    allocated = waterfill(demand, 0)
+    np.testing.assert_allclose(allocated, 0)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_invariants(seed):
+    rng = np.random.default_rng(seed)
+    sessions, slots = rng.integers(1, 30), rng.integers(1, 50)
+    demand = rng.choice([0.0, 3700.0, 7400.0, 11000.0, 22000.0], size=(sessions, slots))
+    demand += rng.uniform(0, 1000, size=demand.shape) * (demand > 0)
+    capacity = float(rng.uniform(0, demand.sum(axis=0).max() + 1))
+    check(demand, capacity, waterfill(demand, capacity))
@@ -0,0 +1,132 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from slot_index import SlotIndex
+
+T0 = datetime(2024, 5, 1, 10)
+HOUR = timedelta(hours=1)
+
+
+def reservation(reservation_id, start, end, evse_id="EVSE-1", status="ACTIVE"):
+    return {"_id": reservation_id, "stationId": "ST-1", "evseId": evse_id,
+            "startTime": T0 + start * HOUR, "endTime": T0 + end * HOUR, "reservationStatus": status}
+
+
+@pytest.fixture
+def index():
+    index = SlotIndex()
+    index.add(reservation("a", 0, 2))
+    index.add(reservation("b", 3, 4))
+    return index
+
+
+@pytest.mark.parametrize("start,end,expected", [
+    (1, 3, "a"),
+    (-1, 0.5, "a"),
+    (3.5, 5, "b"),
+    (2, 3, None),   # 끝과 시작이 맞닿는 것은 겹치지 않음
+    (4, 5, None),
+    (-2, 0, None),
+])
+def test_conflict(index, start, end, expected):
+    assert index.conflict("EVSE-1", T0 + start * HOUR, T0 + end * HOUR) == expected
+    assert index.is_free("EVSE-1", T0 + start * HOUR, T0 + end * HOUR) == (expected is None)
+
+
+def test_conflict_is_per_evse(index):
+    assert index.conflict("EVSE-2", T0, T0 + HOUR) is None
+
+
+def test_long_reservation_before_short_ones_still_conflicts():
+    # 앞에서 시작한 긴 예약이 뒤에 시작한 짧은 예약들보다 늦게 끝나는 경우 (prefix max)
+    index = SlotIndex()
+    index.add(reservation("long", 0, 10))
+    index.add(reservation("short", 1, 2))
+    assert index.conflict("EVSE-1", T0 + 5 * HOUR, T0 + 6 * HOUR) == "long"
+    index.remove("long")
+    assert index.conflict("EVSE-1", T0 + 5 * HOUR, T0 + 6 * HOUR) is None
+
+
+@pytest.mark.parametrize("after,duration,expected", [
+    (0, 1, 2),      # a 가 끝난 뒤
+    (2, 1, 2),      # a 와 b 사이 1시간
+    (2, 1.5, 4),    # 사이가 모자라면 b 뒤로
+    (5, 1, 5),
+    (-2, 1, -2),
+    (-2, 3, 4),
+])
+def test_next_free(index, after, duration, expected):
+    start = index.next_free("EVSE-1", T0 + after * HOUR, duration * HOUR)
+    assert start == T0 + expected * HOUR
+    assert index.is_free("EVSE-1", start, start + duration * HOUR)
+
+
+def test_next_free_on_unknown_evse_is_after(index):
+    assert index.next_free("EVSE-2", T0, HOUR) == T0
+
+
+def test_released_statuses_free_the_slot(index):
+    index.update_status("a", "ONGOING")
+    assert index.conflict("EVSE-1", T0, T0 + HOUR) == "a"
+    index.update_status("a", "COMPLETED")
+    assert index.conflict("EVSE-1", T0, T0 + HOUR) is None
+    assert len(index) == 1
+
+    index.add(reservation("c", 0, 1, status="CANCELLED"))
+    assert index.is_free("EVSE-1", T0, T0 + HOUR)
+
+
+def test_add_again_moves_the_reservation(index):
+    index.add(reservation("a", 5, 6))
+    assert index.is_free("EVSE-1", T0, T0 + 2 * HOUR)
+    assert index.conflict("EVSE-1", T0 + 5 * HOUR, T0 + 6 * HOUR) == "a"
+    assert len(index) == 2
+
+
+class FakeStorage:
+    def __init__(self, reservations):
+        self.reservations = reservations
+
+    async def find_open_reservations(self, statuses, end_after):
+        return list(self.reservations)
+
+
+def test_load_matches_incremental_adds():
+    rng = random.Random(7)
+    reservations = [reservation(f"r{i}", start, start + rng.choice([0.5, 1, 3]), evse_id=f"EVSE-{i % 3}")
+                    for i, start in enumerate(rng.uniform(0, 48) for _ in range(60))]
+    incremental = SlotIndex()
+    for item in reservations:
+        incremental.add(item)
+    loaded = SlotIndex()
+    loaded._storage = FakeStorage(reversed(reservations))
+    asyncio.run(loaded.load())
+
+    assert len(loaded) == len(incremental)
+    for evse_id in ("EVSE-0", "EVSE-1", "EVSE-2"):
+        for hour in range(-1, 50):
+            start = T0 + hour * HOUR
+            assert loaded.conflict(evse_id, start, start + HOUR) == incremental.conflict(evse_id, start, start + HOUR)
+            assert loaded.next_free(evse_id, start, 2 * HOUR) == incremental.next_free(evse_id, start, 2 * HOUR)
+        slots = loaded._evses[evse_id]
+        assert slots.starts == sorted(slots.starts)
+        assert slots.max_ends == [max(slots.ends[:i + 1]) for i in range(len(slots.ends))]
+    # 다시 읽은 뒤에도 id 로 지울 수 있다
+    loaded.remove("r0")
+    assert len(loaded) == len(reservations) - 1
+
+
+def test_reload_drops_reservations_and_evses_gone_from_the_db():
+    index = SlotIndex()
+    index._storage = FakeStorage([reservation("a", 0, 1), {**reservation("b", 0, 1), "stationId": "ST-2",
+                                                           "evseId": "EVSE-9"}])
+    asyncio.run(index.load())
+    assert index.conflict("EVSE-9", T0, T0 + HOUR) == "b"
+
+    index._storage.reservations = [reservation("a", 0, 1)]
+    asyncio.run(index.load())
+    assert index.is_free("EVSE-9", T0, T0 + HOUR) and len(index) == 1
+    assert index.station_capacity("ST-2", T0, 1)[0]["evses"] == 0
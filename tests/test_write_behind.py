@@ -0,0 +1,134 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+import central_system
+from central_system import ChargePointHandler
+from write_behind import CostWriteBuffer, MeterSampleBuffer
+
+GOOD = [str(ObjectId()) for _ in range(3)]
+
+
+class FakeStore:
+    """update_transaction_costs 처럼 ObjectId 로 바꾸면서 기록"""
+
+    def __init__(self):
+        self.written = {}
+        self.fail_with = None
+
+    async def write(self, updates):
+        if self.fail_with is not None:
+            raise self.fail_with
+        converted = {ObjectId(key): value for key, value in updates.items()}
+        self.written.update(converted)
+
+
+def test_flush_drops_only_the_entry_that_cannot_be_written():
+    store = FakeStore()
+    buffer = CostWriteBuffer(store.write)
+
+    async def run():
+        buffer.add(GOOD[0], 10, 100)
+        buffer.add("not-an-object-id", 20, 200)
+        buffer.add(GOOD[1], 30, 300)
+        await buffer.flush()
+        # 다음 flush 에 다시 나타나지 않는다
+        buffer.add(GOOD[2], 40, 400)
+        await buffer.flush()
+
+    asyncio.run(run())
+    assert store.written == {ObjectId(GOOD[0]): (10, 100), ObjectId(GOOD[1]): (30, 300),
+                             ObjectId(GOOD[2]): (40, 400)}
+    assert len(buffer) == 0
+
+
+def test_transient_failure_keeps_the_batch():
+    store = FakeStore()
+    buffer = CostWriteBuffer(store.write)
+
+    async def run():
+        buffer.add(GOOD[0], 10, 100)
+        store.fail_with = AutoReconnect("primary stepped down")
+        await buffer.flush()
+        assert len(buffer) == 1
+        # 그 사이에 들어온 최신 값이 남는다
+        buffer.add(GOOD[0], 11, 110)
+        store.fail_with = None
+        await buffer.flush()
+
+    asyncio.run(run())
+    assert store.written == {ObjectId(GOOD[0]): (11, 110)}
+
+
+def test_close_writes_what_it_can():
+    store = FakeStore()
+    buffer = CostWriteBuffer(store.write)
+
+    async def run():
+        buffer.start()
+        buffer.add("bad", 1, 1)
+        buffer.add(GOOD[0], 10, 100)
+        await buffer.close()
+
+    asyncio.run(run())
+    assert store.written == {ObjectId(GOOD[0]): (10, 100)}
+
+
+def test_record_costs_rejects_invalid_reservation_id(monkeypatch):
+    buffer = CostWriteBuffer(FakeStore().write)
+    monkeypatch.setattr(central_system, "cost_buffer", buffer)
+    with pytest.raises(central_system.PropertyConstraintViolationError):
+        central_system.record_costs("not-an-object-id", 10, 100)
+    with pytest.raises(central_system.PropertyConstraintViolationError):
+        central_system.record_costs(12, 10, 100)
+    assert len(buffer) == 0
+
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+def test_cost_updated_with_invalid_reservation_id_is_a_call_error(monkeypatch):
+    buffer = CostWriteBuffer(FakeStore().write)
+    monkeypatch.setattr(central_system, "cost_buffer", buffer)
+    connection = FakeConnection()
+    handler = ChargePointHandler("ST-1", connection)
+    message = [2, "c-1", "CostUpdated", {"totalCost": 10, "transactionId": "tx-1",
+                                         "customData": {"vendorId": "v", "reservationId": "bad", "totalEnergy": 100}}]
+    asyncio.run(handler.route_message(json.dumps(message)))
+    assert connection.sent[-1][:3] == [4, "c-1", "PropertyConstraintViolation"]
+    assert len(buffer) == 0
+
+
+def test_meter_flush_isolates_the_failing_transaction():
+    written = []
+
+    async def write(samples):
+        # storage._write_meter_samples 처럼 배치 전체를 바꾼 뒤에 기록
+        converted = [(ObjectId(reservation_id), ts, energy_wh, cost) for reservation_id, ts, energy_wh, cost in samples]
+        written.append(converted)
+
+    buffer = MeterSampleBuffer(write)
+    now = datetime(2024, 5, 1, 10)
+
+    async def run():
+        for minute in range(3):
+            buffer.add(GOOD[0], now + timedelta(minutes=minute), minute * 10, minute)
+            buffer.add("bad", now + timedelta(minutes=minute), minute * 10, minute)
+            buffer.add(GOOD[1], now + timedelta(minutes=minute), minute * 10, minute)
+        await buffer.flush()
+
+    asyncio.run(run())
+    # 좋은 트랜잭션은 트랜잭션마다 한 번에, 잘못된 id 의 샘플은 버려진다
+    assert [sorted({sample[0] for sample in samples}) for samples in written] == [[ObjectId(GOOD[0])],
+                                                                                  [ObjectId(GOOD[1])]]
+    assert [len(samples) for samples in written] == [3, 3]
+    assert len(buffer) == 0
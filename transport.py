@@ -0,0 +1,142 @@
+"""
+CSMS WebSocket 전송 설정 (websockets.serve 에 넘기는 압축, 큐, 버퍼, ping).
+
+    프로파일   압축                              max_size  max_queue  read/write_limit  ping(interval/timeout)
+    default    deflate, 문맥 유지 (websockets 기본)  1 MiB     32         64 KiB            20 / 20 초
+    balanced   deflate, 메시지마다 새 문맥            256 KiB   8          16 KiB            60 / 30 초
+    lean       없음                                256 KiB   4          16 KiB            없음 (OCPP Heartbeat 만)
+
+연결 하나의 서버 메모리 (benchmarks/ws_memory.py, 연결 5000개, RSS 증가분 / 연결 수):
+
+    프로파일   유휴       메시지를 주고받은 뒤   압축 후 크기 (비슷한 메시지가 이어질 때)
+    default    52 KiB     64 KiB                2%   (zlib 문맥을 연결할 때 만들어서 계속 들고 있음)
+    balanced   19.5 KiB   21 KiB                41%  (zlib 문맥은 메시지 하나를 처리하는 동안만)
+    lean       18 KiB     19 KiB                100%
+
+문맥을 유지하지 않으면 연속된 메시지 사이의 중복을 압축에 쓰지 못하지만, OCPP 메시지는 하나 안에서도
+키 이름이 반복되어서 충분히 줄어든다. 최악의 경우 연결 하나가 잡을 수 있는 수신 버퍼는 max_queue x max_size
+(default 32 MiB, balanced 2 MiB).
+
+압축을 충전소별로 정할 수도 있다 (per-station). WS_DEFLATE_STATIONS 의 패턴(fnmatch)에 맞는 충전소
+(예: 데이터 요금을 내는 LTE 모뎀)만 deflate 를 협상하고, 나머지는 클라이언트가 요청해도 압축하지 않는다.
+
+    WS_PROFILE=balanced
+    WS_COMPRESSION=per-station WS_DEFLATE_STATIONS="LTE-*,ST-00?"
+    WS_PING_INTERVAL=0   # 0 이면 WebSocket ping 을 보내지 않음
+"""
+import dataclasses
+import fnmatch
+import functools
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+from websockets.legacy.server import WebSocketServerProtocol
+
+import metrics
+
+WS_PROFILE = os.getenv("WS_PROFILE", "default")
+WS_DEFLATE_STATIONS = os.getenv("WS_DEFLATE_STATIONS", "")
+
+connections = metrics.Counter("ocpp_ws_connections_total",
+                              "Accepted WebSocket connections by negotiated compression", ["compression"])
+
+
+@dataclass(frozen=True)
+class TransportProfile:
+    # on | off | per-station
+    compression: str = "on"
+    # False 면 메시지마다 zlib 문맥을 새로 만들고 버린다 (유휴 연결이 zlib 메모리를 들고 있지 않음)
+    context_takeover: bool = True
+    window_bits: int = 12
+    mem_level: int = 5
+    max_size: Optional[int] = 2 ** 20
+    max_queue: Optional[int] = 32
+    read_limit: int = 2 ** 16
+    write_limit: int = 2 ** 16
+    # 초, None 이면 보내지 않음
+    ping_interval: Optional[float] = 20
+    ping_timeout: Optional[float] = 20
+
+
+PROFILES: Dict[str, TransportProfile] = {
+    "default": TransportProfile(),
+    "balanced": TransportProfile(context_takeover=False, max_size=2 ** 18, max_queue=8,
+                                 read_limit=2 ** 14, write_limit=2 ** 14, ping_interval=60, ping_timeout=30),
+    "lean": TransportProfile(compression="off", max_size=2 ** 18, max_queue=4,
+                             read_limit=2 ** 14, write_limit=2 ** 14, ping_interval=None, ping_timeout=None),
+}
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return None if value in (None, "") else int(value)
+
+
+def load_profile(name: Optional[str] = None) -> TransportProfile:
+    """프로파일에 환경변수(WS_COMPRESSION, WS_MAX_SIZE, ...)로 준 값을 덮어쓴다"""
+    name = name or WS_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown WebSocket transport profile: {name}")
+    overrides: Dict[str, Any] = {}
+    compression = os.getenv("WS_COMPRESSION")
+    if compression:
+        if compression not in ("on", "off", "per-station"):
+            raise ValueError(f"Unknown WS_COMPRESSION: {compression}")
+        overrides["compression"] = compression
+    for field in ("max_size", "max_queue", "read_limit", "write_limit"):
+        value = _env_int("WS_" + field.upper())
+        if value is not None:
+            overrides[field] = value
+    for field in ("ping_interval", "ping_timeout"):
+        value = os.getenv("WS_" + field.upper())
+        if value:
+            overrides[field] = float(value) or None
+    return dataclasses.replace(PROFILES[name], **overrides)
+
+
+class StationProtocol(WebSocketServerProtocol):
+    """deflate_stations 에 맞는 충전소만 압축을 협상한다 (경로의 마지막 부분이 충전소 id)"""
+
+    def __init__(self, *args, deflate_stations: Sequence[str] = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.deflate_stations = deflate_stations
+
+    def process_extensions(self, headers, available_extensions) -> Tuple[Optional[str], list]:
+        station_id = self.path.strip("/").rsplit("/", 1)[-1]
+        if not any(fnmatch.fnmatchcase(station_id, pattern) for pattern in self.deflate_stations):
+            available_extensions = None
+        return WebSocketServerProtocol.process_extensions(headers, available_extensions)
+
+
+def serve_kwargs(profile: TransportProfile, deflate_stations: str = WS_DEFLATE_STATIONS) -> Dict[str, Any]:
+    """websockets.serve 의 키워드 인자"""
+    kwargs: Dict[str, Any] = {
+        "compression": None,
+        "max_size": profile.max_size,
+        "max_queue": profile.max_queue,
+        "read_limit": profile.read_limit,
+        "write_limit": profile.write_limit,
+        "ping_interval": profile.ping_interval,
+        "ping_timeout": profile.ping_timeout,
+    }
+    if profile.compression != "off":
+        kwargs["extensions"] = [ServerPerMessageDeflateFactory(
+            server_no_context_takeover=not profile.context_takeover,
+            client_no_context_takeover=not profile.context_takeover,
+            server_max_window_bits=profile.window_bits,
+            client_max_window_bits=profile.window_bits,
+            compress_settings={"memLevel": profile.mem_level},
+        )]
+    if profile.compression == "per-station":
+        patterns = [pattern.strip() for pattern in deflate_stations.split(",") if pattern.strip()]
+        kwargs["create_protocol"] = functools.partial(StationProtocol, deflate_stations=patterns)
+    return kwargs
+
+
+def count_connection(websocket) -> str:
+    """on_connect 에서 이 연결이 압축을 쓰는지 세고 돌려준다"""
+    compression = "deflate" if websocket.extensions else "off"
+    connections.inc(compression)
+    return compression
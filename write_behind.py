@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from pymongo.errors import AutoReconnect
+
+from meter_values import MeterSample
+
+COST_FLUSH_INTERVAL = float(os.getenv("COST_FLUSH_INTERVAL", "1.0"))  # 초
+COST_FLUSH_MAX_PENDING = int(os.getenv("COST_FLUSH_MAX_PENDING", "500"))
+# 다음 flush 에서 다시 시도하는 에러 (DB 연결 끊김 등), 그 밖의 에러는 그 항목만 버린다
+TRANSIENT_ERRORS = (AutoReconnect, OSError)
+STATUS_FLUSH_INTERVAL = float(os.getenv("STATUS_FLUSH_INTERVAL", "0.5"))  # 초
+STATUS_FLUSH_MAX_PENDING = int(os.getenv("STATUS_FLUSH_MAX_PENDING", "1000"))
+METER_FLUSH_INTERVAL = float(os.getenv("METER_FLUSH_INTERVAL", "2.0"))  # 초
+METER_FLUSH_MAX_PENDING = int(os.getenv("METER_FLUSH_MAX_PENDING", "2000"))
+
+# reservationId -> (cost, energyWh)
+CostUpdates = Dict[str, Tuple[int, int]]
+# stationId -> evseStatus
+StatusUpdates = Dict[str, str]
+
+
+class WriteBehindBuffer:
+    """
+    쓰기 버퍼 (write-behind).
+
+    키별로 마지막 값만 남기고, 주기(interval) 또는 대기 건수(max_pending)에 도달하면
+    write 함수로 한 번에 기록한다.
+
+    기록이 TRANSIENT_ERRORS 로 실패하면 배치를 다음 flush 로 넘긴다. 다른 에러(잘못된 값 등)면
+    항목별로 다시 기록해서, 실패하는 항목만 로그를 남기고 버린다 (한 항목 때문에 나머지가 계속 밀리지 않도록).
+    """
+
+    def __init__(self, write: Callable[[Dict[Hashable, Any]], Awaitable[None]], interval: float, max_pending: int):
+        self._write = write
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: Dict[Hashable, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._threshold_flush: Optional[asyncio.Task] = None
+
+    def _put(self, key: Hashable, value: Any):
+        self._pending[key] = value
+        if len(self._pending) >= self.max_pending and (self._threshold_flush is None or self._threshold_flush.done()):
+            self._threshold_flush = asyncio.create_task(self.flush())
+
+    async def flush(self, key: Optional[Hashable] = None):
+        """대기 중인 값을 기록한다. key 를 주면 해당 키만 기록한다."""
+        if key is not None:
+            if key not in self._pending:
+                return
+            batch = {key: self._pending.pop(key)}
+        else:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+
+        try:
+            await self._write(batch)
+        except asyncio.CancelledError:
+            self._restore(batch)
+            raise
+        except TRANSIENT_ERRORS:
+            logging.exception("Failed to write %d buffered updates, keeping them for the next flush", len(batch))
+            self._restore(batch)
+        except Exception:
+            if len(batch) == 1:
+                logging.exception("Dropping buffered update that cannot be written: %r", batch)
+                return
+            logging.exception("Failed to write %d buffered updates, writing them one by one", len(batch))
+            await self._write_each(batch)
+
+    def _split(self, batch: Dict[Hashable, Any]) -> List[Dict[Hashable, Any]]:
+        """실패한 배치를 따로 기록할 단위로 나눈다"""
+        return [{key: value} for key, value in batch.items()]
+
+    async def _write_each(self, batch: Dict[Hashable, Any]):
+        parts = self._split(batch)
+        for index, part in enumerate(parts):
+            try:
+                await self._write(part)
+            except asyncio.CancelledError:
+                for rest in parts[index:]:
+                    self._restore(rest)
+                raise
+            except TRANSIENT_ERRORS:
+                logging.exception("Failed to write %d buffered updates, keeping them for the next flush", len(part))
+                self._restore(part)
+            except Exception:
+                logging.exception("Dropping %d buffered updates that cannot be written: %r", len(part), part)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """기록하지 않고 대기 중인 값을 꺼낸다 (호출한 쪽이 다른 쓰기에 합쳐서 기록)"""
+        return self._pending.pop(key, default)
+
+    def _restore(self, batch: Dict[Hashable, Any]):
+        # 그 사이에 들어온 최신 값은 덮어쓰지 않는다
+        for key, value in batch.items():
+            self._pending.setdefault(key, value)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+
+class CostWriteBuffer(WriteBehindBuffer):
+    """CostUpdated 버퍼: reservationId 별 마지막 cost/energyWh"""
+
+    def __init__(self, write: Callable[[CostUpdates], Awaitable[None]],
+                 interval: float = COST_FLUSH_INTERVAL, max_pending: int = COST_FLUSH_MAX_PENDING):
+        super().__init__(write, interval, max_pending)
+
+    def add(self, reservation_id: str, cost: int, energy_wh: int):
+        self._put(reservation_id, (cost, energy_wh))
+
+
+class StationStatusBuffer(WriteBehindBuffer):
+    """
+    충전소 단위 EVSE 상태 버퍼: stationId 별 마지막 evseStatus.
+    연결/종료가 빠르게 반복되어도 마지막 상태만 기록된다.
+    """
+
+    def __init__(self, write: Callable[[StatusUpdates], Awaitable[None]],
+                 interval: float = STATUS_FLUSH_INTERVAL, max_pending: int = STATUS_FLUSH_MAX_PENDING):
+        super().__init__(write, interval, max_pending)
+
+    def add(self, station_id: str, status: str):
+        self._put(station_id, status)
+
+
+class MeterSampleBuffer(WriteBehindBuffer):
+    """
+    계량값 샘플 버퍼. 샘플마다 (reservationId, 시각) 키라서 덮어쓰지 않고 모두 기록된다.
+    write 는 샘플 목록을 받는다.
+    """
+
+    def __init__(self, write: Callable[[List[MeterSample]], Awaitable[None]],
+                 interval: float = METER_FLUSH_INTERVAL, max_pending: int = METER_FLUSH_MAX_PENDING):
+        super().__init__(self._write_samples, interval, max_pending)
+        self._write_sample_list = write
+
+    async def _write_samples(self, batch: Dict[Tuple[str, datetime], Tuple[int, int]]):
+        await self._write_sample_list([
+            (reservation_id, ts, energy_wh, cost) for (reservation_id, ts), (energy_wh, cost) in batch.items()
+        ])
+
+    def _split(self, batch: Dict[Tuple[str, datetime], Tuple[int, int]]) -> List[Dict[Hashable, Any]]:
+        # 실패한 배치는 샘플 하나씩이 아니라 트랜잭션(reservationId) 단위로 다시 기록한다
+        parts: Dict[str, Dict[Hashable, Any]] = {}
+        for key, value in batch.items():
+            parts.setdefault(key[0], {})[key] = value
+        return list(parts.values())
+
+    def add(self, reservation_id: str, ts: datetime, energy_wh: int, cost: int):
+        self._put((reservation_id, ts), (energy_wh, cost))